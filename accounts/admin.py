@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import AboutPage, User
+from .models import AboutPage, CreditTransaction, User
 
 
 @admin.register(User)
@@ -7,6 +7,31 @@ class UserAdmin(admin.ModelAdmin):
 	list_display = ("username", "first_name", "last_name", "user_type", "credits")
 	list_filter = ("user_type",)
 	search_fields = ("username", "first_name", "last_name", "email")
+	# Zůstatek se mění jen přes ledger (Pohyby kreditu), aby seděla rekonciliace
+	readonly_fields = ("credits",)
+
+
+@admin.register(CreditTransaction)
+class CreditTransactionAdmin(admin.ModelAdmin):
+	list_display = ("created_at", "user", "kind", "amount", "reference")
+	list_filter = ("kind", "created_at")
+	search_fields = ("user__username", "user__first_name", "user__last_name", "reference")
+	list_select_related = ("user",)
+
+	def get_readonly_fields(self, request, obj=None):
+		# Ledger je append-only: existující pohyby nelze měnit
+		if obj is not None:
+			return [field.name for field in self.model._meta.fields]
+		return ()
+
+	def save_model(self, request, obj, form, change):
+		# Ruční úprava projde stejnou cestou jako ostatní pohyby (atomický UPDATE zůstatku)
+		if not change:
+			entry = obj.user.add_credits(obj.amount, kind=obj.kind, reference=obj.reference, description=obj.description)
+			obj.pk, obj.created_at = entry.pk, entry.created_at
+
+	def has_delete_permission(self, request, obj=None):
+		return False
 
 
 @admin.register(AboutPage)
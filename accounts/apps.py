@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "accounts"
+
+    def ready(self):
+        # Registrace signálů pro zneplatnění cache přihlášených uživatelů
+        from . import signals  # noqa: F401
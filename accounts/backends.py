@@ -1,25 +1,56 @@
-from django.contrib.auth.backends import ModelBackend
+"""
+Přihlášení e-mailem nebo uživatelským jménem jedním průchodem.
+
+Uživatel se najde jediným dotazem (`LOWER(email)` přes funkční index nebo
+username) a heslo se ověří právě jednou. Neexistujícímu účtu se heslo
+zahashuje naprázdno, takže neúspěšné přihlášení trvá stejně dlouho a stojí
+jeden PBKDF2 – dříve EmailBackend a ModelBackend za sebou hashovaly dvakrát.
+
+`get_user` (volá se při každém requestu přihlášeného uživatele) obsluhuje
+krátkodobá cache v paměti procesu (accounts.user_cache).
+"""
 from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
+from django.db.models.functions import Lower
 
-User = get_user_model()
+from .user_cache import cache_user, get_cached_user
 
 
 class EmailBackend(ModelBackend):
     """
-    Autentizační backend, který umožňuje přihlášení pomocí emailu.
+    Autentizační backend, který umožňuje přihlášení pomocí emailu i uživatelského jména.
     """
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            # Hledáme uživatele podle emailu (username v našem případě obsahuje email)
-            user = User.objects.get(email=username)
-            if user.check_password(password):
-                return user
-        except User.DoesNotExist:
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
             return None
+
+        candidates = list(
+            UserModel._default_manager
+            .alias(email_lower=Lower('email'))
+            .filter(Q(email_lower=username.lower()) | Q(username=username))[:3]
+        )
+        # E-mail má přednost (přesná shoda, pak bez ohledu na velikost písmen)
+        user = (
+            next((u for u in candidates if u.email == username), None)
+            or next((u for u in candidates if u.email.lower() == username.lower()), None)
+            or next((u for u in candidates if u.username == username), None)
+        )
+        if user is None:
+            # Stejná práce jako u existujícího účtu, aby nešlo poznat podle času
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
         return None
 
     def get_user(self, user_id):
-        try:
-            return User.objects.get(pk=user_id)
-        except User.DoesNotExist:
-            return None
+        user = get_cached_user(user_id)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache_user(user)
+        return user
@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum, OuterRef, Subquery, DecimalField
+from django.db.models.functions import Coalesce
+from decimal import Decimal
+from accounts.models import CreditTransaction
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Porovná zůstatky User.credits se součtem pohybů v ledgeru (CreditTransaction) po dávkách'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Nesouhlasící zůstatky přepíše součtem z ledgeru',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Počet uživatelů zpracovaných v jedné dávce (výchozí 500)',
+        )
+
+    def handle(self, *args, **options):
+        fix = options['fix']
+        chunk_size = options['chunk_size']
+        if chunk_size <= 0:
+            raise CommandError('--chunk-size musí být kladné číslo')
+
+        ledger_sum = (
+            CreditTransaction.objects.filter(user=OuterRef('pk'))
+            .order_by()
+            .values('user')
+            .annotate(total=Sum('amount'))
+            .values('total')
+        )
+
+        checked = 0
+        mismatched = 0
+        last_pk = 0
+        while True:
+            # Keyset stránkování podle PK – v paměti je vždy jen jedna dávka
+            chunk = list(
+                User.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', 'username', 'credits')[:chunk_size]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+            checked += len(chunk)
+
+            # Součty ledgeru pro celou dávku jedním seskupeným dotazem
+            totals = dict(
+                CreditTransaction.objects.filter(user__in=[pk for pk, _, _ in chunk])
+                .values('user')
+                .annotate(total=Sum('amount'))
+                .values_list('user', 'total')
+            )
+
+            stale = []
+            for pk, username, credits in chunk:
+                expected = totals.get(pk) or Decimal('0.00')
+                if credits != expected:
+                    self.stdout.write(f'  ! {username}: zůstatek {credits} Kč, ledger {expected} Kč')
+                    stale.append(pk)
+            mismatched += len(stale)
+
+            if stale and fix:
+                # Součet se spočítá znovu přímo v UPDATE, aby oprava nepřepsala
+                # pohyby zapsané mezi čtením dávky a zápisem.
+                User.objects.filter(pk__in=stale).update(
+                    credits=Coalesce(
+                        Subquery(ledger_sum, output_field=DecimalField(max_digits=10, decimal_places=2)),
+                        Decimal('0.00'),
+                    )
+                )
+
+        if mismatched and not fix:
+            raise CommandError(f'Nalezeno {mismatched} nesouhlasících zůstatků z {checked} uživatelů (opravte přes --fix)')
+        self.stdout.write(self.style.SUCCESS(f'✓ Zkontrolováno {checked} uživatelů, opraveno {mismatched if fix else 0}'))
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_opening_balances(apps, schema_editor):
+    """Každému uživateli s nenulovým zůstatkem založí počáteční pohyb v ledgeru."""
+    User = apps.get_model('accounts', 'User')
+    CreditTransaction = apps.get_model('accounts', 'CreditTransaction')
+    batch = []
+    for user_id, credits in User.objects.exclude(credits=0).values_list('id', 'credits').iterator(chunk_size=500):
+        batch.append(CreditTransaction(
+            user_id=user_id, amount=credits, kind='adjustment', description='Počáteční zůstatek'
+        ))
+        if len(batch) >= 500:
+            CreditTransaction.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        CreditTransaction.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_alter_user_user_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreditTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, help_text='Kladná částka = připsání, záporná = odečtení.', max_digits=10)),
+                ('kind', models.CharField(choices=[('topup', 'Dobití'), ('booking', 'Rezervace'), ('refund', 'Vrácení za zrušenou rezervaci'), ('payment', 'Platba'), ('adjustment', 'Ruční úprava')], max_length=10)),
+                ('reference', models.CharField(blank=True, help_text='Odkaz na zdrojový záznam, např. "booking:42".', max_length=50)),
+                ('description', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credit_transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Pohyb kreditu',
+                'verbose_name_plural': 'Pohyby kreditu',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'created_at'], name='accounts_cr_user_id_8571da_idx')],
+            },
+        ),
+        migrations.RunPython(create_opening_balances, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,13 @@
 """
-Společné mixiny pro kontrolu přístupu napříč aplikací.
+Společné mixiny pro kontrolu přístupu a opakované POST požadavky napříč aplikací.
 """
+import re
+import time
+import uuid
+
 from django.contrib.auth.mixins import UserPassesTestMixin
+from django.core.cache import cache
+from django.http import HttpResponse
 from django.shortcuts import redirect
 from django.contrib import messages
 
@@ -29,3 +35,82 @@ class ClientRequiredMixin(UserPassesTestMixin):
     def handle_no_permission(self):
         messages.error(self.request, "K této stránce nemáte přístup.")
         return redirect('about')
+
+
+IDEMPOTENCY_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+_PENDING = 'pending'
+
+
+class IdempotentPostMixin:
+    """
+    Opakovaný POST se stejným klíčem (dvojklik, retry mobilní aplikace)
+    vrátí původní odpověď a znovu se nezpracuje.
+
+    Klíč posílá formulář ve skrytém poli `idempotency_key` (šablony jej
+    mají v kontextu) nebo klient v hlavičce `Idempotency-Key`. První
+    požadavek si klíč v cache zabere atomickým `cache.add`; úspěšná
+    odpověď (přesměrování nebo JSON) se uloží na `idempotency_ttl`
+    sekund a další požadavky s tímto klíčem ji dostanou bez dotazu do DB.
+    Neúspěšný pokus (např. chyba ve formuláři) klíč uvolní. Souběžný
+    duplikát chvíli počká na dokončení prvního požadavku.
+    """
+    idempotency_ttl = 24 * 60 * 60
+    # Jak dlouho smí trvat zpracování prvního požadavku, než klíč vyprší
+    idempotency_lock_ttl = 60
+    # Jak dlouho souběžný duplikát čeká na výsledek prvního požadavku
+    idempotency_wait = 5
+
+    def get_idempotency_key(self):
+        key = self.request.headers.get('Idempotency-Key') or self.request.POST.get('idempotency_key', '')
+        if not IDEMPOTENCY_KEY_PATTERN.match(key):
+            return None
+        return f'idempotency:{self.request.user.pk}:{type(self).__name__}:{key}'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Znovu zobrazený formulář (chyba validace) si ponechá původní klíč
+        posted = self.request.POST.get('idempotency_key', '')
+        context['idempotency_key'] = posted if IDEMPOTENCY_KEY_PATTERN.match(posted) else uuid.uuid4().hex
+        return context
+
+    def post(self, request, *args, **kwargs):
+        cache_key = self.get_idempotency_key()
+        if cache_key is None:
+            return super().post(request, *args, **kwargs)
+
+        if not cache.add(cache_key, _PENDING, timeout=self.idempotency_lock_ttl):
+            return self._replay(cache_key)
+
+        try:
+            response = super().post(request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+        if response.status_code in (301, 302, 303) or (
+            200 <= response.status_code < 300 and response.get('Content-Type', '').startswith('application/json')
+        ):
+            cache.set(cache_key, {
+                'status': response.status_code,
+                'content': response.content,
+                'headers': {
+                    name: response[name] for name in ('Location', 'Content-Type') if response.has_header(name)
+                },
+            }, timeout=self.idempotency_ttl)
+        else:
+            cache.delete(cache_key)
+        return response
+
+    def _replay(self, cache_key):
+        deadline = time.monotonic() + self.idempotency_wait
+        stored = cache.get(cache_key)
+        while stored == _PENDING and time.monotonic() < deadline:
+            time.sleep(0.1)
+            stored = cache.get(cache_key)
+        if not isinstance(stored, dict):
+            # První požadavek stále běží (nebo skončil chybou) – klient to může zkusit znovu
+            return HttpResponse("Požadavek se právě zpracovává, zkuste to prosím za chvíli.", status=409)
+        response = HttpResponse(stored['content'], status=stored['status'])
+        for name, value in stored['headers'].items():
+            response[name] = value
+        response['Idempotent-Replayed'] = 'true'
+        return response
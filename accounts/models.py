@@ -1,7 +1,12 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
 from django.utils import timezone
+from decimal import Decimal
+
+from .user_cache import forget_users
 
 class User(AbstractUser):
     USER_TYPE_CHOICES = (
@@ -20,12 +25,67 @@ class User(AbstractUser):
     phone = models.CharField(max_length=20, blank=True)
     bio = models.TextField(blank=True)
     
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Přihlášení e-mailem bez ohledu na velikost písmen (accounts.backends)
+            models.Index(Lower('email'), name='accounts_user_email_lower_idx'),
+        ]
+
     def __str__(self):
         return f"{self.get_full_name()} ({self.get_user_type_display()})"
 
-    def add_credits(self, amount):
+    def save(self, *args, **kwargs):
+        creating = self._state.adding
+        if not creating and kwargs.get('update_fields') is None:
+            # Zůstatek mění jen add_credits/charge_credits; běžné uložení profilu
+            # jej nesmí přepsat starší hodnotou z paměti.
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'credits'
+            ]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Počáteční zůstatek zadaný při vytvoření musí mít protějšek v ledgeru
+            if creating and self.credits:
+                CreditTransaction.objects.create(
+                    user=self, amount=self.credits, kind='adjustment', description='Počáteční zůstatek'
+                )
+
+    def add_credits(self, amount, kind='adjustment', reference='', description=''):
+        """
+        Připíše (záporná částka odečte) kredit a zapíše pohyb do ledgeru.
+        Zůstatek se mění úzkým `UPDATE credits = credits + amount` v téže
+        transakci jako zápis CreditTransaction, takže se souběžné změny neztratí.
+        Vrací vytvořený pohyb.
+        """
+        amount = Decimal(amount)
+        with transaction.atomic():
+            User.objects.filter(pk=self.pk).update(credits=F('credits') + amount)
+            forget_users([self.pk])
+            entry = CreditTransaction.objects.create(
+                user=self, amount=amount, kind=kind, reference=reference, description=description
+            )
         self.credits += amount
-        self.save()
+        return entry
+
+    def charge_credits(self, amount, kind='booking', reference='', description=''):
+        """
+        Odečte kredit, pouze pokud na něj zůstatek stačí (podmíněný UPDATE
+        `WHERE credits >= amount`). Vrací False, když kredit nestačí.
+        """
+        amount = Decimal(amount)
+        with transaction.atomic():
+            charged = User.objects.filter(pk=self.pk, credits__gte=amount).update(
+                credits=F('credits') - amount
+            )
+            if not charged:
+                return False
+            forget_users([self.pk])
+            CreditTransaction.objects.create(
+                user=self, amount=-amount, kind=kind, reference=reference, description=description
+            )
+        self.credits -= amount
+        return True
 
     @property
     def is_instructor(self) -> bool:
@@ -36,6 +96,39 @@ class User(AbstractUser):
         return self.user_type == 'client'
 
 
+class CreditTransaction(models.Model):
+    """
+    Pohyb na kreditním účtu uživatele (append-only ledger).
+    Součet `amount` za uživatele musí odpovídat `User.credits`;
+    ověřuje a případně opravuje příkaz reconcile_credits.
+    """
+    KIND_CHOICES = (
+        ('topup', 'Dobití'),
+        ('booking', 'Rezervace'),
+        ('refund', 'Vrácení za zrušenou rezervaci'),
+        ('payment', 'Platba'),
+        ('adjustment', 'Ruční úprava'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='credit_transactions')
+    amount = models.DecimalField(max_digits=10, decimal_places=2, help_text='Kladná částka = připsání, záporná = odečtení.')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    reference = models.CharField(max_length=50, blank=True, help_text='Odkaz na zdrojový záznam, např. "booking:42".')
+    description = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Pohyb kreditu'
+        verbose_name_plural = 'Pohyby kreditu'
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_kind_display()} {self.amount} Kč - {self.user.get_full_name() or self.user.username}"
+
+
 class AboutPage(models.Model):
     """
     Jednoduchá editovatelná stránka "O mě". Očekává se jedna instance.
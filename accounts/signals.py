@@ -0,0 +1,14 @@
+"""
+Signály, které při změně uživatele zneplatní cache get_user (accounts.backends).
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .user_cache import forget_users
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    forget_users([instance.pk])
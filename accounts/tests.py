@@ -1,10 +1,19 @@
 """
 Testy pro aplikaci accounts - uživatelské účty, registrace, autentizace.
 """
-from django.test import TestCase, Client
-from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import authenticate, get_user_model
 from django.urls import reverse
+from django.utils import timezone
 from decimal import Decimal
+from datetime import time, timedelta
+from unittest.mock import patch
+
+from bookings.models import Booking, Lesson, TimeSlot
+from .backends import EmailBackend
+from .views import BookingHistoryView
 
 User = get_user_model()
 
@@ -236,6 +245,47 @@ class UserLoginTests(TestCase):
         self.assertEqual(response.status_code, 302)
 
 
+class EmailBackendTests(TestCase):
+    """Testy autentizačního backendu (jeden dotaz, jeden hash, cache get_user)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='jana',
+            email='Jana.Novakova@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('100.00')
+        )
+
+    def test_login_by_email_case_insensitive_or_username(self):
+        """Přihlásit se lze e-mailem v libovolné velikosti písmen i uživatelským jménem."""
+        self.assertEqual(authenticate(username='jana.novakova@TEST.cz', password='testpass123'), self.user)
+        self.assertEqual(authenticate(username='jana', password='testpass123'), self.user)
+        self.assertIsNone(authenticate(username='JANA', password='testpass123'))
+
+    def test_failed_login_runs_one_query_and_one_hash(self):
+        """Neúspěšné přihlášení (špatné heslo i neexistující účet) stojí jeden dotaz a jeden hash."""
+        for username in ('jana.novakova@test.cz', 'neexistuje@test.cz'):
+            with patch('django.contrib.auth.base_user.check_password', return_value=False) as check, \
+                    patch('django.contrib.auth.base_user.make_password', return_value='!') as make, \
+                    self.assertNumQueries(1):
+                self.assertIsNone(authenticate(username=username, password='špatnéheslo'))
+            self.assertEqual(check.call_count + make.call_count, 1)
+
+    def test_get_user_is_cached_until_change(self):
+        """get_user se napodruhé obslouží z cache, změna kreditu ji zneplatní."""
+        backend = EmailBackend()
+        backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            cached = backend.get_user(self.user.pk)
+        # Každý request dostává vlastní instanci
+        cached.credits = Decimal('0.00')
+        self.assertEqual(backend.get_user(self.user.pk).credits, Decimal('100.00'))
+
+        self.user.add_credits(Decimal('50.00'))
+        self.assertEqual(backend.get_user(self.user.pk).credits, Decimal('150.00'))
+
+
 class UserPermissionsTests(TestCase):
     """Testy oprávnění podle role (klient vs. lektor)."""
 
@@ -320,3 +370,237 @@ class UserProfileTests(TestCase):
         """Test, že nepřihlášený uživatel je přesměrován."""
         response = self.client.get(reverse('accounts:profile'))
         self.assertEqual(response.status_code, 302)
+
+
+class AboutPageConditionalGetTests(TestCase):
+    """Testy pro podmíněný GET stránky O mně."""
+
+    def test_about_page_returns_not_modified_until_edited(self):
+        """Stránka O mně odpoví 304, dokud ji nikdo neupraví."""
+        from .models import AboutPage
+
+        page = AboutPage.objects.create(title='O mně', content='Původní text')
+        response = self.client.get(reverse('about'))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(reverse('about'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        page.content = 'Nový text'
+        page.save()
+        self.assertEqual(self.client.get(reverse('about'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class CreditLedgerTests(TestCase):
+    """Testy pro ledger kreditů (CreditTransaction) a rekonciliaci."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.client_user = User.objects.create_user(
+            username='klient@test.cz',
+            email='klient@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('100.00')
+        )
+
+    def test_balance_changes_are_recorded_in_ledger(self):
+        """Každá změna zůstatku má protějšek v ledgeru a součty souhlasí."""
+        from django.db.models import Sum
+
+        self.client_user.add_credits(Decimal('250.00'), kind='topup', reference='topup:1')
+        self.assertTrue(self.client_user.charge_credits(Decimal('50.00'), reference='booking:1'))
+        self.assertFalse(self.client_user.charge_credits(Decimal('1000.00')))
+
+        self.client_user.refresh_from_db()
+        self.assertEqual(self.client_user.credits, Decimal('300.00'))
+        ledger = self.client_user.credit_transactions.aggregate(total=Sum('amount'))['total']
+        self.assertEqual(ledger, self.client_user.credits)
+        self.assertEqual(
+            sorted(self.client_user.credit_transactions.values_list('kind', flat=True)),
+            ['adjustment', 'booking', 'topup']
+        )
+
+    def test_profile_save_does_not_overwrite_balance(self):
+        """Uložení profilu se zastaralou instancí nepřepíše zůstatek."""
+        stale = User.objects.get(pk=self.client_user.pk)
+        self.client_user.add_credits(Decimal('50.00'))
+        stale.first_name = 'Nové jméno'
+        stale.save()
+
+        self.client_user.refresh_from_db()
+        self.assertEqual(self.client_user.credits, Decimal('150.00'))
+        self.assertEqual(self.client_user.first_name, 'Nové jméno')
+
+    def test_reconcile_command_detects_and_fixes_drift(self):
+        """Příkaz reconcile_credits odhalí a opraví rozjetý zůstatek."""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        User.objects.filter(pk=self.client_user.pk).update(credits=Decimal('999.00'))
+        with self.assertRaises(CommandError):
+            call_command('reconcile_credits', stdout=StringIO())
+
+        call_command('reconcile_credits', '--fix', '--chunk-size', '1', stdout=StringIO())
+        self.client_user.refresh_from_db()
+        self.assertEqual(self.client_user.credits, Decimal('100.00'))
+
+
+class InstructorDashboardTests(TestCase):
+    """Testy dashboardu lektora – agregace v DB a stránkování lekcí."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.client_user = User.objects.create_user(
+            username='klient@test.cz',
+            email='klient@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('1000.00')
+        )
+        self.client.login(username='lektor@test.cz', password='testpass123')
+
+    def _create_lessons(self, count, days_offset):
+        for i in range(count):
+            lesson = Lesson.objects.create(
+                instructor=self.instructor,
+                title=f'Lekce {days_offset}-{i}',
+                price=Decimal('150.00'),
+                duration=60,
+                capacity=10,
+                date=timezone.localdate() + timedelta(days=days_offset + i),
+                start_time=time(9, 0)
+            )
+            slot = TimeSlot.objects.create(lesson=lesson, start_time=timezone.now() + timedelta(days=days_offset + i))
+            Booking.objects.create(client=self.client_user, time_slot=slot, status='confirmed')
+
+    def test_lessons_are_annotated_and_split(self):
+        """Nadcházející lekce mají počet termínů, obsazenost a tržbu z DB."""
+        self._create_lessons(2, 1)
+        self._create_lessons(1, -30)
+
+        response = self.client.get(reverse('accounts:instructor_dashboard'))
+
+        self.assertEqual(response.context['lesson_counts'], {'upcoming': 2, 'past': 1})
+        lesson = response.context['lessons'][0]
+        self.assertEqual((lesson.slot_count, lesson.booked_seats), (1, 1))
+        self.assertEqual(lesson.revenue, Decimal('150.00'))
+        self.assertEqual(response.context['total_revenue'], Decimal('450.00'))
+
+        past = self.client.get(reverse('accounts:instructor_dashboard'), {'lessons': 'past'})
+        self.assertEqual(len(past.context['lessons']), 1)
+
+    def test_revenue_uses_price_paid_after_price_change(self):
+        """Tržba vychází ze zaplacených cen, změna ceny lekce ji nepřepíše."""
+        self._create_lessons(1, 1)
+        lesson = Lesson.objects.get(instructor=self.instructor)
+        lesson.price = Decimal('300.00')
+        lesson.save()
+        other_client = User.objects.create_user(
+            username='klient2@test.cz',
+            email='klient2@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('1000.00')
+        )
+        Booking.objects.create(client=other_client, time_slot=TimeSlot.objects.get(lesson=lesson), status='confirmed')
+
+        response = self.client.get(reverse('accounts:instructor_dashboard'))
+
+        self.assertEqual(response.context['lessons'][0].revenue, Decimal('450.00'))
+        self.assertEqual(response.context['total_revenue'], Decimal('450.00'))
+
+    @override_settings(AUTH_USER_CACHE_TIMEOUT=0)  # porovnáváme dotazy view, ne zahřátí cache
+    def test_query_count_is_flat_and_pages_follow_cursor(self):
+        """Počet dotazů nezávisí na počtu lekcí; další stránka navazuje kurzorem."""
+        url = reverse('accounts:instructor_dashboard')
+        self._create_lessons(2, 1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        self._create_lessons(30, 10)
+        with CaptureQueriesContext(connection) as large:
+            first = self.client.get(url)
+        self.assertEqual(len(small), len(large))
+
+        second = self.client.get(url, {'after': first.context['next_cursor']})
+        seen = {lesson.pk for lesson in first.context['lessons']}
+        self.assertEqual(len(seen) + len(second.context['lessons']), 32)
+        self.assertFalse(seen & {lesson.pk for lesson in second.context['lessons']})
+
+
+class ClientBookingHistoryTests(TestCase):
+    """Testy přehledu a stránkované historie rezervací klienta."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.client_user = User.objects.create_user(
+            username='klient@test.cz',
+            email='klient@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('10000.00')
+        )
+        self.lesson = Lesson.objects.create(
+            instructor=self.instructor,
+            title='Test lekce',
+            price=Decimal('100.00'),
+            duration=60,
+            capacity=10,
+            date=timezone.localdate(),
+            start_time=time(9, 0)
+        )
+        self.client.login(username='klient@test.cz', password='testpass123')
+
+    def _book(self, offset):
+        slot = TimeSlot.objects.create(lesson=self.lesson, start_time=timezone.now() + offset)
+        return Booking.objects.create(client=self.client_user, time_slot=slot, status='confirmed')
+
+    def test_dashboard_lists_upcoming_with_db_cancellable_flag(self):
+        """Přehled ukáže jen nadcházející rezervace; příznak zrušení počítá DB."""
+        soon = self._book(timedelta(hours=1))
+        later = self._book(timedelta(days=2))
+        self._book(-timedelta(days=3))
+
+        response = self.client.get(reverse('accounts:client_dashboard'))
+
+        bookings = list(response.context['upcoming_bookings'])
+        self.assertEqual(bookings, [soon, later])
+        self.assertEqual([b.is_cancellable for b in bookings], [False, True])
+
+    def test_dashboard_query_count_does_not_grow_with_history(self):
+        """Dlouhá historie nezvyšuje počet dotazů přehledu."""
+        url = reverse('accounts:client_dashboard')
+        self._book(timedelta(days=1))
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        for i in range(5):
+            self._book(timedelta(days=2 + i))
+            self._book(-timedelta(days=10 + i))
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(url)
+        self.assertEqual(len(small), len(large))
+
+    def test_history_pages_follow_cursor(self):
+        """Historie navazuje kurzorem bez překryvu a končí bez dalšího kurzoru."""
+        created = [self._book(-timedelta(days=i + 1)) for i in range(5)]
+
+        with patch.object(BookingHistoryView, 'page_size', 3):
+            first = self.client.get(reverse('accounts:booking_history'))
+            second = self.client.get(reverse('accounts:booking_history'), {'after': first.context['next_cursor']})
+
+        self.assertEqual(first.context['bookings'], created[:3])
+        self.assertEqual(second.context['bookings'], created[3:])
+        self.assertIsNone(second.context['next_cursor'])
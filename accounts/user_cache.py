@@ -0,0 +1,49 @@
+"""
+Krátkodobá cache přihlášených uživatelů v paměti procesu (viz accounts.backends).
+
+Každý request dostane vlastní kopii instance, takže změny v paměti jednoho
+requestu neprosáknou do dalších. Záznam se zahodí při uložení/smazání
+uživatele (accounts.signals) a při hromadných změnách kreditu, které signály
+neposílají (`forget_users`). Mezi procesy platí jen `AUTH_USER_CACHE_TIMEOUT`.
+"""
+import copy
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+# Nad tento počet záznamů se cache vyprázdní (ochrana paměti procesu)
+MAX_SIZE = 10000
+
+_users = {}
+
+
+def get_cached_user(user_id):
+    cached = _users.get(user_id)
+    if cached and cached[0] > time.monotonic():
+        return copy.copy(cached[1])
+    return None
+
+
+def cache_user(user):
+    timeout = getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 5)
+    if not timeout:
+        return
+    if len(_users) >= MAX_SIZE:
+        _users.clear()
+    _users[user.pk] = (time.monotonic() + timeout, copy.copy(user))
+
+
+def forget_users(user_ids):
+    """
+    Zahodí uživatele z cache. Volá se i po commitu, aby souběžný request
+    nestihl mezitím uložit stav z doby před změnou.
+    """
+    user_ids = list(user_ids)
+
+    def _forget():
+        for user_id in user_ids:
+            _users.pop(user_id, None)
+
+    _forget()
+    transaction.on_commit(_forget)
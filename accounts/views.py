@@ -1,11 +1,20 @@
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+
 from django.shortcuts import redirect
 from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import CreateView, UpdateView, TemplateView
 from django.urls import reverse_lazy
+from django.db.models import Count, DecimalField, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.decorators import method_decorator
 from .forms import UserRegisterForm, AboutPageForm
 from payments.models import TopUp
+from bookings.models import Booking, Lesson, TimeSlot
 from .models import AboutPage
+from bookings.conditional import conditional_page
 
 User = get_user_model()
 
@@ -30,6 +39,15 @@ class ProfileView(LoginRequiredMixin, UpdateView):
 		context['default_instructor'] = User.objects.filter(user_type='instructor').first()
 		return context
 
+def _parse_lesson_cursor(value):
+	"""Kurzor stránkování lekcí ve tvaru "<datum>|<čas>|<pk>"; neplatný = první stránka."""
+	try:
+		date_value, time_value, pk = value.split('|')
+		return date.fromisoformat(date_value), dt_time.fromisoformat(time_value), int(pk)
+	except (AttributeError, ValueError):
+		return None
+
+
 class InstructorDashboardView(LoginRequiredMixin, TemplateView):
 	template_name = 'accounts/instructor_dashboard.html'
     
@@ -39,22 +57,152 @@ class InstructorDashboardView(LoginRequiredMixin, TemplateView):
 			return redirect('about')
 		return super().dispatch(request, *args, **kwargs)
     
+	lessons_per_page = 25
+	pending_topups_shown = 10
+
+	def get_lessons(self, upcoming, cursor):
+		"""
+		Lekce lektora s počtem termínů, obsazenými místy a tržbou spočítanými
+		v databázi (korelované poddotazy nad TimeSlot.booked_count a skutečně
+		zaplacenou Booking.price_paid), stránkované keysetem podle (date, start_time, pk).
+		"""
+		today = timezone.localdate()
+		slots = TimeSlot.objects.filter(lesson=OuterRef('pk')).order_by().values('lesson')
+		paid = (
+			Booking.objects.filter(time_slot__lesson=OuterRef('pk'), status='confirmed')
+			.order_by().values('time_slot__lesson')
+			.annotate(total=Sum('price_paid')).values('total')
+		)
+		lessons = (
+			Lesson.objects.filter(instructor=self.request.user)
+			.select_related('category')
+			.annotate(
+				slot_count=Coalesce(Subquery(slots.annotate(total=Count('pk')).values('total')), 0),
+				booked_seats=Coalesce(Subquery(slots.annotate(total=Sum('booked_count')).values('total')), 0),
+				revenue=Coalesce(
+					Subquery(paid, output_field=DecimalField(max_digits=12, decimal_places=2)), Decimal('0')
+				),
+			)
+		)
+		if upcoming:
+			lessons = lessons.filter(date__gte=today).order_by('date', 'start_time', 'pk')
+		else:
+			lessons = lessons.filter(date__lt=today).order_by('-date', '-start_time', '-pk')
+
+		if cursor:
+			date_value, time_value, pk = cursor
+			op = 'gt' if upcoming else 'lt'
+			lessons = lessons.filter(
+				Q(**{f'date__{op}': date_value})
+				| Q(date=date_value, **{f'start_time__{op}': time_value})
+				| Q(date=date_value, start_time=time_value, **{f'pk__{op}': pk})
+			)
+		return list(lessons[:self.lessons_per_page + 1])
+
 	def get_context_data(self, **kwargs):
 		context = super().get_context_data(**kwargs)
-		# Čekající dobití (globálně pro všechny klienty) - zobrazíme všechna
-		context['pending_topups'] = TopUp.objects.filter(status='pending').select_related('user').order_by('created_at')
+		upcoming = self.request.GET.get('lessons') != 'past'
+		lessons = self.get_lessons(upcoming, _parse_lesson_cursor(self.request.GET.get('after')))
+		context['next_cursor'] = None
+		if len(lessons) > self.lessons_per_page:
+			lessons = lessons[:self.lessons_per_page]
+			last = lessons[-1]
+			context['next_cursor'] = f'{last.date.isoformat()}|{last.start_time.isoformat()}|{last.pk}'
+		context['lessons'] = lessons
+		context['showing_upcoming'] = upcoming
+		context['is_first_page'] = 'after' not in self.request.GET
+
+		today = timezone.localdate()
+		context['lesson_counts'] = Lesson.objects.filter(instructor=self.request.user).aggregate(
+			upcoming=Count('pk', filter=Q(date__gte=today)),
+			past=Count('pk', filter=Q(date__lt=today)),
+		)
+		# Tržba = co klienti skutečně zaplatili, ne aktuální cena lekce
+		context['total_revenue'] = Booking.objects.filter(
+			time_slot__lesson__instructor=self.request.user, status='confirmed'
+		).aggregate(total=Sum('price_paid'))['total'] or 0
+
+		# Čekající dobití (globálně pro všechny klienty) – jen nejstarší, zbytek v seznamu ke schválení
+		pending = TopUp.objects.filter(status='pending')
+		context['pending_topups'] = pending.select_related('user').order_by('created_at')[:self.pending_topups_shown]
+		context['pending_topups_count'] = pending.count()
 		return context
 
-class ClientDashboardView(LoginRequiredMixin, TemplateView):
+class ClientOnlyMixin:
+	"""Nepřihlášené pošle LoginRequiredMixin na login, ostatní role na stránku O mně."""
+
+	def dispatch(self, request, *args, **kwargs):
+		if request.user.is_authenticated and request.user.user_type != 'client':
+			return redirect('about')
+		return super().dispatch(request, *args, **kwargs)
+
+
+class ClientDashboardView(LoginRequiredMixin, ClientOnlyMixin, TemplateView):
 	template_name = 'accounts/client_dashboard.html'
-    
+	upcoming_limit = 10
+
 	def get_context_data(self, **kwargs):
 		context = super().get_context_data(**kwargs)
-		if self.request.user.user_type != 'client':
-			return redirect('about')
+		# Jen nadcházející rezervace; starší jsou ve stránkované historii
+		context['upcoming_bookings'] = (
+			Booking.objects.filter(client=self.request.user, starts_at__gte=timezone.now())
+			.exclude(status='cancelled')
+			.select_related('time_slot__lesson')
+			.with_cancellation()
+			.order_by('starts_at', 'pk')[:self.upcoming_limit]
+		)
 		return context
 
 
+def _parse_booking_cursor(value):
+	"""Kurzor historie rezervací ve tvaru "<ISO začátek termínu>|<pk>"; neplatný = první stránka."""
+	try:
+		start_time, pk = value.rsplit('|', 1)
+		return datetime.fromisoformat(start_time), int(pk)
+	except (AttributeError, ValueError):
+		return None
+
+
+class BookingHistoryView(LoginRequiredMixin, ClientOnlyMixin, TemplateView):
+	"""
+	Celá historie rezervací klienta od nejnovějších, stránkovaná keysetem
+	podle (starts_at, pk) nad indexem (client, starts_at) – i roky rezervací
+	se čtou po stránkách.
+	"""
+	template_name = 'accounts/booking_history.html'
+	page_size = 25
+
+	def get_context_data(self, **kwargs):
+		context = super().get_context_data(**kwargs)
+		bookings = (
+			Booking.objects.filter(client=self.request.user)
+			.select_related('time_slot__lesson')
+			.with_cancellation()
+			.order_by('-starts_at', '-pk')
+		)
+		cursor = _parse_booking_cursor(self.request.GET.get('after'))
+		if cursor:
+			start_time, pk = cursor
+			bookings = bookings.filter(
+				Q(starts_at__lt=start_time) | Q(starts_at=start_time, pk__lt=pk)
+			)
+		bookings = list(bookings[:self.page_size + 1])
+		context['next_cursor'] = None
+		if len(bookings) > self.page_size:
+			bookings = bookings[:self.page_size]
+			last = bookings[-1]
+			context['next_cursor'] = f'{last.starts_at.isoformat()}|{last.pk}'
+		context['bookings'] = bookings
+		context['is_first_page'] = 'after' not in self.request.GET
+		return context
+
+
+def about_last_modified(request):
+	"""Poslední úprava stránky O mně (None, dokud stránka neexistuje)."""
+	return AboutPage.objects.aggregate(last=Max('updated_at'))['last']
+
+
+@method_decorator(conditional_page(about_last_modified, schedule=False), name='dispatch')
 class AboutView(TemplateView):
 	template_name = 'about.html'
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Lesson, TimeSlot, Booking
+from .models import Category, Lesson, TimeSlot, Booking, Notification, WaitlistEntry
 
 
 @admin.register(Category)
@@ -20,13 +20,25 @@ class LessonAdmin(admin.ModelAdmin):
 
 @admin.register(TimeSlot)
 class TimeSlotAdmin(admin.ModelAdmin):
-    list_display = ('lesson', 'start_time', 'is_available')
-    list_filter = ('is_available', 'start_time')
+    list_display = ('lesson', 'start_time', 'is_available', 'booked_count', 'cancelled_at')
+    list_filter = ('is_available', 'start_time', 'cancelled_at')
     search_fields = ('lesson__title',)
 
 
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
-    list_display = ('client', 'time_slot', 'status', 'created_at')
+    list_display = ('client', 'time_slot', 'status', 'price_paid', 'starts_at', 'created_at')
     list_filter = ('status', 'created_at')
     search_fields = ('client__username', 'client__first_name', 'client__last_name', 'time_slot__lesson__title')
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('client', 'time_slot', 'created_at')
+    search_fields = ('client__username', 'client__first_name', 'client__last_name', 'time_slot__lesson__title')
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'user', 'created_at', 'sent_at')
+    list_filter = ('sent_at', 'created_at')
+    search_fields = ('subject', 'user__username', 'user__email')
@@ -0,0 +1,52 @@
+"""
+Verzovaná cache veřejného rozvrhu.
+
+Všechny položky rozvrhu (měsíční data pro /lekce/, odpovědi feedu kalendáře)
+se ukládají pod klíčem obsahujícím aktuální "generaci" rozvrhu. Uložení nebo
+smazání Lesson/TimeSlot/Booking/Category generaci zvýší (viz bookings.signals),
+takže staré položky se už nikdy nepřečtou a samy vyprší. Funguje s libovolným
+Django cache backendem (locmem, file-based, memcached, redis).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+GENERATION_KEY = 'schedule:generation'
+
+
+def _timeout():
+    return getattr(settings, 'SCHEDULE_CACHE_TIMEOUT', 300)
+
+
+def get_schedule_generation():
+    """Vrátí aktuální generaci rozvrhu (při prázdné cache ji založí)."""
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Výchozí hodnota z času zaručí, že se po vypadnutí klíče z cache
+        # nevrátíme k dříve použité generaci a nepřečteme zastaralá data.
+        cache.add(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_schedule_generation():
+    """Zneplatní všechny uložené položky rozvrhu zvýšením generace."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Klíč v cache není – založíme novou generaci
+        get_schedule_generation()
+
+
+def cached_schedule(name, builder):
+    """
+    Vrátí položku rozvrhu `name` z cache aktuální generace, nebo ji sestaví
+    voláním `builder()` a uloží.
+    """
+    key = f'schedule:{get_schedule_generation()}:{name}'
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, timeout=_timeout())
+    return value
@@ -0,0 +1,86 @@
+"""
+Validátory pro podmíněné GET požadavky (ETag / Last-Modified).
+
+Last-Modified se počítá z levného `MAX(updated_at)` nad indexovanými sloupci.
+ETag u stránek rozvrhu navíc obsahuje generaci rozvrhu (bookings.cache), takže
+zachytí i smazání záznamů, která MAX(updated_at) nezmění, a identitu uživatele,
+protože hlavička stránek se pro přihlášené liší. Dokud čekají flash zprávy,
+validátory se nepočítají, aby 304 zprávy nespolkla.
+"""
+from django.contrib.messages import get_messages
+from django.db.models import Max
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from .cache import cached_schedule, get_schedule_generation
+from .models import Category, Lesson, TimeSlot
+
+
+def _has_pending_messages(request):
+    # len() zprávy načte, ale neoznačí jako přečtené
+    return bool(len(get_messages(request)))
+
+
+def _user_key(request):
+    user = getattr(request, 'user', None)
+    return str(user.pk) if user is not None and user.is_authenticated else 'anon'
+
+
+def _compute_schedule_last_modified():
+    candidates = [
+        Lesson.objects.aggregate(last=Max('updated_at'))['last'],
+        TimeSlot.objects.aggregate(last=Max('updated_at'))['last'],
+        Category.objects.aggregate(last=Max('updated_at'))['last'],
+    ]
+    candidates = [value for value in candidates if value is not None]
+    return max(candidates) if candidates else None
+
+
+def schedule_last_modified():
+    """
+    Poslední změna veřejného rozvrhu (lekce, termíny, kategorie). Hodnota se
+    drží v cache aktuální generace, takže opakované revalidace DB nezatíží.
+    """
+    return cached_schedule('last_modified', _compute_schedule_last_modified)
+
+
+def lesson_last_modified(lesson_pk):
+    """Poslední změna jedné lekce včetně jejích termínů a kategorie."""
+    values = Lesson.objects.filter(pk=lesson_pk).aggregate(
+        lesson=Max('updated_at'),
+        slots=Max('timeslot__updated_at'),
+        category=Max('category__updated_at'),
+    )
+    candidates = [value for value in values.values() if value is not None]
+    return max(candidates) if candidates else None
+
+
+def conditional_page(last_modified_func, per_user=True, schedule=True):
+    """
+    Dekorátor view, který odpoví `304 Not Modified` bez renderování šablony.
+
+    `last_modified_func(request, *args, **kwargs)` vrací datetime poslední
+    změny (nebo None, pokud validátor nelze určit). Výsledek se spočítá jen
+    jednou za požadavek a použije se pro ETag i Last-Modified. U stránek
+    rozvrhu (`schedule=True`) ETag obsahuje i generaci rozvrhu a aktuální
+    hodinu, protože sloty z výpisu mizí i pouhým plynutím času.
+    """
+    def _last_modified(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or _has_pending_messages(request):
+            return None
+        if not hasattr(request, '_conditional_last_modified'):
+            request._conditional_last_modified = last_modified_func(request, *args, **kwargs)
+        return request._conditional_last_modified
+
+    def _etag(request, *args, **kwargs):
+        last_modified = _last_modified(request, *args, **kwargs)
+        if last_modified is None:
+            return None
+        parts = [f'{last_modified.timestamp():.6f}']
+        if schedule:
+            parts += [str(get_schedule_generation()), timezone.now().strftime('%Y%m%d%H')]
+        if per_user:
+            parts.append(_user_key(request))
+        return '-'.join(parts)
+
+    return condition(etag_func=_etag, last_modified_func=_last_modified)
@@ -1,7 +1,8 @@
 from django import forms
 from .models import TimeSlot
+from .scheduling import describe_conflicts, find_conflicts
 from django.utils import timezone
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 class TimeSlotForm(forms.ModelForm):
@@ -32,9 +33,11 @@ class TimeSlotForm(forms.ModelForm):
         model = TimeSlot
         fields = []  # start_time se vytvoří z date + time
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, lesson=None, **kwargs):
         # Pokud editujeme existující TimeSlot, předvyplníme datum a čas
         super().__init__(*args, **kwargs)
+        # Lekce, ke které termín patří – podle ní se kontrolují překryvy
+        self.lesson = lesson
         if self.instance and self.instance.pk and self.instance.start_time:
             self.fields['date'].initial = self.instance.start_time.date()
             self.fields['time'].initial = self.instance.start_time.time()
@@ -56,6 +59,13 @@ class TimeSlotForm(forms.ModelForm):
             if start_datetime < timezone.now():
                 raise forms.ValidationError("Nelze vytvořit termín v minulosti.")
             
+            # Termín se nesmí překrývat s jinou lekcí lektora ani na stejném místě
+            if self.lesson is not None:
+                exclude = [self.instance.pk] if self.instance.pk else []
+                conflicts = find_conflicts(self.lesson, [start_datetime], exclude_slots=exclude)
+                if conflicts:
+                    raise forms.ValidationError(describe_conflicts(conflicts))
+            
             # Uložíme do cleaned_data
             cleaned_data['start_time'] = start_datetime
         elif not date and not time:
@@ -75,3 +85,178 @@ class TimeSlotForm(forms.ModelForm):
         if commit:
             instance.save()
         return instance
+
+
+class TimeSlotSeriesForm(forms.Form):
+    """
+    Formulář pro opakovanou sérii termínů (např. každé pondělí a středu do
+    konce sezóny). Série se rozvine v paměti metodou `occurrences()`.
+    """
+    FREQUENCY_CHOICES = (
+        ('weekly', 'Každý týden'),
+        ('biweekly', 'Každý druhý týden'),
+    )
+    WEEKDAY_CHOICES = (
+        ('0', 'Po'), ('1', 'Út'), ('2', 'St'), ('3', 'Čt'), ('4', 'Pá'), ('5', 'So'), ('6', 'Ne'),
+    )
+    # Nejdelší povolená série (ochrana proti překlepu v roce)
+    MAX_SPAN = timedelta(days=366)
+
+    start_date = forms.DateField(
+        label='Od data',
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+    )
+    until = forms.DateField(
+        label='Do data (včetně)',
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+    )
+    time = forms.TimeField(
+        label='Čas začátku',
+        widget=forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}),
+    )
+    frequency = forms.ChoiceField(
+        label='Opakování',
+        choices=FREQUENCY_CHOICES,
+        initial='weekly',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    weekdays = forms.MultipleChoiceField(
+        label='Dny v týdnu',
+        choices=WEEKDAY_CHOICES,
+        widget=forms.CheckboxSelectMultiple,
+    )
+    exclude_dates = forms.CharField(
+        label='Vynechat data',
+        required=False,
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 2, 'placeholder': '24.12.2025, 31.12.2025'}),
+        help_text='Svátky a volna oddělené čárkou nebo novým řádkem (DD.MM.RRRR).',
+    )
+
+    def clean_exclude_dates(self):
+        dates = set()
+        for chunk in self.cleaned_data['exclude_dates'].replace('\n', ',').split(','):
+            chunk = chunk.strip()
+            if not chunk:
+                continue
+            for fmt in ('%d.%m.%Y', '%Y-%m-%d'):
+                try:
+                    dates.add(datetime.strptime(chunk, fmt).date())
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise forms.ValidationError(f"Neplatné datum: {chunk}")
+        return dates
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date = cleaned_data.get('start_date')
+        until = cleaned_data.get('until')
+        if start_date and until:
+            if until < start_date:
+                raise forms.ValidationError("Konec série musí být po jejím začátku.")
+            if until - start_date > self.MAX_SPAN:
+                raise forms.ValidationError("Série může trvat nejvýše jeden rok.")
+        return cleaned_data
+
+    def occurrences(self):
+        """Vrátí seřazené časy začátků série (aware datetime), jen budoucí a bez vynechaných dnů."""
+        data = self.cleaned_data
+        weekdays = {int(day) for day in data['weekdays']}
+        step_weeks = 2 if data['frequency'] == 'biweekly' else 1
+        # Týdny se počítají od pondělí týdne, ve kterém série začíná
+        first_monday = data['start_date'] - timedelta(days=data['start_date'].weekday())
+        now = timezone.now()
+        tz = timezone.get_current_timezone()
+
+        starts = []
+        day = data['start_date']
+        while day <= data['until']:
+            week_index = (day - first_monday).days // 7
+            if day.weekday() in weekdays and week_index % step_weeks == 0 and day not in data['exclude_dates']:
+                start = timezone.make_aware(datetime.combine(day, data['time']), tz)
+                if start >= now:
+                    starts.append(start)
+            day += timedelta(days=1)
+        return starts
+
+
+class TimeSlotShiftForm(forms.Form):
+    """
+    Formulář pro hromadný přesun budoucích termínů lekce o zadaný posun.
+    Výběr termínů: všechny budoucí, jeden den v týdnu, nebo rozsah dat.
+    """
+    SCOPE_CHOICES = (
+        ('future', 'Všechny budoucí termíny'),
+        ('weekday', 'Termíny v jeden den týdne'),
+        ('range', 'Termíny v rozsahu dat'),
+    )
+
+    scope = forms.ChoiceField(
+        label='Které termíny',
+        choices=SCOPE_CHOICES,
+        initial='future',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    weekday = forms.ChoiceField(
+        label='Den v týdnu',
+        choices=TimeSlotSeriesForm.WEEKDAY_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    date_from = forms.DateField(
+        label='Od data',
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+    )
+    date_to = forms.DateField(
+        label='Do data (včetně)',
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
+    )
+    days = forms.IntegerField(
+        label='Posun ve dnech',
+        initial=0,
+        min_value=-365,
+        max_value=365,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+    minutes = forms.IntegerField(
+        label='Posun v minutách',
+        initial=0,
+        min_value=-1439,
+        max_value=1439,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': 5}),
+        help_text='Záporná hodnota posouvá dříve.',
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        scope = cleaned_data.get('scope')
+        if scope == 'weekday' and not cleaned_data.get('weekday'):
+            self.add_error('weekday', "Vyberte den v týdnu.")
+        if scope == 'range':
+            date_from = cleaned_data.get('date_from')
+            date_to = cleaned_data.get('date_to')
+            if not date_from or not date_to:
+                raise forms.ValidationError("Zadejte začátek i konec rozsahu dat.")
+            if date_to < date_from:
+                raise forms.ValidationError("Konec rozsahu musí být po jeho začátku.")
+        if cleaned_data.get('days') == 0 and cleaned_data.get('minutes') == 0:
+            raise forms.ValidationError("Zadejte nenulový posun.")
+        return cleaned_data
+
+    @property
+    def offset(self):
+        return timedelta(days=self.cleaned_data['days'], minutes=self.cleaned_data['minutes'])
+
+    def filter_slots(self, queryset):
+        """Omezí QuerySet termínů na vybrané budoucí termíny."""
+        data = self.cleaned_data
+        queryset = queryset.filter(start_time__gte=timezone.now(), cancelled_at__isnull=True)
+        if data['scope'] == 'weekday':
+            # iso_week_day: 1 = pondělí … 7 = neděle
+            queryset = queryset.filter(start_time__iso_week_day=int(data['weekday']) + 1)
+        elif data['scope'] == 'range':
+            queryset = queryset.filter(start_time__date__range=(data['date_from'], data['date_to']))
+        return queryset
@@ -0,0 +1,56 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from bookings.scheduling import ScheduleIndex
+
+
+class Command(BaseCommand):
+    help = 'Vyhledá překrývající se termíny (stejný lektor nebo stejné místo) v zadaném období'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            help='První kontrolovaný den ve formátu RRRR-MM-DD (výchozí dnes)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=366,
+            help='Délka kontrolovaného období ve dnech (výchozí 366, tj. celá sezóna)',
+        )
+
+    def handle(self, *args, **options):
+        if options['date_from']:
+            date_from = parse_date(options['date_from'])
+            if date_from is None:
+                raise CommandError('--from musí být datum ve formátu RRRR-MM-DD')
+        else:
+            date_from = timezone.localdate()
+        if options['days'] <= 0:
+            raise CommandError('--days musí být kladné číslo')
+
+        start = timezone.make_aware(datetime.combine(date_from, time.min), timezone.get_current_timezone())
+        end = start + timedelta(days=options['days'])
+
+        # Celé období jedním dotazem, překryvy zametací přímkou v O(n log n)
+        index = ScheduleIndex.load(start, end)
+        overlaps = [
+            (first, second, reason) for first, second, reason in index.find_overlaps()
+            if second.start >= start
+        ]
+        labels = {'instructor': 'lektor', 'location': 'místo'}
+        for first, second, reason in overlaps:
+            self.stdout.write(
+                f'  ! {labels[reason]}: slot #{first.slot_id} {first.title} '
+                f'{timezone.localtime(first.start):%d.%m.%Y %H:%M} × slot #{second.slot_id} {second.title} '
+                f'{timezone.localtime(second.start):%d.%m.%Y %H:%M} ({second.location})'
+            )
+
+        checked = len(index.intervals)
+        if overlaps:
+            raise CommandError(f'Nalezeno {len(overlaps)} překryvů mezi {checked} termíny')
+        self.stdout.write(self.style.SUCCESS(f'✓ Žádné překryvy mezi {checked} termíny'))
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from bookings.cache import bump_schedule_generation
+from bookings.models import TimeSlot, Booking
+
+
+class Command(BaseCommand):
+    help = 'Přepočítá (nebo jen ověří) denormalizované počítadlo TimeSlot.booked_count po dávkách'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Pouze ověří počítadla a vypíše nesrovnalosti, nic neukládá',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Počet slotů zpracovaných v jedné dávce (výchozí 500)',
+        )
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        chunk_size = options['chunk_size']
+        if chunk_size <= 0:
+            raise CommandError('--chunk-size musí být kladné číslo')
+
+        confirmed_count = (
+            Booking.objects.filter(time_slot=OuterRef('pk'), status='confirmed')
+            .order_by()
+            .values('time_slot')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+
+        checked = 0
+        mismatched = 0
+        last_pk = 0
+        while True:
+            # Keyset stránkování podle PK – paměť je omezena velikostí dávky
+            chunk = list(
+                TimeSlot.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .only('pk', 'booked_count')[:chunk_size]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            checked += len(chunk)
+
+            # Skutečné počty potvrzených rezervací pro celou dávku jedním dotazem
+            actual = dict(
+                Booking.objects.filter(time_slot__in=[slot.pk for slot in chunk], status='confirmed')
+                .values('time_slot')
+                .annotate(total=Count('pk'))
+                .values_list('time_slot', 'total')
+            )
+
+            stale = []
+            for slot in chunk:
+                expected = actual.get(slot.pk, 0)
+                if slot.booked_count != expected:
+                    self.stdout.write(f'  ! Slot #{slot.pk}: uloženo {slot.booked_count}, skutečně {expected}')
+                    stale.append(slot)
+            mismatched += len(stale)
+
+            if stale and not check_only:
+                # Počet se znovu spočítá přímo v UPDATE, takže oprava nepřepíše
+                # rezervace vzniklé mezi čtením dávky a zápisem.
+                TimeSlot.objects.filter(pk__in=[slot.pk for slot in stale]).update(
+                    booked_count=Coalesce(Subquery(confirmed_count), 0),
+                    updated_at=timezone.now(),
+                )
+                # UPDATE neposílá signály, cache rozvrhu zneplatníme ručně
+                bump_schedule_generation()
+
+        if check_only:
+            if mismatched:
+                raise CommandError(f'Nalezeno {mismatched} nesouhlasících počítadel z {checked} slotů')
+            self.stdout.write(self.style.SUCCESS(f'✓ Všech {checked} počítadel souhlasí'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✓ Zkontrolováno {checked} slotů, opraveno {mismatched}'))
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from bookings.models import Notification
+
+
+class Command(BaseCommand):
+    help = 'Odešle čekající upozornění (outbox Notification) e-mailem po dávkách'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Počet upozornění odeslaných jedním SMTP spojením (výchozí 100)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size <= 0:
+            raise CommandError('--batch-size musí být kladné číslo')
+
+        sent = 0
+        skipped = 0
+        while True:
+            batch = list(
+                Notification.objects.filter(sent_at__isnull=True)
+                .select_related('user')
+                .order_by('created_at')[:batch_size]
+            )
+            if not batch:
+                break
+
+            messages = [
+                EmailMessage(notification.subject, notification.body, settings.DEFAULT_FROM_EMAIL, [notification.user.email])
+                for notification in batch if notification.user.email
+            ]
+            # Celá dávka jedním spojením; při chybě zůstane neodeslaná a zkusí se příště
+            with get_connection() as connection:
+                connection.send_messages(messages)
+            Notification.objects.filter(pk__in=[notification.pk for notification in batch]).update(
+                sent_at=timezone.now()
+            )
+            sent += len(messages)
+            # Uživatelé bez e-mailu – upozornění se označí jako vyřízené
+            skipped += len(batch) - len(messages)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Odesláno {sent} upozornění, bez e-mailu {skipped}'))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:34
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_booked_count(apps, schema_editor):
+    """Naplní počítadlo podle existujících potvrzených rezervací (jeden UPDATE)."""
+    TimeSlot = apps.get_model('bookings', 'TimeSlot')
+    Booking = apps.get_model('bookings', 'Booking')
+    confirmed_count = (
+        Booking.objects.filter(time_slot=OuterRef('pk'), status='confirmed')
+        .order_by()
+        .values('time_slot')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    TimeSlot.objects.update(booked_count=Coalesce(Subquery(confirmed_count), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_alter_booking_status_alter_timeslot_start_time_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeslot',
+            name='booked_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Obsazená místa'),
+        ),
+        migrations.RunPython(backfill_booked_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_schedule_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['instructor', 'date', 'start_time'], name='bookings_le_instruc_ad4151_idx'),
+        ),
+    ]
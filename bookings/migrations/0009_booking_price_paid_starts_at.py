@@ -0,0 +1,62 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 500
+
+
+def backfill_snapshot(apps, schema_editor):
+    """
+    Naplní price_paid a starts_at existujících rezervací po dávkách podle PK.
+    Skutečně zaplacená cena se dříve neukládala, použije se aktuální cena lekce.
+    """
+    Booking = apps.get_model('bookings', 'Booking')
+    TimeSlot = apps.get_model('bookings', 'TimeSlot')
+    slot = TimeSlot.objects.filter(pk=OuterRef('time_slot_id'))
+
+    last_pk = 0
+    while True:
+        ids = list(
+            Booking.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            break
+        last_pk = ids[-1]
+        Booking.objects.filter(pk__in=ids).update(
+            starts_at=Subquery(slot.values('start_time')[:1]),
+            price_paid=Subquery(slot.values('lesson__price')[:1]),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0008_lesson_instructor_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='price_paid',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Zaplacená cena'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='starts_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Začátek termínu'),
+        ),
+        migrations.RunPython(backfill_snapshot, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='booking',
+            name='price_paid',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, verbose_name='Zaplacená cena'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='starts_at',
+            field=models.DateTimeField(blank=True, verbose_name='Začátek termínu'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['client', 'starts_at'], name='bookings_bo_client__9b1438_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0009_booking_price_paid_starts_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeslot',
+            name='cancelled_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Zrušeno lektorem'),
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=200, verbose_name='Předmět')),
+                ('body', models.TextField(verbose_name='Text')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Odesláno')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Upozornění',
+                'verbose_name_plural': 'Upozornění',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['sent_at', 'created_at'], name='bookings_no_sent_at_54f064_idx')],
+            },
+        ),
+    ]
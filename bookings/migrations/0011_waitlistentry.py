@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0010_timeslot_cancelled_at_notification'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('client', models.ForeignKey(limit_choices_to={'user_type': 'client'}, on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+                ('time_slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='bookings.timeslot')),
+            ],
+            options={
+                'verbose_name': 'Čekající v pořadníku',
+                'verbose_name_plural': 'Pořadník',
+                'ordering': ['created_at', 'pk'],
+                'indexes': [models.Index(fields=['time_slot', 'created_at'], name='bookings_wa_time_sl_9d4cc5_idx')],
+                'constraints': [models.UniqueConstraint(fields=('time_slot', 'client'), name='waitlist_unique_client_slot')],
+            },
+        ),
+    ]
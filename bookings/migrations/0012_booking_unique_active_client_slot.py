@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:36
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+
+
+def cancel_duplicate_bookings(apps, schema_editor):
+    """
+    Před přidáním omezení zruší duplicitní aktivní rezervace (vzniklé dvojím
+    odesláním formuláře). Ponechá se nejstarší, u ostatních potvrzených se
+    vrátí kredit a uvolní místo – stejně jako při běžném stornu.
+    """
+    Booking = apps.get_model('bookings', 'Booking')
+    TimeSlot = apps.get_model('bookings', 'TimeSlot')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    CreditTransaction = apps.get_model('accounts', 'CreditTransaction')
+
+    active = Booking.objects.filter(~Q(status='cancelled'))
+    duplicates = (
+        active.values('client_id', 'time_slot_id')
+        .annotate(total=Count('pk'))
+        .filter(total__gt=1)
+    )
+    for group in duplicates:
+        extra = list(
+            active.filter(client_id=group['client_id'], time_slot_id=group['time_slot_id']).order_by('created_at', 'pk')[1:]
+        )
+        for booking in extra:
+            # Kredit se strhává a místo obsazuje jen za potvrzenou rezervaci
+            if booking.status == 'confirmed':
+                User.objects.filter(pk=booking.client_id).update(credits=F('credits') + booking.price_paid)
+                CreditTransaction.objects.create(
+                    user_id=booking.client_id,
+                    amount=booking.price_paid,
+                    kind='refund',
+                    reference=f'booking:{booking.pk}',
+                    description='Duplicitní rezervace',
+                )
+                TimeSlot.objects.filter(pk=booking.time_slot_id, booked_count__gt=0).update(
+                    booked_count=F('booked_count') - 1, is_available=True
+                )
+        Booking.objects.filter(pk__in=[booking.pk for booking in extra]).update(status='cancelled')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0011_waitlistentry'),
+        ('accounts', '0005_credittransaction'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_duplicate_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'cancelled'), _negated=True), fields=('client', 'time_slot'), name='booking_unique_active_client_slot'),
+        ),
+    ]
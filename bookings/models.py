@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.utils import timezone
@@ -15,6 +17,7 @@ class Category(models.Model):
     slug = models.SlugField(max_length=100, unique=True, blank=True, verbose_name='Slug (URL)')
     description = models.TextField(blank=True, verbose_name='Popis')
     order = models.IntegerField(default=0, verbose_name='Pořadí', help_text='Nižší číslo = dříve v seznamu')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name='Změněno')
 
     class Meta:
         ordering = ['order', 'name']
@@ -54,6 +57,14 @@ class Lesson(models.Model):
         related_name='lessons',
         verbose_name='Kategorie'
     )
+    # Čas poslední změny – slouží pro Last-Modified/ETag veřejných stránek
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    class Meta:
+        indexes = [
+            # Keyset stránkování lekcí na dashboardu lektora
+            models.Index(fields=['instructor', 'date', 'start_time']),
+        ]
     
     def __str__(self):
         category_name = self.category.name if self.category else 'Bez kategorie'
@@ -68,11 +79,88 @@ class TimeSlot(models.Model):
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE)
     start_time = models.DateTimeField(db_index=True)  # Index pro rychlejší vyhledávání
     is_available = models.BooleanField(default=True)
+    # Denormalizovaný počet potvrzených rezervací – udržuje Booking.save/cancel
+    # atomicky přes F() výrazy, přepočet zajišťuje příkaz rebuild_seat_counters.
+    booked_count = models.PositiveIntegerField(default=0, verbose_name='Obsazená místa')
+    # auto_now se při QuerySet.update() neuplatní – tyto cesty jej nastavují ručně
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Termín zrušený lektorem (bookings.services.cancel_time_slot) zůstává
+    # kvůli historii rezervací, ale z rozvrhu zmizí
+    cancelled_at = models.DateTimeField(null=True, blank=True, verbose_name='Zrušeno lektorem')
+    
+    @property
+    def seats_left(self):
+        """Počet volných míst (kapacita lekce mínus potvrzené rezervace)."""
+        return max(self.lesson.capacity - self.booked_count, 0)
+    
+    def reserve_seat(self, force=False):
+        """
+        Obsadí jedno místo jediným podmíněným UPDATE (kontrola kapacity i
+        inkrement proběhnou v DB současně, bez globálního zámku). Slot se
+        uzavře (`is_available=False`), až obsazenost dosáhne kapacity lekce.
+        Proběhlý nebo zrušený termín místo nepřijme. S `force=True` se místo
+        započítá i bez kontroly (přímé uložení rezervace).
+        Vrací True, pokud bylo místo obsazeno.
+        """
+        capacity = self.lesson.capacity
+        slots = TimeSlot.objects.filter(pk=self.pk)
+        if not force:
+            slots = slots.filter(
+                is_available=True, booked_count__lt=capacity,
+                start_time__gt=timezone.now(), cancelled_at__isnull=True,
+            )
+        # Pravé strany SET vidí původní hodnoty řádku, proto `capacity - 1`
+        reserved = slots.update(
+            updated_at=timezone.now(),
+            booked_count=F('booked_count') + 1,
+            is_available=Case(
+                When(booked_count__gte=capacity - 1, then=Value(False)),
+                default=F('is_available'),
+            ),
+        )
+        if reserved:
+            self.booked_count += 1
+            if self.booked_count >= capacity:
+                self.is_available = False
+        return bool(reserved)
+    
+    def release_seat(self):
+        """Uvolní jedno místo a slot znovu otevře pro rezervace."""
+        TimeSlot.objects.filter(pk=self.pk).update(
+            updated_at=timezone.now(),
+            booked_count=Greatest(F('booked_count') - 1, Value(0)),
+            is_available=True,
+        )
+        self.booked_count = max(self.booked_count - 1, 0)
+        self.is_available = True
     
     def clean(self):
         if self.start_time and self.start_time < timezone.now():
             raise ValidationError("Nelze vytvořit termín v minulosti")
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'start_time' in field_names:
+            instance._saved_start_time = values[field_names.index('start_time')]
+        return instance
+    
+    def save(self, *args, **kwargs):
+        """
+        Při změně začátku (např. v adminu) přesune i snímek Booking.starts_at,
+        aby historie rezervací i lhůta pro storno odpovídaly novému času.
+        """
+        moved = (
+            not self._state.adding
+            and hasattr(self, '_saved_start_time')
+            and self._saved_start_time != self.start_time
+        )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if moved:
+                Booking.objects.filter(time_slot_id=self.pk).update(starts_at=self.start_time)
+        self._saved_start_time = self.start_time
+    
     def __str__(self):
         return f"{self.lesson.title} - {self.start_time.strftime('%d.%m.%Y %H:%M')}"
     
@@ -82,6 +170,28 @@ class TimeSlot(models.Model):
             models.Index(fields=['start_time', 'is_available']),
         ]
 
+# Rezervaci lze zrušit nejpozději tolik před začátkem termínu
+CANCELLATION_WINDOW = timedelta(hours=2)
+
+
+class BookingQuerySet(models.QuerySet):
+    def with_cancellation(self):
+        """
+        Doplní příznak `is_cancellable` spočítaný v databázi, aby výpisy
+        nemusely volat can_cancel() pro každou rezervaci zvlášť.
+        """
+        return self.annotate(
+            is_cancellable=Case(
+                When(
+                    ~Q(status='cancelled') & Q(starts_at__gte=timezone.now() + CANCELLATION_WINDOW),
+                    then=Value(True),
+                ),
+                default=Value(False),
+                output_field=models.BooleanField(),
+            )
+        )
+
+
 class Booking(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Čeká na potvrzení'),
@@ -98,6 +208,32 @@ class Booking(models.Model):
     time_slot = models.ForeignKey(TimeSlot, on_delete=models.CASCADE)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Snímek ceny a začátku termínu v okamžiku rezervace – refundace vrací
+    # skutečně zaplacenou částku a výpisy ani kontrola storna nemusí joinovat
+    # TimeSlot/Lesson. Při přesunu termínu se starts_at mění spolu se slotem
+    # (bookings.services.reschedule_time_slots).
+    price_paid = models.DecimalField(max_digits=10, decimal_places=2, blank=True, verbose_name='Zaplacená cena')
+    starts_at = models.DateTimeField(blank=True, verbose_name='Začátek termínu')
+    
+    objects = BookingQuerySet.as_manager()
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Stav uložený v DB – save() zpracuje jen přechod do confirmed
+        if 'status' in field_names:
+            instance._saved_status = values[field_names.index('status')]
+        return instance
+    
+    def _confirms(self):
+        """Mění toto uložení stav na confirmed (nová rezervace nebo přechod z jiného stavu)?"""
+        if self.status != 'confirmed' or hasattr(self, '_booking_processed'):
+            return False
+        if self._state.adding:
+            return True
+        if not hasattr(self, '_saved_status'):
+            self._saved_status = Booking.objects.filter(pk=self.pk).values_list('status', flat=True).first()
+        return self._saved_status != 'confirmed'
     
     def clean(self):
         if not self.time_slot.is_available:
@@ -108,18 +244,26 @@ class Booking(models.Model):
     
     def save(self, *args, **kwargs):
         """
-        Automaticky odečte kredity a uzamkne slot při potvrzení rezervace.
+        Automaticky odečte kredity a obsadí místo ve slotu při potvrzení rezervace.
+        Opakované uložení už potvrzené rezervace (admin, načtená instance) nic nestrhává.
         """
-        if self.status == 'confirmed' and not hasattr(self, '_booking_processed'):
-            # Credits je již DecimalField, není potřeba konverze
-            self.client.credits -= self.time_slot.lesson.price
-            self.client.save()
-            
-            self.time_slot.is_available = False
-            self.time_slot.save()
-            
-            self._booking_processed = True
-        super().save(*args, **kwargs)
+        if self.starts_at is None:
+            self.starts_at = self.time_slot.start_time
+        if self.price_paid is None:
+            self.price_paid = self.time_slot.lesson.price
+        with transaction.atomic():
+            process = self._confirms()
+            super().save(*args, **kwargs)
+            self._saved_status = self.status
+            if process:
+                # Kredit odečteme v DB (F výraz) a zapíšeme do ledgeru s odkazem na rezervaci
+                self.client.add_credits(
+                    -self.price_paid, kind='booking', reference=f'booking:{self.pk}'
+                )
+                
+                # Počítadlo i dostupnost měníme v DB jedním UPDATE, aby se
+                # souběžné rezervace navzájem nepřepisovaly.
+                self.time_slot.reserve_seat(force=True)
     
     def __str__(self):
         return f"{self.client.get_full_name()} - {self.time_slot}"
@@ -129,32 +273,173 @@ class Booking(models.Model):
         if self.status == 'cancelled':
             return False
         now = timezone.now()
-        time_before_lesson = self.time_slot.start_time - now
-        return time_before_lesson >= timedelta(hours=2)
+        time_before_lesson = self.starts_at - now
+        return time_before_lesson >= CANCELLATION_WINDOW
     
     def cancellation_deadline(self):
         """Vrací čas, do kdy je možné rezervaci zrušit (2 hodiny před začátkem lekce)"""
-        return self.time_slot.start_time - timedelta(hours=2)
+        return self.starts_at - CANCELLATION_WINDOW
     
     def cancel(self):
         """Zruší rezervaci a vrátí kredit klientovi"""
         if not self.can_cancel():
             raise ValidationError("Rezervaci nelze zrušit méně než 2 hodiny před začátkem lekce")
         
-        # Vrátit kredit klientovi (DecimalField, žádná konverze není potřeba)
-        self.client.credits += self.time_slot.lesson.price
-        self.client.save()
-        
-        # Uvolnit termín
-        self.time_slot.is_available = True
-        self.time_slot.save()
-        
-        # Změnit stav rezervace
-        self.status = 'cancelled'
-        self.save()
+        with transaction.atomic():
+            # Kredit i místo se vrací jen za potvrzenou rezervaci – čekající
+            # rezervace nic nestrhla ani neobsadila, dostupnost slotu nemění
+            confirmed = self.status == 'confirmed'
+            if confirmed:
+                self.client.add_credits(self.price_paid, kind='refund', reference=f'booking:{self.pk}')
+                self.time_slot.release_seat()
+            
+            # Změnit stav rezervace
+            self.status = 'cancelled'
+            self.save()
+            
+            # Uvolněné místo hned dostane první čekající z pořadníku
+            if confirmed:
+                WaitlistEntry.promote_next(self.time_slot)
     
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['client', 'starts_at']),
+        ]
+        constraints = [
+            # Klient má na termínu nejvýše jednu aktivní rezervaci (pojistka proti dvojímu odeslání)
+            models.UniqueConstraint(
+                fields=['client', 'time_slot'],
+                condition=~Q(status='cancelled'),
+                name='booking_unique_active_client_slot',
+            ),
         ]
+
+
+class WaitlistEntry(models.Model):
+    """
+    Pořadník na plně obsazený termín. Při uvolnění místa (Booking.cancel)
+    dostane rezervaci nejdříve přihlášený klient s dostatečným kreditem.
+    """
+    time_slot = models.ForeignKey(TimeSlot, on_delete=models.CASCADE, related_name='waitlist')
+    client = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='waitlist_entries',
+        limit_choices_to={'user_type': 'client'}
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['created_at', 'pk']
+        verbose_name = 'Čekající v pořadníku'
+        verbose_name_plural = 'Pořadník'
+        constraints = [
+            models.UniqueConstraint(fields=['time_slot', 'client'], name='waitlist_unique_client_slot'),
+        ]
+        indexes = [
+            # Hlava fronty termínu jedním indexovaným dotazem
+            models.Index(fields=['time_slot', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.client.get_full_name()} čeká na {self.time_slot}"
+    
+    def position(self):
+        """Pořadí v pořadníku (1 = další na řadě)."""
+        return WaitlistEntry.objects.filter(
+            Q(created_at__lt=self.created_at) | Q(created_at=self.created_at, pk__lt=self.pk),
+            time_slot_id=self.time_slot_id,
+        ).count() + 1
+    
+    @classmethod
+    def promote_next(cls, time_slot):
+        """
+        Obsadí volné místo termínu prvním čekajícím, kterému stačí kredit.
+        Hlavu fronty vybere jeden dotaz (klienti bez kreditu se přeskočí
+        v SQL), místo i kredit se zaberou podmíněnými UPDATE a selhání vrátí
+        jen vnořený savepoint. Záznam, který povýšit nejde, frontu neblokuje:
+        klient, který už termín má, se z pořadníku smaže, klient, jemuž
+        mezitím klesl kredit, se přeskočí, a zkusí se další v pořadí.
+        Vrací vytvořenou rezervaci, nebo None.
+        """
+        lesson = time_slot.lesson
+        skipped = []
+        while True:
+            entry = (
+                cls.objects.filter(time_slot=time_slot, client__credits__gte=lesson.price)
+                .exclude(pk__in=skipped)
+                .select_related('client')
+                .order_by('created_at', 'pk')
+                .first()
+            )
+            if entry is None:
+                return None
+            
+            booked_count, is_available = time_slot.booked_count, time_slot.is_available
+            try:
+                with transaction.atomic():
+                    if not time_slot.reserve_seat():
+                        return None
+                    booking = Booking(
+                        client=entry.client,
+                        time_slot=time_slot,
+                        status='confirmed',
+                        price_paid=lesson.price,
+                        starts_at=time_slot.start_time,
+                    )
+                    # Místo i kredit řeší tato metoda, Booking.save je nesmí měnit znovu
+                    booking._booking_processed = True
+                    booking.save()
+                    if not entry.client.charge_credits(booking.price_paid, kind='booking', reference=f'booking:{booking.pk}'):
+                        raise ValidationError("Nedostatek kreditů pro rezervaci")
+                    entry.delete()
+                    when = timezone.localtime(time_slot.start_time).strftime('%d.%m.%Y %H:%M')
+                    Notification.objects.create(
+                        user=entry.client,
+                        subject=f"Uvolnilo se místo: {lesson.title} {when}",
+                        body=(
+                            f"V termínu {when} lekce {lesson.title} se uvolnilo místo a rezervovali jsme ho pro vás "
+                            f"z pořadníku. Z kreditu jsme odečetli {booking.price_paid} Kč."
+                        ),
+                    )
+            except IntegrityError:
+                # Klient už má aktivní rezervaci termínu – v pořadníku nemá co dělat
+                time_slot.booked_count, time_slot.is_available = booked_count, is_available
+                entry.delete()
+                continue
+            except ValidationError:
+                # Kredit mezitím klesl – záznam ponecháme, místo dostane další v pořadí
+                time_slot.booked_count, time_slot.is_available = booked_count, is_available
+                skipped.append(entry.pk)
+                continue
+            return booking
+
+
+class Notification(models.Model):
+    """
+    Odchozí upozornění uživateli (outbox). Záznamy vznikají hromadně v téže
+    transakci jako změna, o které informují, a odesílá je po dávkách
+    příkaz send_notifications.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='notifications'
+    )
+    subject = models.CharField(max_length=200, verbose_name='Předmět')
+    body = models.TextField(verbose_name='Text')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Odesláno')
+    
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = 'Upozornění'
+        verbose_name_plural = 'Upozornění'
+        indexes = [
+            models.Index(fields=['sent_at', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} – {self.user.get_full_name() or self.user.username}"
@@ -0,0 +1,128 @@
+"""
+Kontrola překryvů termínů – lektor nemůže učit dvě lekce naráz a dvě lekce
+se nemohou potkat na stejném místě (Lesson.location).
+
+Termín zabírá interval [start_time, start_time + Lesson.duration). Potřebné
+okno rozvrhu se načte jedním dotazem do seznamu seřazeného podle začátku
+(ScheduleIndex). Dotaz na překryv je pak půlení intervalu (bisect) a audit
+celé sezóny projde seznam jednou zametací přímkou, tj. O(n log n) místo
+porovnávání všech dvojic.
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import TimeSlot
+
+# Horní odhad délky lekce – ohraničuje zespodu rozsahový dotaz na kandidáty
+MAX_LESSON_LENGTH = timedelta(hours=12)
+
+Interval = namedtuple('Interval', 'start end slot_id lesson_id instructor_id location title')
+
+
+class ScheduleIndex:
+    """Termíny v daném okně seřazené podle začátku."""
+
+    def __init__(self, intervals):
+        self.intervals = sorted(intervals)
+        self._starts = [interval.start for interval in self.intervals]
+        self._max_length = max(
+            (interval.end - interval.start for interval in self.intervals), default=timedelta(0)
+        )
+
+    @classmethod
+    def load(cls, start, end, instructor_id=None, location=None, exclude_slots=()):
+        """
+        Načte jedním dotazem termíny, které mohou zasahovat do okna [start, end).
+        S `instructor_id`/`location` jen termíny daného lektora nebo místa.
+        """
+        queryset = TimeSlot.objects.filter(
+            start_time__gt=start - MAX_LESSON_LENGTH, start_time__lt=end, cancelled_at__isnull=True
+        )
+        if instructor_id is not None or location is not None:
+            queryset = queryset.filter(
+                Q(lesson__instructor_id=instructor_id) | Q(lesson__location=location)
+            )
+        if exclude_slots:
+            queryset = queryset.exclude(pk__in=list(exclude_slots))
+        rows = queryset.values_list(
+            'start_time', 'lesson__duration', 'pk', 'lesson_id',
+            'lesson__instructor_id', 'lesson__location', 'lesson__title',
+        )
+        return cls(
+            Interval(slot_start, slot_start + timedelta(minutes=duration), *rest)
+            for slot_start, duration, *rest in rows
+        )
+
+    def overlapping(self, start, end, instructor_id, location):
+        """Termíny téhož lektora nebo místa, které se překrývají s [start, end)."""
+        lo = bisect_right(self._starts, start - self._max_length)
+        hi = bisect_left(self._starts, end)
+        return [
+            interval for interval in self.intervals[lo:hi]
+            if interval.end > start
+            and (interval.instructor_id == instructor_id or interval.location == location)
+        ]
+
+    def find_overlaps(self):
+        """
+        Zametací přímka přes celý index. Vrací seznam trojic (dřívější,
+        pozdější, důvod), kde důvod je 'instructor' nebo 'location'.
+        """
+        active = defaultdict(list)
+        overlaps = []
+        for current in self.intervals:
+            reported = set()
+            for reason, key in (('instructor', current.instructor_id), ('location', current.location)):
+                # Ponecháme jen termíny, které ještě neskončily
+                running = [other for other in active[reason, key] if other.end > current.start]
+                for other in running:
+                    if other.slot_id not in reported:
+                        reported.add(other.slot_id)
+                        overlaps.append((other, current, reason))
+                running.append(current)
+                active[reason, key] = running
+        return overlaps
+
+
+def find_conflicts(lesson, starts, exclude_slots=()):
+    """
+    Zkontroluje termíny lekce začínající v `starts` (s aktuální délkou,
+    lektorem a místem lekce v paměti) proti zbytku rozvrhu. Termíny
+    z `exclude_slots` (ty, které se právě přesouvají) se ignorují.
+    Vrací seznam dvojic (začátek, kolidující Interval) seřazený podle začátku.
+    """
+    starts = sorted(starts)
+    if not starts:
+        return []
+    duration = timedelta(minutes=lesson.duration)
+    index = ScheduleIndex.load(
+        starts[0], starts[-1] + duration,
+        instructor_id=lesson.instructor_id, location=lesson.location, exclude_slots=exclude_slots,
+    )
+    conflicts = []
+    for position, start in enumerate(starts):
+        for other in index.overlapping(start, start + duration, lesson.instructor_id, lesson.location):
+            conflicts.append((start, other))
+        # Kontrolované termíny mají stejnou délku – stačí porovnat sousedy
+        if position and start - starts[position - 1] < duration:
+            previous = starts[position - 1]
+            conflicts.append((start, Interval(
+                previous, previous + duration, None, lesson.pk,
+                lesson.instructor_id, lesson.location, lesson.title,
+            )))
+    return conflicts
+
+
+def describe_conflicts(conflicts, limit=3):
+    """Krátký popis kolizí pro chybovou hlášku formuláře."""
+    parts = [
+        f"{other.title} {timezone.localtime(other.start).strftime('%d.%m.%Y %H:%M')} ({other.location})"
+        for _, other in conflicts[:limit]
+    ]
+    if len(conflicts) > limit:
+        parts.append(f"a další ({len(conflicts) - limit})")
+    return "Termín se překrývá s jinou lekcí lektora nebo na stejném místě: " + ", ".join(parts) + "."
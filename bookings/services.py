@@ -0,0 +1,328 @@
+"""
+Doménové operace nad rezervacemi, které musí proběhnout atomicky.
+
+Views volají tyto funkce místo přímé manipulace s modely, aby kontrola
+dostupnosti, odečtení kreditu a založení rezervace proběhly v jedné
+transakci a obstály i při souběžných požadavcích.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, Value, When
+from django.utils import timezone
+
+from accounts.user_cache import forget_users
+from accounts.models import CreditTransaction
+from .cache import bump_schedule_generation
+from .models import TimeSlot, Booking, Notification, WaitlistEntry
+from .scheduling import find_conflicts
+
+
+User = get_user_model()
+
+
+class BookingError(Exception):
+    """Rezervaci nelze provést; zpráva je určena přímo uživateli."""
+
+
+class BasketError(BookingError):
+    """
+    Košík nelze zarezervovat. `errors` je {id termínu: zpráva}; prázdný
+    slovník znamená chybu celého košíku (zpráva výjimky).
+    """
+
+    def __init__(self, message, errors=None):
+        self.errors = errors or {}
+        super().__init__(message)
+
+
+class ScheduleConflict(BookingError):
+    """
+    Přesun by vytvořil překryv s jiným termínem lektora nebo místa.
+    `conflicts` je seznam dvojic (nový začátek přesouvaného termínu,
+    kolidující bookings.scheduling.Interval).
+    """
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__(f"Přesun koliduje s jinými termíny ({len(conflicts)}×). Nic nebylo přesunuto.")
+
+
+def _schedule_changed():
+    # Hromadné UPDATE/bulk_create neposílají signály – zneplatníme cache jako bookings.signals
+    bump_schedule_generation()
+    transaction.on_commit(bump_schedule_generation)
+
+
+def book_time_slot(client, time_slot_id):
+    """
+    Vytvoří potvrzenou rezervaci termínu pro klienta.
+
+    Celá operace běží v `transaction.atomic`. Místo ve slotu se obsadí
+    podmíněným `UPDATE ... WHERE booked_count < capacity` (viz
+    `TimeSlot.reserve_seat`), který řádek zamkne jen po dobu příkazu, a kredit
+    se odečte podmíněným `UPDATE ... WHERE credits >= price` včetně zápisu do
+    ledgeru (`User.charge_credits`). Souběžní klienti tak nemohou slot
+    přeplnit ani utratit tentýž kredit dvakrát. Při chybě se vyhodí
+    `BookingError` a transakce se vrátí (včetně již uložené rezervace).
+    """
+    with transaction.atomic():
+        try:
+            time_slot = TimeSlot.objects.select_related('lesson').get(pk=time_slot_id)
+        except TimeSlot.DoesNotExist:
+            raise BookingError("Tento termín neexistuje.")
+
+        if not time_slot.is_available or time_slot.cancelled_at is not None or time_slot.start_time <= timezone.now():
+            raise BookingError("Tento termín již není dostupný.")
+
+        # Kontrola kapacity a obsazení místa v jednom podmíněném UPDATE
+        if not time_slot.reserve_seat():
+            raise BookingError("Tento termín je již plně obsazen.")
+
+        booking = Booking(
+            client=client,
+            time_slot=time_slot,
+            status='confirmed',
+            price_paid=time_slot.lesson.price,
+            starts_at=time_slot.start_time,
+        )
+        # Kredit i slot zpracovává služba, Booking.save je nesmí měnit znovu
+        booking._booking_processed = True
+        try:
+            booking.save()
+        except IntegrityError:
+            # Unikátní omezení: souběžný duplikát (dvojklik) už rezervaci založil
+            raise BookingError("Tento termín už máte rezervovaný.")
+
+        if not client.charge_credits(booking.price_paid, kind='booking', reference=f'booking:{booking.pk}'):
+            raise BookingError("Nemáte dostatek kreditů pro tuto rezervaci.")
+
+        # Klient, který si místo zarezervoval sám, už v pořadníku čekat nemusí
+        WaitlistEntry.objects.filter(time_slot=time_slot, client=client).delete()
+
+    return booking
+
+
+# Nejvíce termínů v jednom košíku
+MAX_BASKET_SIZE = 50
+
+
+def book_time_slots(client, time_slot_ids):
+    """
+    Zarezervuje klientovi více termínů najednou – všechny, nebo žádný.
+
+    Termíny i to, zda je klient už nemá rezervované, se ověří jedním
+    dotazem; při chybě se vyhodí BasketError s hlášením pro každý termín.
+    Místa se obsadí jedním UPDATE podmíněným na volné kapacitě každého
+    termínu – souběžné rezervace košíku nevadí, dokud je místo (jinak se
+    celá transakce vrátí) – kredit se odečte jednou
+    za celý košík a rezervace i pohyby v ledgeru se vloží přes
+    `bulk_create`. Vrací seznam vytvořených rezervací.
+    """
+    time_slot_ids = list(dict.fromkeys(int(pk) for pk in time_slot_ids))
+    if not time_slot_ids:
+        raise BasketError("Košík je prázdný.")
+    if len(time_slot_ids) > MAX_BASKET_SIZE:
+        raise BasketError(f"Najednou lze rezervovat nejvýše {MAX_BASKET_SIZE} termínů.")
+
+    now = timezone.now()
+    already_booked = Booking.objects.filter(time_slot=OuterRef('pk'), client=client).exclude(status='cancelled')
+    slots = {
+        slot.pk: slot
+        for slot in TimeSlot.objects.filter(pk__in=time_slot_ids)
+        .select_related('lesson')
+        .annotate(already_booked=Exists(already_booked))
+    }
+
+    errors = {}
+    for pk in time_slot_ids:
+        slot = slots.get(pk)
+        if slot is None:
+            errors[pk] = "Tento termín neexistuje."
+        elif slot.cancelled_at is not None or slot.start_time < now:
+            errors[pk] = "Tento termín již není dostupný."
+        elif slot.already_booked:
+            errors[pk] = "Tento termín už máte rezervovaný."
+        elif not slot.is_available or slot.booked_count >= slot.lesson.capacity:
+            errors[pk] = "Tento termín je již plně obsazen."
+    if errors:
+        raise BasketError("Některé termíny nelze rezervovat, nic nebylo rezervováno.", errors)
+
+    slots = [slots[pk] for pk in time_slot_ids]
+    total = sum((slot.lesson.price for slot in slots), Decimal('0'))
+    with transaction.atomic():
+        # Každý termín jen pokud v něm je stále volno; pravé strany SET vidí
+        # původní hodnoty řádku, proto se termín uzavírá při `capacity - 1`
+        free = Q()
+        for slot in slots:
+            free |= Q(pk=slot.pk, booked_count__lt=slot.lesson.capacity)
+        reserved = TimeSlot.objects.filter(
+            free, is_available=True, cancelled_at__isnull=True, start_time__gt=now
+        ).update(
+            booked_count=F('booked_count') + 1,
+            is_available=Case(
+                *[When(pk=slot.pk, booked_count__gte=slot.lesson.capacity - 1, then=Value(False)) for slot in slots],
+                default=Value(True),
+            ),
+            updated_at=now,
+        )
+        if reserved != len(slots):
+            raise BasketError("Některý termín se mezitím zaplnil, nic nebylo rezervováno.")
+
+        if not User.objects.filter(pk=client.pk, credits__gte=total).update(credits=F('credits') - total):
+            raise BasketError(f"Nemáte dostatek kreditů, košík stojí {total} Kč.")
+        forget_users([client.pk])
+
+        try:
+            bookings = Booking.objects.bulk_create([
+                Booking(
+                    client=client,
+                    time_slot=slot,
+                    status='confirmed',
+                    price_paid=slot.lesson.price,
+                    starts_at=slot.start_time,
+                )
+                for slot in slots
+            ])
+        except IntegrityError:
+            raise BasketError("Některý z termínů už máte rezervovaný, nic nebylo rezervováno.")
+        CreditTransaction.objects.bulk_create([
+            CreditTransaction(
+                user=client, amount=-booking.price_paid, kind='booking', reference=f'booking:{booking.pk}'
+            )
+            for booking in bookings
+        ])
+        WaitlistEntry.objects.filter(time_slot__in=time_slot_ids, client=client).delete()
+        _schedule_changed()
+    client.credits -= total
+    return bookings
+
+
+def reschedule_time_slots(slot_ids, new_start):
+    """
+    Přesune termíny na nový začátek a v téže transakci posune i snímek
+    `Booking.starts_at` jejich rezervací. Vrací počet přesunutých termínů.
+    """
+    slot_ids = list(slot_ids)
+    with transaction.atomic():
+        moved = TimeSlot.objects.filter(pk__in=slot_ids).update(start_time=new_start, updated_at=timezone.now())
+        Booking.objects.filter(time_slot__in=slot_ids).update(starts_at=new_start)
+        _schedule_changed()
+    return moved
+
+
+def create_time_slot_series(lesson, starts, batch_size=500):
+    """
+    Založí termíny lekce pro všechny časy ze `starts`, které ještě neexistují.
+    Existující termíny se zjistí jedním rozsahovým dotazem, nové se vloží
+    přes `bulk_create`. Vrací seznam vytvořených termínů.
+    """
+    starts = sorted(set(starts))
+    if not starts:
+        return []
+    existing = set(
+        TimeSlot.objects.filter(lesson=lesson, start_time__range=(starts[0], starts[-1]))
+        .values_list('start_time', flat=True)
+    )
+    new_slots = [TimeSlot(lesson=lesson, start_time=start) for start in starts if start not in existing]
+    with transaction.atomic():
+        created = TimeSlot.objects.bulk_create(new_slots, batch_size=batch_size)
+        _schedule_changed()
+    return created
+
+
+def shift_time_slots(lesson, slots, offset):
+    """
+    Posune vybrané termíny lekce (QuerySet) o `offset` jediným UPDATE
+    a v téže transakci posune i `Booking.starts_at` jejich rezervací.
+    Při kolizi vyhodí ScheduleConflict a nezmění nic. Vrací počet přesunutých termínů.
+    """
+    slot_starts = dict(slots.filter(lesson=lesson).values_list('pk', 'start_time'))
+    if not slot_starts:
+        return 0
+    if min(slot_starts.values()) + offset < timezone.now():
+        raise BookingError("Termíny nelze přesunout do minulosti.")
+    conflicts = find_conflicts(lesson, [start + offset for start in slot_starts.values()], exclude_slots=slot_starts)
+    if conflicts:
+        raise ScheduleConflict(conflicts)
+
+    with transaction.atomic():
+        moved = TimeSlot.objects.filter(pk__in=list(slot_starts)).update(
+            start_time=F('start_time') + offset, updated_at=timezone.now()
+        )
+        Booking.objects.filter(time_slot__in=list(slot_starts)).update(starts_at=F('starts_at') + offset)
+        _schedule_changed()
+    return moved
+
+
+def cancel_time_slot(time_slot, reason=''):
+    """
+    Zruší termín lektorem: všechny jeho rezervace se zruší jedním UPDATE,
+    kredit se vrátí jedním UPDATE pro všechny klienty (CASE podle klienta),
+    do ledgeru se zapíše jeden pohyb na potvrzenou rezervaci (čekající
+    rezervace nebyly zaplacené, nic se za ně nevrací) a klientům se založí
+    upozornění. Počet dotazů nezávisí na počtu rezervací.
+    Vrací počet zrušených rezervací.
+    """
+    now = timezone.now()
+    lesson = time_slot.lesson
+    with transaction.atomic():
+        # Uzavřený slot už nepřijme novou rezervaci (reserve_seat vyžaduje is_available)
+        closed = TimeSlot.objects.filter(pk=time_slot.pk, cancelled_at__isnull=True).update(
+            cancelled_at=now, is_available=False, booked_count=0, updated_at=now
+        )
+        if not closed:
+            raise BookingError("Tento termín už byl zrušen.")
+        bookings = list(
+            Booking.objects.filter(time_slot=time_slot)
+            .exclude(status='cancelled')
+            .values_list('pk', 'client_id', 'price_paid', 'status')
+        )
+        if bookings:
+            Booking.objects.filter(pk__in=[pk for pk, _, _, _ in bookings]).update(status='cancelled')
+
+            # Kredit se strhává jen při potvrzení (Booking.save), jen to se vrací
+            refunds = [
+                (pk, client_id, price_paid)
+                for pk, client_id, price_paid, status in bookings if status == 'confirmed'
+            ]
+            totals = defaultdict(Decimal)
+            for _, client_id, price_paid in refunds:
+                totals[client_id] += price_paid
+            if totals:
+                User.objects.filter(pk__in=totals).update(credits=F('credits') + Case(
+                    *[When(pk=client_id, then=Value(total)) for client_id, total in totals.items()],
+                    output_field=models.DecimalField(max_digits=10, decimal_places=2),
+                ))
+                forget_users(totals)
+
+            when = timezone.localtime(time_slot.start_time).strftime('%d.%m.%Y %H:%M')
+            description = f"Lektor zrušil termín {when}"
+            CreditTransaction.objects.bulk_create([
+                CreditTransaction(
+                    user_id=client_id, amount=price_paid, kind='refund',
+                    reference=f'booking:{pk}', description=description,
+                )
+                for pk, client_id, price_paid in refunds
+            ])
+
+            body = f"Lekce {lesson.title} v termínu {when} byla lektorem zrušena."
+            if reason:
+                body += f"\n\nDůvod: {reason}"
+            Notification.objects.bulk_create([
+                Notification(
+                    user_id=client_id,
+                    subject=f"Zrušená lekce: {lesson.title} {when}",
+                    body=f"{body}\n\nVrátili jsme vám {price_paid} kreditů." if status == 'confirmed' else body,
+                )
+                for _, client_id, price_paid, status in bookings
+            ])
+        # Pořadník zrušeného termínu ztrácí smysl
+        WaitlistEntry.objects.filter(time_slot=time_slot).delete()
+        _schedule_changed()
+    time_slot.cancelled_at = now
+    time_slot.is_available = False
+    time_slot.booked_count = 0
+    return len(bookings)
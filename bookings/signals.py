@@ -0,0 +1,23 @@
+"""
+Signály, které při změně rozvrhu zneplatní verzovanou cache (bookings.cache).
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import bump_schedule_generation
+from .models import Category, Lesson, TimeSlot, Booking
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_schedule_cache(sender, **kwargs):
+    bump_schedule_generation()
+    # Souběžný čtenář mohl mezitím uložit stav před commitem – zneplatníme znovu
+    transaction.on_commit(bump_schedule_generation)
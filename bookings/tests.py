@@ -1,15 +1,35 @@
 """
 Testy pro aplikaci bookings - lekce, časové sloty, rezervace.
 """
-from django.test import TestCase, Client
+import threading
+import time as time_module
+from io import StringIO
+from unittest.mock import patch
+
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core import mail
+from django.core.cache import cache
 from decimal import Decimal
 from datetime import datetime, timedelta, time
 
-from .models import Category, Lesson, TimeSlot, Booking
+from .models import Category, Lesson, TimeSlot, Booking, Notification, WaitlistEntry
+from . import services
+from .forms import TimeSlotForm, TimeSlotSeriesForm, TimeSlotShiftForm
+from .scheduling import ScheduleIndex, find_conflicts
+from .services import (
+    BasketError, BookingError, ScheduleConflict, book_time_slot, book_time_slots, cancel_time_slot,
+    create_time_slot_series, reschedule_time_slots, shift_time_slots,
+)
+from accounts.models import CreditTransaction
+from payments.models import TopUp
 
 User = get_user_model()
 
@@ -144,7 +164,8 @@ class BookingModelTests(TestCase):
             user_type='instructor'
         )
         
-        self.category = Category.objects.create(name='Jóga', slug='joga', order=1)
+        # Kategorii Jóga zakládá už datová migrace 0004
+        self.category, _ = Category.objects.get_or_create(name='Jóga', defaults={'slug': 'joga', 'order': 1})
         
         tomorrow = timezone.now().date() + timedelta(days=1)
         
@@ -189,9 +210,34 @@ class BookingModelTests(TestCase):
             initial_credits - self.lesson.price
         )
         
-        # Ověření, že slot byl uzamčen
+        # Ověření, že bylo obsazeno jedno místo a slot zůstal otevřený (kapacita 10)
+        self.time_slot.refresh_from_db()
+        self.assertEqual(self.time_slot.booked_count, 1)
+        self.assertTrue(self.time_slot.is_available)
+
+    def test_slot_closes_when_capacity_is_reached(self):
+        """Test, že se slot uzavře až po naplnění kapacity."""
+        self.lesson.capacity = 2
+        self.lesson.save()
+        other_client = User.objects.create_user(
+            username='klient2@test.cz',
+            email='klient2@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('500.00')
+        )
+
+        book_time_slot(self.client_user, self.time_slot.id)
+        self.time_slot.refresh_from_db()
+        self.assertTrue(self.time_slot.is_available)
+
+        book_time_slot(other_client, self.time_slot.id)
         self.time_slot.refresh_from_db()
         self.assertFalse(self.time_slot.is_available)
+        self.assertEqual(self.time_slot.seats_left, 0)
+
+        with self.assertRaises(BookingError):
+            book_time_slot(self.client_user, self.time_slot.id)
 
     def test_booking_with_insufficient_credits(self):
         """Test rezervace s nedostatečným kreditem."""
@@ -412,3 +458,1391 @@ class BookingViewTests(TestCase):
         # Očekáváme redirect na login
         self.assertEqual(response.status_code, 302)
         self.assertIn('/accounts/login/', response.url)
+
+
+class EventsFeedTests(TestCase):
+    """Testy pro JSON feed kalendáře (bookings:get_events)."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.client_user = User.objects.create_user(
+            username='klient@test.cz',
+            email='klient@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('1000.00')
+        )
+        self.lesson = Lesson.objects.create(
+            instructor=self.instructor,
+            title='Test lekce',
+            price=Decimal('100.00'),
+            duration=60,
+            capacity=10,
+            date=timezone.now().date() + timedelta(days=1),
+            start_time=time(9, 0)
+        )
+        self.base = timezone.now() + timedelta(days=1)
+        self.slots = [
+            TimeSlot.objects.create(lesson=self.lesson, start_time=self.base + timedelta(days=i))
+            for i in range(5)
+        ]
+        # Slot mimo požadované okno
+        self.far_slot = TimeSlot.objects.create(lesson=self.lesson, start_time=self.base + timedelta(days=60))
+        Booking.objects.create(client=self.client_user, time_slot=self.slots[0], status='confirmed')
+
+    def _get(self, start, end):
+        return self.client.get(reverse('bookings:get_events'), {
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+        })
+
+    def test_feed_respects_requested_window(self):
+        """Feed vrací jen sloty v intervalu [start, end)."""
+        response = self._get(self.base - timedelta(hours=1), self.base + timedelta(days=3))
+        ids = [event['id'] for event in response.json()]
+        self.assertEqual(ids, [slot.id for slot in self.slots[:3]])
+        self.assertNotIn(self.far_slot.id, ids)
+
+    def test_feed_reports_confirmed_bookings(self):
+        """Počet volných míst odpovídá potvrzeným rezervacím."""
+        response = self._get(self.base - timedelta(hours=1), self.base + timedelta(hours=1))
+        event = response.json()[0]
+        self.assertEqual(event['extendedProps']['availableSpots'], self.lesson.capacity - 1)
+
+    def test_feed_query_count_is_constant(self):
+        """Počet dotazů nezávisí na počtu slotů v okně (žádné N+1)."""
+        # První požadavek naplní cache validátorů (Last-Modified), měříme až feed
+        self._get(self.base, self.base + timedelta(hours=1))
+        with self.assertNumQueries(1):
+            response = self._get(self.base - timedelta(hours=1), self.base + timedelta(days=30))
+        self.assertEqual(len(response.json()), 5)
+
+    def test_feed_window_is_clamped(self):
+        """Příliš široký rozsah se ořízne a různé konce sdílí jednu položku cache."""
+        start = self.base - timedelta(hours=1)
+        self._get(self.base, self.base + timedelta(hours=1))
+        response = self._get(start, start + timedelta(days=36500))
+        self.assertNotIn(self.far_slot.id, [event['id'] for event in response.json()])
+
+        with self.assertNumQueries(0):
+            again = self._get(start, start + timedelta(days=9999))
+        self.assertEqual(again.json(), response.json())
+
+
+class SeatCounterTests(TestCase):
+    """Testy pro denormalizované počítadlo TimeSlot.booked_count."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.client_user = User.objects.create_user(
+            username='klient@test.cz',
+            email='klient@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('1000.00')
+        )
+        self.lesson = Lesson.objects.create(
+            instructor=self.instructor,
+            title='Test lekce',
+            price=Decimal('100.00'),
+            duration=60,
+            capacity=10,
+            date=timezone.now().date() + timedelta(days=1),
+            start_time=time(9, 0)
+        )
+        self.time_slot = TimeSlot.objects.create(
+            lesson=self.lesson,
+            start_time=timezone.now() + timedelta(days=1)
+        )
+
+    def test_cancelling_pending_booking_keeps_full_slot_closed(self):
+        """Zrušení čekající rezervace neotevře plně obsazený termín."""
+        self.lesson.capacity = 1
+        self.lesson.save()
+        Booking.objects.create(client=self.client_user, time_slot=self.time_slot, status='confirmed')
+        other = User.objects.create_user(
+            username='klient2@test.cz',
+            email='klient2@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('1000.00')
+        )
+        pending = Booking.objects.create(client=other, time_slot=self.time_slot, status='pending')
+
+        pending.cancel()
+
+        self.time_slot.refresh_from_db()
+        self.assertEqual(self.time_slot.booked_count, 1)
+        self.assertFalse(self.time_slot.is_available)
+
+    def test_resaving_confirmed_booking_changes_nothing(self):
+        """Opakované uložení načtené potvrzené rezervace nestrhne kredit ani neobsadí místo."""
+        Booking.objects.create(client=self.client_user, time_slot=self.time_slot, status='confirmed')
+
+        Booking.objects.get(client=self.client_user).save()
+
+        self.client_user.refresh_from_db()
+        self.time_slot.refresh_from_db()
+        self.assertEqual(self.client_user.credits, Decimal('900.00'))
+        self.assertEqual(self.time_slot.booked_count, 1)
+        self.assertEqual(self.client_user.credit_transactions.filter(kind='booking').count(), 1)
+
+        # Přechod čekající -> potvrzená na načtené instanci se zpracuje
+        other = User.objects.create_user(
+            username='klient2@test.cz',
+            email='klient2@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('1000.00')
+        )
+        Booking.objects.create(client=other, time_slot=self.time_slot, status='pending')
+        pending = Booking.objects.get(client=other)
+        pending.status = 'confirmed'
+        pending.save()
+        other.refresh_from_db()
+        self.assertEqual(other.credits, Decimal('900.00'))
+
+    def test_counter_follows_confirm_and_cancel(self):
+        """Potvrzení rezervace počítadlo zvýší, zrušení sníží."""
+        booking = Booking.objects.create(client=self.client_user, time_slot=self.time_slot, status='confirmed')
+        self.time_slot.refresh_from_db()
+        self.assertEqual(self.time_slot.booked_count, 1)
+        self.assertEqual(self.time_slot.seats_left, self.lesson.capacity - 1)
+
+        booking.cancel()
+        self.time_slot.refresh_from_db()
+        self.assertEqual(self.time_slot.booked_count, 0)
+
+    def test_rebuild_command_repairs_drift(self):
+        """Příkaz rebuild_seat_counters opraví rozjeté počítadlo."""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        Booking.objects.create(client=self.client_user, time_slot=self.time_slot, status='confirmed')
+        TimeSlot.objects.filter(pk=self.time_slot.pk).update(booked_count=7)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_seat_counters', '--check', stdout=StringIO())
+
+        call_command('rebuild_seat_counters', '--chunk-size', '1', stdout=StringIO())
+        self.time_slot.refresh_from_db()
+        self.assertEqual(self.time_slot.booked_count, 1)
+
+
+class BookingConcurrencyTests(TransactionTestCase):
+    """Zátěžové testy služby book_time_slot při souběžných požadavcích."""
+
+    THREADS = 6
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.lesson = Lesson.objects.create(
+            instructor=self.instructor,
+            title='Populární lekce',
+            price=Decimal('100.00'),
+            duration=60,
+            capacity=1,
+            date=timezone.now().date() + timedelta(days=1),
+            start_time=time(9, 0)
+        )
+
+    def _run_concurrently(self, calls):
+        """Spustí volání současně (bariéra) a vrátí počet úspěšných rezervací."""
+        barrier = threading.Barrier(len(calls))
+        successes = []
+
+        def worker(client, slot_id):
+            barrier.wait()
+            try:
+                # Zamčenou databázi (SQLite) zkusíme znovu, odmítnutí je konečné
+                for attempt in range(20):
+                    try:
+                        book_time_slot(client, slot_id)
+                        successes.append(slot_id)
+                        return
+                    except BookingError:
+                        return
+                    except OperationalError:
+                        time_module.sleep(0.01 * (attempt + 1))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=call) for call in calls]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return len(successes)
+
+    def test_slot_is_not_overbooked(self):
+        """Více klientů současně rezervuje slot – projde právě tolik, kolik je kapacita."""
+        self.lesson.capacity = 3
+        self.lesson.save()
+        slot = TimeSlot.objects.create(lesson=self.lesson, start_time=timezone.now() + timedelta(days=1))
+        clients = [
+            User.objects.create(username=f'klient{i}@test.cz', email=f'klient{i}@test.cz',
+                                user_type='client', credits=Decimal('100.00'))
+            for i in range(self.THREADS)
+        ]
+
+        successes = self._run_concurrently([(client, slot.pk) for client in clients])
+
+        slot.refresh_from_db()
+        self.assertEqual(successes, 3)
+        self.assertFalse(slot.is_available)
+        self.assertEqual(Booking.objects.filter(time_slot=slot, status='confirmed').count(), successes)
+        self.assertEqual(slot.booked_count, successes)
+        spent = sum(Decimal('100.00') - User.objects.get(pk=c.pk).credits for c in clients)
+        self.assertEqual(spent, Decimal('100.00') * successes)
+
+    def test_credits_are_not_double_spent(self):
+        """Jeden klient současně rezervuje více termínů – kredit nesmí klesnout pod nulu."""
+        client = User.objects.create(username='klient@test.cz', email='klient@test.cz',
+                                     user_type='client', credits=Decimal('200.00'))
+        slots = [
+            TimeSlot.objects.create(lesson=self.lesson, start_time=timezone.now() + timedelta(days=1, hours=i))
+            for i in range(self.THREADS)
+        ]
+
+        successes = self._run_concurrently([(client, slot.pk) for slot in slots])
+
+        client.refresh_from_db()
+        self.assertEqual(successes, 2)
+        self.assertGreaterEqual(client.credits, Decimal('0.00'))
+        self.assertEqual(client.credits, Decimal('200.00') - Decimal('100.00') * successes)
+        self.assertEqual(Booking.objects.filter(client=client).count(), successes)
+
+
+class LessonScheduleMonthTests(TestCase):
+    """Testy pro rozvrh /lekce/ a endpoint bookings:lessons_month."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.lesson = Lesson.objects.create(
+            instructor=self.instructor,
+            title='Test lekce',
+            price=Decimal('100.00'),
+            duration=60,
+            capacity=10,
+            date=timezone.now().date() + timedelta(days=1),
+            start_time=time(9, 0)
+        )
+        self.later_slot = TimeSlot.objects.create(
+            lesson=self.lesson,
+            start_time=timezone.now() + timedelta(days=40)
+        )
+
+    def test_page_embeds_only_current_month(self):
+        """Stránka obsahuje jen aktuální měsíc a počet dotazů nezávisí na počtu měsíců."""
+        # Validátory podmíněného GET jsou po prvním požadavku v cache
+        self.client.get(reverse('bookings:get_events'))
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('lessons'))
+        now = timezone.now()
+        self.assertEqual(list(response.context['all_lessons_by_month']), [f'{now.year}-{now.month}'])
+
+    def test_month_endpoint_returns_grouped_lessons(self):
+        """Endpoint vrátí lekce požadovaného měsíce seskupené podle dne."""
+        start = self.later_slot.start_time
+        response = self.client.get(reverse('bookings:lessons_month'), {'year': start.year, 'month': start.month})
+        self.assertEqual(response.status_code, 200)
+        day = response.json()[start.strftime('%Y-%m-%d')]
+        self.assertEqual(day[0]['title'], 'Test lekce')
+        self.assertEqual(day[0]['available_spots'], 10)
+
+    def test_month_endpoint_rejects_invalid_month(self):
+        """Neplatný měsíc vrací 400."""
+        response = self.client.get(reverse('bookings:lessons_month'), {'year': 2025, 'month': 13})
+        self.assertEqual(response.status_code, 400)
+
+
+class ScheduleCacheTests(TestCase):
+    """Testy pro verzovanou cache veřejného rozvrhu."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.lesson = Lesson.objects.create(
+            instructor=self.instructor,
+            title='Test lekce',
+            price=Decimal('100.00'),
+            duration=60,
+            capacity=10,
+            date=timezone.now().date() + timedelta(days=1),
+            start_time=time(9, 0)
+        )
+        self.start = timezone.now() + timedelta(days=1)
+        TimeSlot.objects.create(lesson=self.lesson, start_time=self.start)
+        self.params = {
+            'start': (self.start - timedelta(days=1)).isoformat(),
+            'end': (self.start + timedelta(days=7)).isoformat(),
+        }
+
+    def _assert_feed_cached_until_change(self):
+        url = reverse('bookings:get_events')
+        self.assertEqual(len(self.client.get(url, self.params).json()), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.client.get(url, self.params).json()), 1)
+
+        # Nový slot zvýší generaci rozvrhu a feed se sestaví znovu
+        TimeSlot.objects.create(lesson=self.lesson, start_time=self.start + timedelta(hours=2))
+        self.assertEqual(len(self.client.get(url, self.params).json()), 2)
+
+    def test_feed_is_cached_until_schedule_changes(self):
+        """Feed se čte z cache, dokud se rozvrh nezmění (locmem backend)."""
+        self._assert_feed_cached_until_change()
+
+    def test_feed_cache_works_with_file_backend(self):
+        """Stejné chování s file-based cache backendem."""
+        import tempfile
+        from django.test import override_settings
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': cache_dir,
+            }}):
+                self._assert_feed_cached_until_change()
+
+
+class ConditionalGetTests(TestCase):
+    """Testy pro ETag / Last-Modified na veřejných stránkách rozvrhu."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.lesson = Lesson.objects.create(
+            instructor=self.instructor,
+            title='Test lekce',
+            price=Decimal('100.00'),
+            duration=60,
+            capacity=10,
+            date=timezone.now().date() + timedelta(days=1),
+            start_time=time(9, 0)
+        )
+        self.time_slot = TimeSlot.objects.create(lesson=self.lesson, start_time=timezone.now() + timedelta(days=1))
+
+    def _assert_revalidates(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        return response['ETag']
+
+    def test_lessons_page_returns_not_modified(self):
+        """Stránka /lekce/ odpoví 304, dokud se rozvrh nezmění."""
+        etag = self._assert_revalidates(reverse('lessons'))
+
+        TimeSlot.objects.create(lesson=self.lesson, start_time=timezone.now() + timedelta(days=2))
+        response = self.client.get(reverse('lessons'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_lesson_detail_detects_deleted_slot(self):
+        """Smazání termínu změní ETag detailu lekce, i když MAX(updated_at) zůstane."""
+        url = reverse('bookings:lesson_detail', kwargs={'pk': self.lesson.pk})
+        etag = self._assert_revalidates(url)
+
+        self.time_slot.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_events_feed_returns_not_modified(self):
+        """Feed kalendáře podporuje podmíněný GET."""
+        self._assert_revalidates(reverse('bookings:get_events'))
+
+
+class InstructorLessonDetailQueryTests(TestCase):
+    """Testy, že detail lekce pro lektora má konstantní počet dotazů."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.lesson = Lesson.objects.create(
+            instructor=self.instructor,
+            title='Test lekce',
+            price=Decimal('100.00'),
+            duration=60,
+            capacity=10,
+            date=timezone.now().date() + timedelta(days=1),
+            start_time=time(9, 0)
+        )
+        self.client.login(username='lektor@test.cz', password='testpass123')
+
+    def _add_bookings(self, count):
+        start = self.lesson.timeslot_set.count()
+        for i in range(start, start + count):
+            slot = TimeSlot.objects.create(lesson=self.lesson, start_time=timezone.now() + timedelta(days=1, hours=i))
+            client = User.objects.create_user(
+                username=f'klient{i}@test.cz',
+                email=f'klient{i}@test.cz',
+                password='testpass123',
+                user_type='client',
+                credits=Decimal('500.00')
+            )
+            Booking.objects.create(client=client, time_slot=slot, status='confirmed')
+            TopUp.objects.create(user=client, amount=Decimal('200.00'))
+
+    def _count_queries(self):
+        url = reverse('bookings:instructor_lesson_detail', args=[self.lesson.pk])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    @override_settings(AUTH_USER_CACHE_TIMEOUT=0)  # porovnáváme dotazy view, ne zahřátí cache
+    def test_query_count_does_not_grow_with_bookings(self):
+        """Počet dotazů nezávisí na počtu rezervací ani klientů."""
+        self._add_bookings(2)
+        small, _ = self._count_queries()
+
+        self._add_bookings(8)
+        large, response = self._count_queries()
+
+        self.assertEqual(small, large)
+        self.assertEqual(response.context['total_bookings'], 10)
+        self.assertEqual(response.context['total_pending_topups'], Decimal('2000.00'))
+        info = next(iter(response.context['client_info'].values()))
+        self.assertEqual(info.pending_count, 1)
+        self.assertEqual(len(info.pending_topups), 1)
+
+
+class BookingSnapshotTests(TestCase):
+    """Testy pro snímek ceny a začátku termínu uložený na rezervaci."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.client_user = User.objects.create_user(
+            username='klient@test.cz',
+            email='klient@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('1000.00')
+        )
+        self.lesson = Lesson.objects.create(
+            instructor=self.instructor,
+            title='Test lekce',
+            price=Decimal('100.00'),
+            duration=60,
+            capacity=10,
+            date=timezone.now().date() + timedelta(days=1),
+            start_time=time(9, 0)
+        )
+        self.time_slot = TimeSlot.objects.create(
+            lesson=self.lesson,
+            start_time=timezone.now() + timedelta(days=1)
+        )
+
+    def test_cancel_refunds_price_paid_not_current_price(self):
+        """Storno vrací zaplacenou cenu, i když se cena lekce mezitím změnila."""
+        booking = book_time_slot(self.client_user, self.time_slot.pk)
+        self.assertEqual(booking.price_paid, Decimal('100.00'))
+        self.assertEqual(booking.starts_at, self.time_slot.start_time)
+
+        Lesson.objects.filter(pk=self.lesson.pk).update(price=Decimal('250.00'))
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.cancel()
+
+        self.client_user.refresh_from_db()
+        self.assertEqual(self.client_user.credits, Decimal('1000.00'))
+
+    def test_reschedule_moves_booking_start(self):
+        """Přesun termínu posune i starts_at rezervací."""
+        booking = Booking.objects.create(client=self.client_user, time_slot=self.time_slot, status='confirmed')
+        new_start = self.time_slot.start_time + timedelta(days=2)
+
+        reschedule_time_slots([self.time_slot.pk], new_start)
+
+        booking.refresh_from_db()
+        self.assertEqual(booking.starts_at, new_start)
+
+    def test_editing_slot_start_moves_booking_start(self):
+        """Úprava začátku termínu (např. v adminu) posune i starts_at rezervací."""
+        booking = Booking.objects.create(client=self.client_user, time_slot=self.time_slot, status='confirmed')
+        slot = TimeSlot.objects.get(pk=self.time_slot.pk)
+        slot.start_time += timedelta(hours=3)
+        slot.save()
+
+        booking.refresh_from_db()
+        self.assertEqual(booking.starts_at, slot.start_time)
+        self.assertEqual(booking.cancellation_deadline(), slot.start_time - timedelta(hours=2))
+
+
+class TimeSlotSeriesTests(TestCase):
+    """Testy pro hromadné založení opakované série termínů."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.lesson = Lesson.objects.create(
+            instructor=self.instructor,
+            title='Test lekce',
+            price=Decimal('100.00'),
+            duration=60,
+            capacity=10,
+        )
+        # Pondělí za dva týdny, aby celá série ležela v budoucnu
+        today = timezone.localdate()
+        self.monday = today + timedelta(days=14 - today.weekday())
+
+    def _form(self, **overrides):
+        data = {
+            'start_date': self.monday.isoformat(),
+            'until': (self.monday + timedelta(weeks=4) - timedelta(days=1)).isoformat(),
+            'time': '18:00',
+            'frequency': 'weekly',
+            'weekdays': ['0', '2'],
+            'exclude_dates': '',
+        }
+        data.update(overrides)
+        form = TimeSlotSeriesForm(data)
+        self.assertTrue(form.is_valid(), form.errors)
+        return form
+
+    def test_weekly_series_with_exclusions(self):
+        """Týdenní série po a st na 4 týdny bez vynechaného dne dá 7 termínů."""
+        excluded = self.monday + timedelta(weeks=1)
+        form = self._form(exclude_dates=excluded.strftime('%d.%m.%Y'))
+        starts = form.occurrences()
+
+        self.assertEqual(len(starts), 7)
+        self.assertNotIn(excluded, [timezone.localtime(start).date() for start in starts])
+        self.assertTrue(all(timezone.localtime(start).time() == time(18, 0) for start in starts))
+
+    def test_biweekly_series(self):
+        """Série každý druhý týden vynechá liché týdny."""
+        starts = self._form(frequency='biweekly').occurrences()
+        dates = [timezone.localtime(start).date() for start in starts]
+        self.assertEqual(dates, [
+            self.monday,
+            self.monday + timedelta(days=2),
+            self.monday + timedelta(weeks=2),
+            self.monday + timedelta(weeks=2, days=2),
+        ])
+
+    def test_series_longer_than_a_year_is_rejected(self):
+        """Série delší než rok neprojde validací."""
+        form = TimeSlotSeriesForm({
+            'start_date': self.monday.isoformat(),
+            'until': (self.monday + timedelta(days=400)).isoformat(),
+            'time': '18:00',
+            'frequency': 'weekly',
+            'weekdays': ['0'],
+        })
+        self.assertFalse(form.is_valid())
+
+    def test_existing_slots_are_skipped_with_constant_queries(self):
+        """Existující termíny se přeskočí a počet dotazů nezávisí na délce série."""
+        starts = self._form().occurrences()
+        TimeSlot.objects.create(lesson=self.lesson, start_time=starts[0])
+
+        with CaptureQueriesContext(connection) as ctx:
+            created = create_time_slot_series(self.lesson, starts)
+
+        self.assertEqual(len(created), len(starts) - 1)
+        self.assertEqual(TimeSlot.objects.filter(lesson=self.lesson).count(), len(starts))
+        # SELECT existujících, INSERT a savepointy transakce
+        self.assertLessEqual(len(ctx.captured_queries), 5)
+
+        # Opakované odeslání už nic nezaloží
+        self.assertEqual(create_time_slot_series(self.lesson, starts), [])
+
+    def test_series_view_creates_slots(self):
+        """Lektor založí sérii přes formulář a je přesměrován na detail lekce."""
+        self.client.login(username='lektor@test.cz', password='testpass123')
+        response = self.client.post(reverse('bookings:timeslot_series_add', args=[self.lesson.pk]), {
+            'start_date': self.monday.isoformat(),
+            'until': (self.monday + timedelta(days=13)).isoformat(),
+            'time': '07:30',
+            'frequency': 'weekly',
+            'weekdays': ['1', '3'],
+        })
+        self.assertRedirects(response, reverse('bookings:instructor_lesson_detail', args=[self.lesson.pk]))
+        self.assertEqual(TimeSlot.objects.filter(lesson=self.lesson).count(), 4)
+
+
+class TimeSlotShiftTests(TestCase):
+    """Testy pro hromadný přesun termínů s kontrolou kolizí."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.client_user = User.objects.create_user(
+            username='klient@test.cz',
+            email='klient@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('1000.00')
+        )
+        self.lesson = Lesson.objects.create(
+            instructor=self.instructor,
+            title='Pondělní jóga',
+            price=Decimal('100.00'),
+            duration=60,
+            capacity=10,
+            location='Studio A',
+        )
+        today = timezone.localdate()
+        monday = today + timedelta(days=7 - today.weekday())
+        tz = timezone.get_current_timezone()
+        # Čtyři pondělky a čtyři středy v 18:00
+        self.starts = [
+            timezone.make_aware(datetime.combine(monday + timedelta(weeks=week, days=day), time(18, 0)), tz)
+            for week in range(4) for day in (0, 2)
+        ]
+        self.slots = [TimeSlot.objects.create(lesson=self.lesson, start_time=start) for start in self.starts]
+
+    def test_shift_moves_slots_and_bookings(self):
+        """Všechny budoucí termíny i jejich rezervace se posunou o hodinu."""
+        booking = Booking.objects.create(client=self.client_user, time_slot=self.slots[0], status='confirmed')
+
+        moved = shift_time_slots(self.lesson, TimeSlot.objects.all(), timedelta(hours=1))
+
+        self.assertEqual(moved, 8)
+        self.assertEqual(
+            list(TimeSlot.objects.filter(lesson=self.lesson).values_list('start_time', flat=True)),
+            [start + timedelta(hours=1) for start in self.starts],
+        )
+        booking.refresh_from_db()
+        self.assertEqual(booking.starts_at, self.starts[0] + timedelta(hours=1))
+
+    def test_weekday_scope(self):
+        """Výběr jednoho dne v týdnu posune jen pondělní termíny."""
+        form = TimeSlotShiftForm({'scope': 'weekday', 'weekday': '0', 'days': 1, 'minutes': 0})
+        self.assertTrue(form.is_valid(), form.errors)
+
+        moved = shift_time_slots(self.lesson, form.filter_slots(TimeSlot.objects.all()), form.offset)
+
+        self.assertEqual(moved, 4)
+        weekdays = {timezone.localtime(start).weekday() for start in TimeSlot.objects.values_list('start_time', flat=True)}
+        self.assertEqual(weekdays, {1, 2})
+
+    def test_conflict_with_same_location_aborts_shift(self):
+        """Překryv s jinou lekcí na stejném místě se nahlásí a nic se nepřesune."""
+        other_instructor = User.objects.create_user(
+            username='lektor2@test.cz', email='lektor2@test.cz', password='testpass123', user_type='instructor'
+        )
+        other_lesson = Lesson.objects.create(
+            instructor=other_instructor, title='Pilates', price=Decimal('100.00'),
+            duration=90, capacity=10, location='Studio A',
+        )
+        TimeSlot.objects.create(lesson=other_lesson, start_time=self.starts[2] + timedelta(minutes=30))
+        TimeSlot.objects.create(lesson=other_lesson, start_time=self.starts[6] + timedelta(minutes=30))
+
+        with CaptureQueriesContext(connection) as ctx:
+            with self.assertRaises(ScheduleConflict) as raised:
+                shift_time_slots(self.lesson, TimeSlot.objects.filter(lesson=self.lesson), timedelta(hours=1))
+
+        self.assertEqual([new_start for new_start, _ in raised.exception.conflicts], [
+            self.starts[2] + timedelta(hours=1), self.starts[6] + timedelta(hours=1),
+        ])
+        # Výběr termínů + jeden dotaz na kandidáty kolizí
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(
+            list(TimeSlot.objects.filter(lesson=self.lesson).values_list('start_time', flat=True)), self.starts
+        )
+
+    def test_shift_into_past_is_rejected(self):
+        """Termíny nelze přesunout do minulosti."""
+        with self.assertRaises(BookingError):
+            shift_time_slots(self.lesson, TimeSlot.objects.all(), timedelta(days=-30))
+
+    def test_view_reports_conflicts(self):
+        """Formulář při kolizi zobrazí seznam kolidujících termínů."""
+        other_lesson = Lesson.objects.create(
+            instructor=self.instructor, title='Pilates', price=Decimal('100.00'),
+            duration=60, capacity=10, location='Studio B',
+        )
+        TimeSlot.objects.create(lesson=other_lesson, start_time=self.starts[0] + timedelta(days=1))
+        self.client.login(username='lektor@test.cz', password='testpass123')
+
+        response = self.client.post(reverse('bookings:timeslot_shift', args=[self.lesson.pk]), {
+            'scope': 'future', 'days': 1, 'minutes': 0,
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['conflicts']), 1)
+        self.assertContains(response, 'Pilates')
+
+
+class ScheduleOverlapTests(TestCase):
+    """Testy pro kontrolu překryvů termínů lektora a místa."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.other_instructor = User.objects.create_user(
+            username='lektor2@test.cz',
+            email='lektor2@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.yoga = Lesson.objects.create(
+            instructor=self.instructor, title='Jóga', price=Decimal('100.00'),
+            duration=60, capacity=10, location='Studio A',
+        )
+        self.pilates = Lesson.objects.create(
+            instructor=self.other_instructor, title='Pilates', price=Decimal('100.00'),
+            duration=45, capacity=10, location='Studio B',
+        )
+        self.start = (timezone.now() + timedelta(days=3)).replace(hour=18, minute=0, second=0, microsecond=0)
+        TimeSlot.objects.create(lesson=self.yoga, start_time=self.start)
+
+    def test_find_conflicts_checks_instructor_and_location(self):
+        """Kolize se hlásí pro stejného lektora i stejné místo, těsně navazující termín projde."""
+        boxing = Lesson(instructor=self.other_instructor, title='Box', price=Decimal('100.00'),
+                        duration=30, capacity=10, location='Studio A')
+
+        self.assertEqual(len(find_conflicts(boxing, [self.start + timedelta(minutes=30)])), 1)
+        self.assertEqual(find_conflicts(boxing, [self.start + timedelta(minutes=60)]), [])
+        self.assertEqual(find_conflicts(self.pilates, [self.start + timedelta(minutes=15)]), [])
+
+    def test_timeslot_form_rejects_overlap(self):
+        """Formulář termínu odmítne termín, který se kryje s jinou lekcí lektora."""
+        stretching = Lesson.objects.create(
+            instructor=self.instructor, title='Strečink', price=Decimal('100.00'),
+            duration=30, capacity=10, location='Studio C',
+        )
+        local = timezone.localtime(self.start + timedelta(minutes=30))
+        form = TimeSlotForm({'date': local.date().isoformat(), 'time': local.strftime('%H:%M')}, lesson=stretching)
+
+        self.assertFalse(form.is_valid())
+        self.assertIn('Jóga', str(form.non_field_errors()))
+
+    def test_index_finds_all_overlaps_in_one_query(self):
+        """Audit celého rozvrhu najde všechny překryvy jedním dotazem."""
+        TimeSlot.objects.create(lesson=self.pilates, start_time=self.start + timedelta(hours=1))
+        # Dva překryvy lektora: Jóga 18:00 × 18:30 a Pilates 19:00 × 19:30 (stejné místo se hlásí jen jednou)
+        TimeSlot.objects.create(lesson=self.yoga, start_time=self.start + timedelta(minutes=30))
+        TimeSlot.objects.create(lesson=self.pilates, start_time=self.start + timedelta(minutes=90))
+
+        with CaptureQueriesContext(connection) as ctx:
+            overlaps = ScheduleIndex.load(self.start - timedelta(days=1), self.start + timedelta(days=1)).find_overlaps()
+
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(sorted(reason for _, _, reason in overlaps), ['instructor', 'instructor'])
+
+    def test_audit_command_reports_overlaps(self):
+        """Příkaz audit_schedule skončí chybou, pokud najde překryvy."""
+        TimeSlot.objects.create(lesson=self.yoga, start_time=self.start + timedelta(minutes=30))
+        out = StringIO()
+
+        with self.assertRaises(CommandError):
+            call_command('audit_schedule', stdout=out)
+        self.assertIn('Jóga', out.getvalue())
+
+        TimeSlot.objects.filter(start_time=self.start + timedelta(minutes=30)).delete()
+        call_command('audit_schedule', stdout=out)
+
+
+class TimeSlotCancellationTests(TestCase):
+    """Testy pro zrušení termínu lektorem s hromadným vrácením kreditu."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.lesson = Lesson.objects.create(
+            instructor=self.instructor,
+            title='Test lekce',
+            price=Decimal('100.00'),
+            duration=60,
+            capacity=40,
+        )
+        self.start = timezone.now() + timedelta(days=2)
+
+    def _slot_with_bookings(self, count, offset_hours=0):
+        slot = TimeSlot.objects.create(lesson=self.lesson, start_time=self.start + timedelta(hours=offset_hours))
+        for i in range(count):
+            client = User.objects.create_user(
+                username=f'klient{offset_hours}-{i}@test.cz',
+                email=f'klient{offset_hours}-{i}@test.cz',
+                password='testpass123',
+                user_type='client',
+                credits=Decimal('500.00')
+            )
+            book_time_slot(client, slot.pk)
+        return TimeSlot.objects.select_related('lesson').get(pk=slot.pk)
+
+    def test_cancel_refunds_and_notifies_every_client(self):
+        """Všechny rezervace se zruší, kredit se vrátí a každý klient dostane upozornění."""
+        slot = self._slot_with_bookings(3)
+
+        cancelled = cancel_time_slot(slot, reason='Nemoc lektora')
+
+        self.assertEqual(cancelled, 3)
+        self.assertFalse(Booking.objects.filter(time_slot=slot).exclude(status='cancelled').exists())
+        self.assertEqual(
+            set(User.objects.filter(user_type='client').values_list('credits', flat=True)), {Decimal('500.00')}
+        )
+        self.assertEqual(Notification.objects.filter(body__contains='Nemoc lektora').count(), 3)
+        slot.refresh_from_db()
+        self.assertIsNotNone(slot.cancelled_at)
+        self.assertEqual(slot.booked_count, 0)
+
+        with self.assertRaises(BookingError):
+            cancel_time_slot(slot)
+
+    def test_pending_booking_is_cancelled_without_refund(self):
+        """Čekající rezervace nebyla zaplacená – zruší se, ale kredit se za ni nevrací."""
+        slot = self._slot_with_bookings(1)
+        pending_client = User.objects.create_user(
+            username='cekajici@test.cz',
+            email='cekajici@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('500.00')
+        )
+        pending = Booking.objects.create(client=pending_client, time_slot=slot, status='pending')
+
+        self.assertEqual(cancel_time_slot(slot), 2)
+
+        pending.refresh_from_db()
+        pending_client.refresh_from_db()
+        self.assertEqual(pending.status, 'cancelled')
+        self.assertEqual(pending_client.credits, Decimal('500.00'))
+        self.assertFalse(pending_client.credit_transactions.filter(kind='refund').exists())
+        self.assertEqual(CreditTransaction.objects.filter(kind='refund').count(), 1)
+        self.assertNotIn('Vrátili jsme', Notification.objects.get(user=pending_client).body)
+
+        # Ani zrušení samotné čekající rezervace kredit nepřipíše
+        other = Booking.objects.create(
+            client=pending_client, time_slot=self._slot_with_bookings(0, offset_hours=3), status='pending'
+        )
+        other.cancel()
+        pending_client.refresh_from_db()
+        self.assertEqual(pending_client.credits, Decimal('500.00'))
+
+    def test_query_count_does_not_depend_on_class_size(self):
+        """Zrušení plné třídy stojí stejně dotazů jako zrušení malé."""
+        small = self._slot_with_bookings(2, offset_hours=0)
+        full = self._slot_with_bookings(30, offset_hours=3)
+
+        with CaptureQueriesContext(connection) as small_ctx:
+            cancel_time_slot(small)
+        with CaptureQueriesContext(connection) as full_ctx:
+            cancel_time_slot(full)
+
+        self.assertEqual(len(small_ctx.captured_queries), len(full_ctx.captured_queries))
+
+    def test_cancelled_slot_disappears_from_schedule(self):
+        """Zrušený termín nejde rezervovat a nezobrazí se v detailu lekce."""
+        slot = self._slot_with_bookings(1)
+        self.client.login(username='lektor@test.cz', password='testpass123')
+
+        response = self.client.post(reverse('bookings:timeslot_cancel', args=[slot.pk]), {'reason': ''})
+
+        self.assertRedirects(response, reverse('bookings:instructor_lesson_detail', args=[self.lesson.pk]))
+        response = self.client.get(reverse('bookings:lesson_detail', args=[self.lesson.pk]))
+        self.assertNotIn(slot, list(response.context['time_slots']))
+        late_client = User.objects.create_user(
+            username='pozde@test.cz', password='testpass123', user_type='client', credits=Decimal('500.00')
+        )
+        with self.assertRaises(BookingError):
+            book_time_slot(late_client, slot.pk)
+
+    def test_send_notifications_command(self):
+        """Příkaz send_notifications odešle čekající upozornění a označí je."""
+        cancel_time_slot(self._slot_with_bookings(2))
+
+        call_command('send_notifications', stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(Notification.objects.filter(sent_at__isnull=True).exists())
+
+
+class WaitlistTests(TestCase):
+    """Testy pro pořadník na obsazené termíny a automatické povýšení."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.lesson = Lesson.objects.create(
+            instructor=self.instructor,
+            title='Test lekce',
+            price=Decimal('100.00'),
+            duration=60,
+            capacity=1,
+        )
+        self.holder = self._client('drzitel', Decimal('500.00'))
+
+    def _client(self, name, credits):
+        return User.objects.create_user(
+            username=f'{name}@test.cz',
+            email=f'{name}@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=credits
+        )
+
+    def _full_slot(self, waiting, offset_days=1):
+        """Plný termín s pořadníkem `waiting` klientů; vrací rezervaci držitele místa."""
+        slot = TimeSlot.objects.create(lesson=self.lesson, start_time=timezone.now() + timedelta(days=offset_days))
+        booking = book_time_slot(self.holder, slot.pk)
+        for i in range(waiting):
+            WaitlistEntry.objects.create(
+                time_slot=slot, client=self._client(f'cekatel{offset_days}-{i}', Decimal('500.00'))
+            )
+        return Booking.objects.select_related('client', 'time_slot__lesson').get(pk=booking.pk)
+
+    def test_cancel_promotes_head_of_waitlist(self):
+        """Po zrušení rezervace dostane místo první čekající a zaplatí ho."""
+        booking = self._full_slot(2)
+        first, second = WaitlistEntry.objects.filter(time_slot=booking.time_slot)
+
+        booking.cancel()
+
+        promoted = Booking.objects.get(time_slot=booking.time_slot, status='confirmed')
+        self.assertEqual(promoted.client, first.client)
+        first.client.refresh_from_db()
+        self.assertEqual(first.client.credits, Decimal('400.00'))
+        self.assertEqual(list(WaitlistEntry.objects.filter(time_slot=booking.time_slot)), [second])
+        self.assertTrue(Notification.objects.filter(user=first.client, subject__startswith='Uvolnilo').exists())
+        slot = TimeSlot.objects.get(pk=booking.time_slot_id)
+        self.assertEqual(slot.booked_count, 1)
+        self.assertFalse(slot.is_available)
+
+    def test_client_without_credits_is_skipped(self):
+        """Čekající bez dostatečného kreditu se přeskočí."""
+        booking = self._full_slot(0)
+        poor = self._client('chudy', Decimal('50.00'))
+        rich = self._client('bohaty', Decimal('500.00'))
+        WaitlistEntry.objects.create(time_slot=booking.time_slot, client=poor)
+        WaitlistEntry.objects.create(time_slot=booking.time_slot, client=rich)
+
+        booking.cancel()
+
+        self.assertEqual(Booking.objects.get(time_slot=booking.time_slot, status='confirmed').client, rich)
+        self.assertTrue(WaitlistEntry.objects.filter(client=poor).exists())
+
+    def test_failing_head_does_not_block_waitlist(self):
+        """Záznam, který povýšit nejde, neblokuje ostatní čekající."""
+        self.lesson.capacity = 2
+        self.lesson.save()
+        booking = self._full_slot(0)
+        # Klient s aktivní rezervací, jehož záznam v pořadníku zůstal viset
+        booked = self._client('rezervovany', Decimal('500.00'))
+        book_time_slot(booked, booking.time_slot_id)
+        WaitlistEntry.objects.create(time_slot=booking.time_slot, client=booked)
+        # Klient, jemuž kredit klesne až při strhávání
+        drained = self._client('vycerpany', Decimal('500.00'))
+        WaitlistEntry.objects.create(time_slot=booking.time_slot, client=drained)
+        last = self._client('posledni', Decimal('500.00'))
+        WaitlistEntry.objects.create(time_slot=booking.time_slot, client=last)
+
+        real_charge = User.charge_credits
+
+        def charge(user, amount, **kwargs):
+            return False if user.pk == drained.pk else real_charge(user, amount, **kwargs)
+
+        with patch.object(User, 'charge_credits', autospec=True, side_effect=charge):
+            booking.cancel()
+
+        promoted = Booking.objects.filter(time_slot=booking.time_slot, status='confirmed')
+        self.assertEqual({b.client for b in promoted}, {booked, last})
+        self.assertFalse(WaitlistEntry.objects.filter(client__in=[booked, last]).exists())
+        self.assertTrue(WaitlistEntry.objects.filter(client=drained).exists())
+        slot = TimeSlot.objects.get(pk=booking.time_slot_id)
+        self.assertEqual(slot.booked_count, 2)
+
+    def test_promotion_query_count_does_not_depend_on_waitlist_length(self):
+        """Počet dotazů při povýšení nezávisí na délce pořadníku."""
+        short = self._full_slot(2, offset_days=1)
+        long = self._full_slot(20, offset_days=2)
+
+        with CaptureQueriesContext(connection) as short_ctx:
+            short.cancel()
+        with CaptureQueriesContext(connection) as long_ctx:
+            long.cancel()
+
+        self.assertEqual(len(short_ctx.captured_queries), len(long_ctx.captured_queries))
+
+    def test_join_only_full_slot(self):
+        """Do pořadníku se lze zapsat jen na plný termín."""
+        booking = self._full_slot(0)
+        free_slot = TimeSlot.objects.create(lesson=self.lesson, start_time=timezone.now() + timedelta(days=3))
+        self._client('novy', Decimal('500.00'))
+        self.client.login(username='novy@test.cz', password='testpass123')
+
+        self.client.post(reverse('bookings:waitlist_join', args=[free_slot.pk]))
+        response = self.client.post(reverse('bookings:waitlist_join', args=[booking.time_slot_id]))
+
+        self.assertRedirects(response, reverse('bookings:lesson_detail', args=[self.lesson.pk]))
+        self.assertEqual(
+            list(WaitlistEntry.objects.values_list('time_slot_id', flat=True)), [booking.time_slot_id]
+        )
+
+
+class BasketBookingTests(TestCase):
+    """Testy pro hromadnou rezervaci více termínů (košík)."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.client_user = User.objects.create_user(
+            username='klient@test.cz',
+            email='klient@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('1000.00')
+        )
+        self.lesson = Lesson.objects.create(
+            instructor=self.instructor,
+            title='Test lekce',
+            price=Decimal('100.00'),
+            duration=60,
+            capacity=2,
+        )
+        self.slots = [
+            TimeSlot.objects.create(lesson=self.lesson, start_time=timezone.now() + timedelta(days=day))
+            for day in range(1, 11)
+        ]
+
+    def test_basket_books_all_slots_with_one_charge(self):
+        """Všechny termíny se zarezervují a kredit se odečte jednou za celý košík."""
+        TimeSlot.objects.filter(pk=self.slots[0].pk).update(booked_count=1)
+
+        bookings = book_time_slots(self.client_user, [slot.pk for slot in self.slots[:3]])
+
+        self.assertEqual(len(bookings), 3)
+        self.client_user.refresh_from_db()
+        self.assertEqual(self.client_user.credits, Decimal('700.00'))
+        self.assertEqual(
+            CreditTransaction.objects.filter(user=self.client_user, kind='booking').count(), 3
+        )
+        first = TimeSlot.objects.get(pk=self.slots[0].pk)
+        self.assertEqual(first.booked_count, 2)
+        self.assertFalse(first.is_available)
+        self.assertTrue(TimeSlot.objects.get(pk=self.slots[1].pk).is_available)
+
+    def _client(self, name):
+        return User.objects.create_user(
+            username=f'{name}@test.cz',
+            email=f'{name}@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('1000.00')
+        )
+
+    def _interleave(self, client, slot):
+        """Mezi načtením košíku a zápisem míst proběhne cizí rezervace `slot`."""
+        real_transaction = services.transaction
+        pending = [slot]
+
+        class Interleaved:
+            def __getattr__(self, name):
+                return getattr(real_transaction, name)
+
+            def atomic(self, *args, **kwargs):
+                if pending:
+                    book_time_slot(client, pending.pop().pk)
+                return real_transaction.atomic(*args, **kwargs)
+
+        return patch.object(services, 'transaction', Interleaved())
+
+    def test_concurrent_booking_with_seats_left_does_not_abort_basket(self):
+        """Souběžná rezervace termínu z košíku nevadí, dokud v něm zbývá místo."""
+        with self._interleave(self._client('soubezny'), self.slots[0]):
+            bookings = book_time_slots(self.client_user, [slot.pk for slot in self.slots[:2]])
+
+        self.assertEqual(len(bookings), 2)
+        first = TimeSlot.objects.get(pk=self.slots[0].pk)
+        self.assertEqual(first.booked_count, 2)
+        self.assertFalse(first.is_available)
+
+    def test_concurrent_booking_taking_last_seat_aborts_basket(self):
+        """Zabere-li souběžná rezervace poslední místo, košík se celý vrátí."""
+        TimeSlot.objects.filter(pk=self.slots[0].pk).update(booked_count=1)
+
+        with self._interleave(self._client('soubezny'), self.slots[0]), self.assertRaises(BasketError):
+            book_time_slots(self.client_user, [slot.pk for slot in self.slots[:2]])
+
+        self.assertFalse(Booking.objects.filter(client=self.client_user).exists())
+        self.assertEqual(TimeSlot.objects.get(pk=self.slots[1].pk).booked_count, 0)
+
+    def test_unavailable_slot_rejects_whole_basket(self):
+        """Plný termín v košíku zablokuje celou rezervaci a nahlásí se u něj."""
+        full = self.slots[1]
+        TimeSlot.objects.filter(pk=full.pk).update(booked_count=2, is_available=False)
+
+        with self.assertRaises(BasketError) as raised:
+            book_time_slots(self.client_user, [self.slots[0].pk, full.pk, 999999])
+
+        self.assertEqual(set(raised.exception.errors), {full.pk, 999999})
+        self.assertFalse(Booking.objects.exists())
+
+    def test_insufficient_credits_rolls_back_seats(self):
+        """Při nedostatku kreditu se obsazená místa vrátí."""
+        User.objects.filter(pk=self.client_user.pk).update(credits=Decimal('150.00'))
+        self.client_user.refresh_from_db()
+
+        with self.assertRaises(BasketError):
+            book_time_slots(self.client_user, [slot.pk for slot in self.slots[:2]])
+
+        self.assertEqual(sum(TimeSlot.objects.values_list('booked_count', flat=True)), 0)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_query_count_does_not_depend_on_basket_size(self):
+        """Košík se dvěma i deseti termíny stojí stejný počet dotazů."""
+        with CaptureQueriesContext(connection) as small_ctx:
+            book_time_slots(self.client_user, [slot.pk for slot in self.slots[:2]])
+        with CaptureQueriesContext(connection) as large_ctx:
+            book_time_slots(self.client_user, [slot.pk for slot in self.slots[2:]])
+
+        self.assertEqual(len(small_ctx.captured_queries), len(large_ctx.captured_queries))
+
+    def test_view_reports_errors_as_json(self):
+        """Endpoint košíku vrací chyby jednotlivých termínů v JSON."""
+        TimeSlot.objects.filter(pk=self.slots[0].pk).update(booked_count=2, is_available=False)
+        self.client.login(username='klient@test.cz', password='testpass123')
+
+        response = self.client.post(
+            reverse('bookings:basket_book'),
+            {'slots': [self.slots[0].pk, self.slots[1].pk]},
+            HTTP_ACCEPT='application/json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['errors']), [str(self.slots[0].pk)])
+
+        response = self.client.post(reverse('bookings:basket_book'), {'slots': [self.slots[1].pk, self.slots[2].pk]})
+        self.assertRedirects(response, reverse('accounts:client_dashboard'))
+        self.assertEqual(Booking.objects.filter(client=self.client_user).count(), 2)
+
+
+class DuplicateBookingTests(TestCase):
+    """Testy pro ochranu proti duplicitním rezervacím (dvojklik, retry)."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.client_user = User.objects.create_user(
+            username='klient@test.cz',
+            email='klient@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('1000.00')
+        )
+        self.lesson = Lesson.objects.create(
+            instructor=self.instructor,
+            title='Test lekce',
+            price=Decimal('100.00'),
+            duration=60,
+            capacity=10,
+        )
+        self.time_slot = TimeSlot.objects.create(lesson=self.lesson, start_time=timezone.now() + timedelta(days=1))
+
+    def test_past_and_cancelled_slots_cannot_be_booked(self):
+        """Proběhlý ani zrušený termín nejde rezervovat a kredit se nestrhne."""
+        past = TimeSlot.objects.create(lesson=self.lesson, start_time=timezone.now() - timedelta(hours=1))
+        with self.assertRaises(BookingError):
+            book_time_slot(self.client_user, past.pk)
+
+        cancel_time_slot(self.time_slot)
+        # Ani slot, který v paměti vypadá dostupně, podmíněný UPDATE neobsadí
+        TimeSlot.objects.filter(pk=self.time_slot.pk).update(is_available=True)
+        with self.assertRaises(BookingError):
+            book_time_slot(self.client_user, self.time_slot.pk)
+        self.time_slot.is_available = True
+        self.assertFalse(self.time_slot.reserve_seat())
+
+        self.client_user.refresh_from_db()
+        self.assertEqual(self.client_user.credits, Decimal('1000.00'))
+        self.assertFalse(Booking.objects.filter(client=self.client_user).exists())
+
+    def test_replayed_booking_post_is_not_processed_again(self):
+        """Opakované odeslání se stejným klíčem vrátí původní přesměrování."""
+        self.client.login(username='klient@test.cz', password='testpass123')
+        url = reverse('bookings:booking_create', args=[self.time_slot.pk])
+        key = self.client.get(url).context['idempotency_key']
+
+        first = self.client.post(url, {'idempotency_key': key})
+        second = self.client.post(url, {'idempotency_key': key})
+
+        self.assertRedirects(first, reverse('accounts:client_dashboard'), fetch_redirect_response=False)
+        self.assertEqual(second['Location'], first['Location'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Booking.objects.count(), 1)
+        self.client_user.refresh_from_db()
+        self.assertEqual(self.client_user.credits, Decimal('900.00'))
+
+    def test_unique_active_booking_constraint(self):
+        """Dvě aktivní rezervace téhož termínu nejdou uložit, po stornu lze rezervovat znovu."""
+        booking = book_time_slot(self.client_user, self.time_slot.pk)
+
+        with self.assertRaises(BookingError):
+            book_time_slot(self.client_user, self.time_slot.pk)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Booking.objects.create(client=self.client_user, time_slot=self.time_slot, status='pending')
+
+        booking.cancel()
+        book_time_slot(self.client_user, self.time_slot.pk)
+        self.assertEqual(Booking.objects.filter(time_slot=self.time_slot).count(), 2)
+
+
+class RateLimitTests(TestCase):
+    """Testy pro omezení četnosti požadavků (reservations.middleware)."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.client_user = User.objects.create_user(
+            username='klient@test.cz',
+            email='klient@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('1000.00')
+        )
+        self.lesson = Lesson.objects.create(
+            instructor=self.instructor,
+            title='Test lekce',
+            price=Decimal('100.00'),
+            duration=60,
+            capacity=10,
+        )
+        start = timezone.now() + timedelta(days=1)
+        self.slots = [
+            TimeSlot.objects.create(lesson=self.lesson, start_time=start + timedelta(hours=2 * i))
+            for i in range(2)
+        ]
+
+    def tearDown(self):
+        cache.clear()
+
+    @override_settings(RATELIMITS={'bookings:booking_create': {'methods': ('POST',), 'ip': '2/m'}})
+    def test_ip_budget_rejects_without_database(self):
+        """Po vyčerpání limitu IP adresy vrací 429 bez jediného dotazu do DB."""
+        url = reverse('bookings:booking_create', args=[self.slots[0].pk])
+        for _ in range(2):
+            self.assertEqual(self.client.post(url, REMOTE_ADDR='10.0.0.1').status_code, 302)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(len(queries), 0)
+
+        # Jiná adresa má vlastní zásobník, GET se nepočítá
+        self.assertEqual(self.client.post(url, REMOTE_ADDR='10.0.0.2').status_code, 302)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.1').status_code, 302)
+
+    @override_settings(RATELIMITS={'bookings:booking_create': {'methods': ('POST',), 'ip': '100/m', 'user': '1/m'}})
+    def test_user_budget(self):
+        """Přihlášený uživatel má vlastní limit nezávislý na IP adrese."""
+        self.client.login(username='klient@test.cz', password='testpass123')
+        first = self.client.post(reverse('bookings:booking_create', args=[self.slots[0].pk]))
+        second = self.client.post(
+            reverse('bookings:booking_create', args=[self.slots[1].pk]), REMOTE_ADDR='10.0.0.3'
+        )
+
+        self.assertEqual(first.status_code, 302)
+        self.assertEqual(second.status_code, 429)
+        self.assertEqual(Booking.objects.filter(client=self.client_user).count(), 1)
+
+    @override_settings(RATELIMITS={
+        'accounts:login': {'methods': ('POST',), 'ip': '100/m', 'user': '2/m', 'user_field': 'username'},
+    })
+    def test_login_budget_follows_account_and_address(self):
+        """Limit přihlášení platí na účet z dané adresy – cookie nepomůže, jiná adresa se přihlásí."""
+        url = reverse('accounts:login')
+        for _ in range(2):
+            self.assertEqual(Client().post(
+                url, {'username': 'klient@test.cz', 'password': 'spatne'}, REMOTE_ADDR='10.0.1.1'
+            ).status_code, 200)
+
+        response = Client().post(url, {'username': ' KLIENT@test.cz', 'password': 'spatne'}, REMOTE_ADDR='10.0.1.1')
+        self.assertEqual(response.status_code, 429)
+
+        # Vlastník účtu z jiné adresy se přihlásí, i když je první adresa omezená
+        response = Client().post(
+            url, {'username': 'klient@test.cz', 'password': 'testpass123'}, REMOTE_ADDR='10.0.1.2'
+        )
+        self.assertEqual(response.status_code, 302)
@@ -7,13 +7,17 @@ app_name = 'bookings'
 urlpatterns = [
     # API a události
     path('events/', views.get_events, name='get_events'),
+    path('lessons/month/', views.lessons_month, name='lessons_month'),
     
     # Veřejné zobrazení lekce
     path('lesson/<int:pk>/', views.LessonDetailView.as_view(), name='lesson_detail'),
     
     # Rezervace (klienti)
     path('create/<int:time_slot_id>/', views.BookingCreateView.as_view(), name='booking_create'),
+    path('basket/', views.BasketBookingView.as_view(), name='basket_book'),
     path('cancel/<int:booking_id>/', views.BookingCancelView.as_view(), name='booking_cancel'),
+    path('waitlist/<int:time_slot_id>/join/', views.WaitlistJoinView.as_view(), name='waitlist_join'),
+    path('waitlist/<int:time_slot_id>/leave/', views.WaitlistLeaveView.as_view(), name='waitlist_leave'),
     
     # Instruktoři - správa lekcí
     # Přesměrování na dashboard - lekce jsou nyní přímo tam
@@ -25,5 +29,8 @@ urlpatterns = [
     
     # Instruktoři - správa termínů
     path('instructor/lesson/<int:lesson_id>/timeslot/add/', views.TimeSlotCreateView.as_view(), name='timeslot_add'),
+    path('instructor/lesson/<int:lesson_id>/timeslot/series/', views.TimeSlotSeriesCreateView.as_view(), name='timeslot_series_add'),
+    path('instructor/lesson/<int:lesson_id>/timeslot/shift/', views.TimeSlotShiftView.as_view(), name='timeslot_shift'),
+    path('instructor/timeslot/<int:pk>/cancel/', views.TimeSlotCancelView.as_view(), name='timeslot_cancel'),
     path('instructor/timeslot/<int:pk>/delete/', views.TimeSlotDeleteView.as_view(), name='timeslot_delete'),
 ]
\ No newline at end of file
@@ -1,58 +1,178 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.db.models import Count, Prefetch, Q, Sum
+from django.db.models.functions import Coalesce
 from django.http import JsonResponse
-from django.views.generic import TemplateView, ListView, DetailView, CreateView, UpdateView, DeleteView
-from .models import TimeSlot, Booking, Lesson, Category
-from .forms import TimeSlotForm
+from django.views.generic import TemplateView, ListView, DetailView, CreateView, UpdateView, DeleteView, FormView
+from .models import TimeSlot, Booking, Lesson, Category, WaitlistEntry
+from .forms import TimeSlotForm, TimeSlotSeriesForm, TimeSlotShiftForm
+from .services import (
+    BasketError, BookingError, ScheduleConflict, book_time_slot, book_time_slots, cancel_time_slot,
+    create_time_slot_series, reschedule_time_slots, shift_time_slots,
+)
+from .cache import cached_schedule
+from .scheduling import describe_conflicts, find_conflicts
+from .conditional import conditional_page, lesson_last_modified, schedule_last_modified
 from django.utils import timezone
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
 from django.views import View
-from datetime import datetime
-from accounts.mixins import InstructorRequiredMixin
+from django.utils.decorators import method_decorator
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, timedelta, timezone as dt_timezone
+from accounts.mixins import IdempotentPostMixin, InstructorRequiredMixin
+from payments.models import TopUp
+
+User = get_user_model()
+
+def _lesson_start(lesson):
+    """Začátek lekce podle jejích polí date + start_time jako aware datetime."""
+    start = datetime.combine(lesson.date, lesson.start_time)
+    if timezone.is_naive(start):
+        start = timezone.make_aware(start, timezone.get_current_timezone())
+    return start
+
 
 class CalendarView(TemplateView):
     template_name = 'bookings/calendar.html'
 
+# Výchozí i největší šířka okna feedu (měsíční mřížka FullCalendaru má 6 týdnů);
+# delší požadovaný rozsah se ořízne, aby feed nikdy neserializoval celý rozvrh.
+EVENTS_DEFAULT_WINDOW = timedelta(days=42)
+EVENTS_MAX_WINDOW = timedelta(days=42)
+
+
+def _parse_range_param(value):
+    """
+    Převede hodnotu `start`/`end` z query stringu FullCalendaru na aware datetime.
+    Akceptuje ISO datetime (i s offsetem) nebo samotné datum; jinak vrací None.
+    """
+    if not value:
+        return None
+    # `+` v offsetu může při nezakódovaném URL dorazit jako mezera
+    value = value.strip().replace(' ', '+')
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            parsed_date = parse_date(value)
+            if parsed_date is None:
+                return None
+            parsed = datetime.combine(parsed_date, datetime.min.time())
+    except ValueError:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.get_current_timezone())
+    return parsed
+
+
+@conditional_page(lambda request: schedule_last_modified(), per_user=False)
 def get_events(request):
-    start = request.GET.get('start')
-    end = request.GET.get('end')
-    
+    """
+    JSON feed pro FullCalendar. Vrací pouze budoucí sloty v požadovaném okně
+    [start, end); volná místa čte z denormalizovaného počítadla slotu.
+    Odpověď se drží ve verzované cache rozvrhu, dokud se rozvrh nezmění.
+    """
+    # Okno se normalizuje (UTC, celé minuty, nejvýše EVENTS_MAX_WINDOW) dřív,
+    # než z něj vznikne klíč cache – libovolné parametry tak nezaplní cache
+    start = _parse_range_param(request.GET.get('start'))
+    if start is None:
+        start = timezone.make_aware(datetime.combine(timezone.localdate(), datetime.min.time()))
+    start = start.astimezone(dt_timezone.utc).replace(second=0, microsecond=0)
+    end = _parse_range_param(request.GET.get('end'))
+    end = min(end.astimezone(dt_timezone.utc) if end else start + EVENTS_DEFAULT_WINDOW, start + EVENTS_MAX_WINDOW)
+    end = end.replace(second=0, microsecond=0)
+
+    def build_events():
+        window_start = max(start, timezone.now())
+        window_end = end
+        if window_end <= window_start:
+            return []
+
+        time_slots = TimeSlot.objects.filter(
+            start_time__gte=window_start,
+            start_time__lt=window_end,
+            cancelled_at__isnull=True,
+        ).select_related('lesson', 'lesson__instructor').order_by('start_time')
+
+        events = []
+        for slot in time_slots:
+            available_spots = slot.seats_left
+
+            events.append({
+                'id': slot.id,
+                'title': slot.lesson.title,
+                'start': slot.start_time.isoformat(),
+                'end': (slot.start_time + timedelta(minutes=slot.lesson.duration)).isoformat(),
+                'extendedProps': {
+                    'instructor': slot.lesson.instructor.get_full_name(),
+                    'duration': slot.lesson.duration,
+                    'price': float(slot.lesson.price),
+                    'capacity': slot.lesson.capacity,
+                    'availableSpots': available_spots,
+                    'description': slot.lesson.description,
+                    'isAvailable': slot.is_available and available_spots > 0,
+                    'timeSlotId': slot.id,
+                }
+            })
+        return events
+
+    # Feed je pro všechny návštěvníky stejný – cachujeme podle požadovaného okna
+    cache_name = f"events:{start:%Y-%m-%dT%H:%M}:{end:%Y-%m-%dT%H:%M}"
+    return JsonResponse(cached_schedule(cache_name, build_events), safe=False)
+
+class ContactView(TemplateView):
+    template_name = 'contact.html'
+
+def _month_range(year, month):
+    """Vrací aware interval [první den měsíce, první den následujícího měsíce)."""
+    start_of_month = timezone.make_aware(datetime(year, month, 1))
+    if month == 12:
+        end_of_month = timezone.make_aware(datetime(year + 1, 1, 1))
+    else:
+        end_of_month = timezone.make_aware(datetime(year, month + 1, 1))
+    return start_of_month, end_of_month
+
+
+def get_lessons_for_month(year, month):
+    """
+    Budoucí sloty daného měsíce seskupené podle dne (klíč YYYY-MM-DD).
+    Celý měsíc se načte jedním dotazem; obsazenost je sloupec slotu.
+    """
+    start_of_month, end_of_month = _month_range(year, month)
     time_slots = TimeSlot.objects.filter(
-        start_time__gte=timezone.now()
-    ).select_related('lesson', 'lesson__instructor')
-    
-    events = []
+        start_time__gte=max(start_of_month, timezone.now()),
+        start_time__lt=end_of_month,
+        cancelled_at__isnull=True,
+    ).select_related('lesson', 'lesson__instructor', 'lesson__category').order_by('start_time')
+
+    lessons_by_day = {}
     for slot in time_slots:
-        booked_count = Booking.objects.filter(
-            time_slot=slot,
-            status='confirmed'
-        ).count()
-        
-        available_spots = slot.lesson.capacity - booked_count
-        
-        events.append({
-            'id': slot.id,
+        day_key = slot.start_time.strftime('%Y-%m-%d')
+        lessons_by_day.setdefault(day_key, []).append({
+            'id': slot.lesson.id,
             'title': slot.lesson.title,
-            'start': slot.start_time.isoformat(),
-            'end': (slot.start_time + timezone.timedelta(minutes=slot.lesson.duration)).isoformat(),
-            'extendedProps': {
-                'instructor': slot.lesson.instructor.get_full_name(),
-                'duration': slot.lesson.duration,
-                'price': float(slot.lesson.price),
-                'capacity': slot.lesson.capacity,
-                'availableSpots': available_spots,
-                'description': slot.lesson.description,
-                'isAvailable': slot.is_available and available_spots > 0,
-                'timeSlotId': slot.id,
-            }
+            'time': slot.start_time.strftime('%H:%M'),
+            'duration': slot.lesson.duration,
+            'price': float(slot.lesson.price),
+            'available_spots': slot.seats_left,
+            'capacity': slot.lesson.capacity,
+            'instructor': slot.lesson.instructor.get_full_name(),
+            'category': slot.lesson.category.slug if slot.lesson.category else 'other',
+            'location': slot.lesson.location
         })
-    
-    return JsonResponse(events, safe=False)
+    return lessons_by_day
 
-class ContactView(TemplateView):
-    template_name = 'contact.html'
 
+def get_cached_lessons_for_month(year, month):
+    """`get_lessons_for_month` obsloužené z verzované cache rozvrhu."""
+    return cached_schedule(f'month:{year}-{month}', lambda: get_lessons_for_month(year, month))
+
+
+@method_decorator(conditional_page(lambda request: schedule_last_modified()), name='dispatch')
 class LessonListView(ListView):
     model = Lesson
     template_name = 'lessons.html'
@@ -62,78 +182,35 @@ class LessonListView(ListView):
         context = super().get_context_data(**kwargs)
         current_date = timezone.now()
         
-        # Kategorie pro ouška - načteme z databáze
-        categories = [(cat.slug, cat.name) for cat in Category.objects.all().order_by('order', 'name')]
-
-        # Načteme data pro aktuální měsíc + 5 měsíců dopředu (celkem 6 měsíců)
-        all_lessons_by_month = {}
-        for month_offset in range(6):
-            # Vypočítáme rok a měsíc
-            target_month = current_date.month + month_offset
-            target_year = current_date.year
-            
-            # Ošetříme přechod přes konec roku
-            while target_month > 12:
-                target_month -= 12
-                target_year += 1
-            
-            month_key = f"{target_year}-{target_month}"
-            all_lessons_by_month[month_key] = self._get_lessons_for_month(target_year, target_month)
-
-        context['all_lessons_by_month'] = all_lessons_by_month
+        # Kategorie pro ouška - načteme z databáze (přes cache rozvrhu)
+        categories = cached_schedule('categories', lambda: [
+            (cat.slug, cat.name) for cat in Category.objects.all().order_by('order', 'name')
+        ])
+
+        # Do stránky vložíme jen aktuální měsíc, další měsíce si kalendář
+        # dotáhne přes bookings:lessons_month až při navigaci.
+        month_key = f"{current_date.year}-{current_date.month}"
+        context['all_lessons_by_month'] = {
+            month_key: get_cached_lessons_for_month(current_date.year, current_date.month)
+        }
         context['current_month'] = current_date.month
         context['current_year'] = current_date.year
         context['categories'] = categories
         return context
-    
-    def _get_lessons_for_month(self, year, month):
-        """Pomocná metoda pro získání lekcí pro daný měsíc"""
-        from datetime import datetime
-        
-        # První den měsíce
-        start_of_month = timezone.make_aware(datetime(year, month, 1))
-        
-        # Poslední den měsíce
-        if month == 12:
-            end_of_month = timezone.make_aware(datetime(year + 1, 1, 1)) - timezone.timedelta(seconds=1)
-        else:
-            end_of_month = timezone.make_aware(datetime(year, month + 1, 1)) - timezone.timedelta(seconds=1)
-        
-        # Získáme pouze budoucí sloty v daném měsíci
-        now = timezone.now()
-        time_slots = TimeSlot.objects.filter(
-            start_time__gte=max(start_of_month, now),
-            start_time__lte=end_of_month
-        ).select_related('lesson', 'lesson__instructor', 'lesson__category').order_by('start_time')
 
-        # Klíčujeme podle YYYY-MM-DD
-        lessons_by_day = {}
-        for slot in time_slots:
-            day_key = slot.start_time.strftime('%Y-%m-%d')
-            if day_key not in lessons_by_day:
-                lessons_by_day[day_key] = []
-
-            booked_count = Booking.objects.filter(
-                time_slot=slot,
-                status='confirmed'
-            ).count()
-            available_spots = slot.lesson.capacity - booked_count
-
-            lessons_by_day[day_key].append({
-                'id': slot.lesson.id,
-                'title': slot.lesson.title,
-                'time': slot.start_time.strftime('%H:%M'),
-                'duration': slot.lesson.duration,
-                'price': float(slot.lesson.price),
-                'available_spots': available_spots,
-                'capacity': slot.lesson.capacity,
-                'instructor': slot.lesson.instructor.get_full_name(),
-                'category': slot.lesson.category.slug if slot.lesson.category else 'other',
-                'location': slot.lesson.location
-            })
-        
-        return lessons_by_day
 
+def lessons_month(request):
+    """JSON endpoint s lekcemi jednoho měsíce pro kalendář na stránce /lekce/."""
+    try:
+        year = int(request.GET.get('year', ''))
+        month = int(request.GET.get('month', ''))
+        if not 1 <= month <= 12 or not 1 <= year <= 9998:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'Neplatný rok nebo měsíc.'}, status=400)
+    return JsonResponse(get_cached_lessons_for_month(year, month))
+
+@method_decorator(conditional_page(lambda request, pk: lesson_last_modified(pk)), name='dispatch')
 class LessonDetailView(DetailView):
     model = Lesson
     template_name = 'lessons_detail.html'
@@ -144,49 +221,52 @@ class LessonDetailView(DetailView):
         # Získáme budoucí časové sloty pro tuto lekci
         context['time_slots'] = TimeSlot.objects.filter(
             lesson=self.object,
-            start_time__gte=timezone.now()
+            start_time__gte=timezone.now(),
+            cancelled_at__isnull=True,
         ).order_by('start_time')
+        # Termíny, na které přihlášený klient čeká v pořadníku
+        user = self.request.user
+        context['waitlisted_ids'] = set(
+            WaitlistEntry.objects.filter(client=user, time_slot__lesson=self.object).values_list('time_slot_id', flat=True)
+        ) if user.is_authenticated and user.is_client else set()
         return context
 
-class BookingCreateView(LoginRequiredMixin, CreateView):
+class BookingCreateView(LoginRequiredMixin, IdempotentPostMixin, CreateView):
     model = Booking
     fields = []
     template_name = 'bookings/booking_create.html'
     success_url = reverse_lazy('accounts:client_dashboard')
 
+    def get_time_slot(self):
+        """Načte rezervovaný termín jednou za požadavek (i s lekcí)."""
+        if not hasattr(self, '_time_slot'):
+            self._time_slot = get_object_or_404(
+                TimeSlot.objects.select_related('lesson', 'lesson__instructor'),
+                id=self.kwargs.get('time_slot_id')
+            )
+        return self._time_slot
+
     def get_form(self, form_class=None):
         """Předvyplníme instance formu hodnotami, které nejsou ve formuláři,
         aby prošla modelová validace (clean), která time_slot vyžaduje."""
         form = super().get_form(form_class)
-        time_slot_id = self.kwargs.get('time_slot_id')
-        if time_slot_id:
-            form.instance.time_slot = get_object_or_404(TimeSlot, id=time_slot_id)
+        form.instance.time_slot = self.get_time_slot()
         form.instance.client = self.request.user
         return form
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        time_slot_id = self.kwargs.get('time_slot_id')
-        context['time_slot'] = get_object_or_404(TimeSlot, id=time_slot_id)
+        context['time_slot'] = self.get_time_slot()
         return context
 
     def form_valid(self, form):
-        time_slot_id = self.kwargs.get('time_slot_id')
-        time_slot = get_object_or_404(TimeSlot, id=time_slot_id)
-    
-        if not time_slot.is_available:
-            messages.error(self.request, "Tento termín již není dostupný.")
-            return self.form_invalid(form)
-    
-        if self.request.user.credits < time_slot.lesson.price:
-            messages.error(self.request, "Nemáte dostatek kreditů pro tuto rezervaci.")
+        # Kontrola dostupnosti, odečtení kreditu i uložení proběhne atomicky ve službě
+        try:
+            self.object = book_time_slot(self.request.user, self.get_time_slot().pk)
+        except BookingError as e:
+            messages.error(self.request, str(e))
             return self.form_invalid(form)
-    
-        form.instance.client = self.request.user
-        form.instance.time_slot = time_slot
-        form.instance.status = 'confirmed'
-    
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
 
 class BookingCancelView(LoginRequiredMixin, View):
     def post(self, request, booking_id):
@@ -198,13 +278,95 @@ class BookingCancelView(LoginRequiredMixin, View):
         
         try:
             booking.cancel()
-            messages.success(request, f"Rezervace byla úspěšně zrušena. Kredit {booking.time_slot.lesson.price} Kč byl vrácen na váš účet.")
+            messages.success(request, f"Rezervace byla úspěšně zrušena. Kredit {booking.price_paid} Kč byl vrácen na váš účet.")
         except Exception as e:
             messages.error(request, f"Chyba při rušení rezervace: {str(e)}")
         
         return redirect('accounts:client_dashboard')
 
 
+class BasketBookingView(LoginRequiredMixin, IdempotentPostMixin, View):
+    """
+    Rezervace více termínů najednou (POST seznam `slots`). Buď se
+    zarezervují všechny, nebo žádný; chyby se hlásí u každého termínu.
+    Klient s hlavičkou `Accept: application/json` dostane odpověď v JSON.
+    """
+    
+    def post(self, request):
+        wants_json = request.headers.get('Accept', '').startswith('application/json')
+        slot_ids = [value for value in request.POST.getlist('slots') if value.isdigit()]
+        try:
+            if not request.user.is_client:
+                raise BasketError("Rezervovat mohou pouze klienti.")
+            bookings = book_time_slots(request.user, slot_ids)
+        except BasketError as e:
+            return self.failure(request, e, wants_json)
+        
+        total = sum(booking.price_paid for booking in bookings)
+        if wants_json:
+            return JsonResponse({
+                'ok': True,
+                'bookings': [booking.pk for booking in bookings],
+                'total': str(total),
+                'credits': str(request.user.credits),
+            })
+        messages.success(request, f"Rezervováno {len(bookings)} termínů za {total} Kč.")
+        return redirect('accounts:client_dashboard')
+    
+    def failure(self, request, error, wants_json):
+        errors = {
+            slot.pk: (timezone.localtime(slot.start_time).strftime('%d.%m.%Y %H:%M'), slot.lesson.title)
+            for slot in TimeSlot.objects.filter(pk__in=error.errors).select_related('lesson')
+        }
+        if wants_json:
+            return JsonResponse(
+                {'ok': False, 'error': str(error), 'errors': {str(pk): msg for pk, msg in error.errors.items()}},
+                status=400,
+            )
+        messages.error(request, str(error))
+        for pk, message in error.errors.items():
+            when, title = errors.get(pk, ('', f'Termín #{pk}'))
+            messages.error(request, f"{title} {when}: {message}")
+        lesson_id = request.POST.get('lesson', '')
+        if lesson_id.isdigit():
+            return redirect('bookings:lesson_detail', pk=int(lesson_id))
+        return redirect('lessons')
+
+
+class WaitlistJoinView(LoginRequiredMixin, View):
+    """Zařazení klienta do pořadníku plně obsazeného termínu."""
+    
+    def post(self, request, time_slot_id):
+        slot = get_object_or_404(
+            TimeSlot, pk=time_slot_id, start_time__gte=timezone.now(), cancelled_at__isnull=True
+        )
+        if not request.user.is_client:
+            messages.error(request, "Do pořadníku se mohou zapsat pouze klienti.")
+        elif slot.is_available:
+            messages.info(request, "Na termínu je volné místo, můžete si ho rovnou rezervovat.")
+        elif Booking.objects.filter(time_slot=slot, client=request.user).exclude(status='cancelled').exists():
+            messages.info(request, "Na tento termín už máte rezervaci.")
+        else:
+            entry, created = WaitlistEntry.objects.get_or_create(time_slot=slot, client=request.user)
+            messages.success(
+                request,
+                f"Jste v pořadníku na {entry.position()}. místě. Jakmile se místo uvolní, "
+                f"rezervujeme ho pro vás a pošleme upozornění."
+            )
+        return redirect('bookings:lesson_detail', pk=slot.lesson_id)
+
+
+class WaitlistLeaveView(LoginRequiredMixin, View):
+    """Odhlášení klienta z pořadníku."""
+    
+    def post(self, request, time_slot_id):
+        slot = get_object_or_404(TimeSlot, pk=time_slot_id)
+        deleted, _ = WaitlistEntry.objects.filter(time_slot=slot, client=request.user).delete()
+        if deleted:
+            messages.success(request, "Byli jste odhlášeni z pořadníku.")
+        return redirect('bookings:lesson_detail', pk=slot.lesson_id)
+
+
 # ===== INSTRUCTOR VIEWS =====
 # InstructorRequiredMixin je nyní importován z accounts.mixins
 
@@ -233,15 +395,17 @@ class LessonCreateView(InstructorRequiredMixin, CreateView):
     def form_valid(self, form):
         # Uložíme lekci pod přihlášeného lektora
         form.instance.instructor = self.request.user
+        conflicts = find_conflicts(form.instance, [_lesson_start(form.instance)])
+        if conflicts:
+            form.add_error(None, describe_conflicts(conflicts))
+            return self.form_invalid(form)
         response = super().form_valid(form)
 
         # Po vytvoření lekce automaticky vytvoříme první TimeSlot
         # podle zadaného datumu a času z modelu Lesson (aby se objevila v kalendáři).
         lesson = self.object
         try:
-            start_dt = datetime.combine(lesson.date, lesson.start_time)
-            if timezone.is_naive(start_dt):
-                start_dt = timezone.make_aware(start_dt, timezone.get_current_timezone())
+            start_dt = _lesson_start(lesson)
 
             # Pokud pro daný lesson+čas už slot existuje, nevytvářej duplicitně
             exists = TimeSlot.objects.filter(lesson=lesson, start_time=start_dt).exists()
@@ -272,6 +436,11 @@ class LessonUpdateView(InstructorRequiredMixin, UpdateView):
         old_date = old_lesson.date
         old_time = old_lesson.start_time
         
+        conflicts = self.find_conflicts(old_lesson, form.instance)
+        if conflicts:
+            form.add_error(None, describe_conflicts(conflicts))
+            return self.form_invalid(form)
+        
         response = super().form_valid(form)
         lesson = self.object
         
@@ -281,20 +450,16 @@ class LessonUpdateView(InstructorRequiredMixin, UpdateView):
         
         if date_changed or time_changed:
             try:
-                new_start = datetime.combine(lesson.date, lesson.start_time)
-                if timezone.is_naive(new_start):
-                    new_start = timezone.make_aware(new_start, timezone.get_current_timezone())
+                new_start = _lesson_start(lesson)
 
                 # Aktualizujeme VŠECHNY timesloty této lekce, které měly původní datum/čas
-                old_start = datetime.combine(old_date, old_time)
-                if timezone.is_naive(old_start):
-                    old_start = timezone.make_aware(old_start, timezone.get_current_timezone())
+                old_start = _lesson_start(old_lesson)
                 
-                # Najdeme timesloty s původním časem a aktualizujeme je
-                updated_count = TimeSlot.objects.filter(
-                    lesson=lesson,
-                    start_time=old_start
-                ).update(start_time=new_start)
+                # Najdeme timesloty s původním časem a přesuneme je i s jejich rezervacemi
+                updated_count = reschedule_time_slots(
+                    TimeSlot.objects.filter(lesson=lesson, start_time=old_start).values_list('pk', flat=True),
+                    new_start,
+                )
                 
                 # Pokud neexistuje žádný timeslot, vytvoříme nový
                 if updated_count == 0:
@@ -303,7 +468,7 @@ class LessonUpdateView(InstructorRequiredMixin, UpdateView):
                         TimeSlot.objects.create(lesson=lesson, start_time=new_start, is_available=True)
                         messages.info(self.request, "Byl vytvořen nový termín lekce.")
                     else:
-                        messages.warning(self.request, f"Změny data/času nebyly aplikovány na existující termíny. Upravte je ručně v detailu lekce.")
+                        messages.warning(self.request, "Změny data/času nebyly aplikovány na existující termíny. Přesuňte je hromadně tlačítkem 'Přesunout termíny' v detailu lekce.")
                 else:
                     messages.info(self.request, f"Bylo aktualizováno {updated_count} termín(ů) lekce.")
                     
@@ -314,6 +479,30 @@ class LessonUpdateView(InstructorRequiredMixin, UpdateView):
         return response
 
 
+    def find_conflicts(self, old_lesson, lesson):
+        """
+        Zkontroluje překryvy termínů, kterých se úprava dotkne: termín přesouvaný
+        se začátkem lekce a při změně délky či místa všechny budoucí termíny.
+        """
+        old_start = _lesson_start(old_lesson)
+        new_start = _lesson_start(lesson)
+        slots = TimeSlot.objects.filter(lesson=lesson)
+        if lesson.duration == old_lesson.duration and lesson.location == old_lesson.location:
+            if new_start == old_start:
+                return []
+            slots = slots.filter(start_time=old_start)
+        else:
+            slots = slots.filter(Q(start_time__gte=timezone.now()) | Q(start_time=old_start))
+        checked = {
+            pk: new_start if start == old_start else start
+            for pk, start in slots.values_list('pk', 'start_time')
+        }
+        if not checked and new_start != old_start and not TimeSlot.objects.filter(lesson=lesson).exists():
+            # Lekce bez termínů – po uložení se založí termín v novém čase
+            return find_conflicts(lesson, [new_start])
+        return find_conflicts(lesson, checked.values(), exclude_slots=checked)
+
+
 class LessonDeleteView(InstructorRequiredMixin, DeleteView):
     """Smazání lekce lektorem."""
     model = Lesson
@@ -335,56 +524,53 @@ class InstructorLessonDetailView(InstructorRequiredMixin, DetailView):
     model = Lesson
     template_name = 'bookings/instructor_lesson_detail.html'
     context_object_name = 'lesson'
+    slots_per_page = 20
     
     def get_queryset(self):
-        return Lesson.objects.filter(instructor=self.request.user)
+        return Lesson.objects.filter(instructor=self.request.user).select_related('category')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         lesson = self.object
         
-        # Všechny časové sloty pro tuto lekci
+        # Časové sloty po stránkách; rezervace a klienti se načítají jen pro zobrazené sloty
         time_slots = TimeSlot.objects.filter(lesson=lesson).order_by('start_time')
-        context['time_slots'] = time_slots
+        page = Paginator(time_slots, self.slots_per_page).get_page(self.request.GET.get('page'))
+        context['time_slots'] = page.object_list
+        context['page_obj'] = page
+        context['total_slots'] = page.paginator.count
         
-        # Všechny potvrzené rezervace pro tuto lekci
-        bookings = Booking.objects.filter(
-            time_slot__lesson=lesson,
-            status='confirmed'
-        ).select_related('client', 'time_slot').order_by('time_slot__start_time')
+        confirmed = Booking.objects.filter(time_slot__lesson=lesson, status='confirmed')
+        bookings = list(
+            confirmed.filter(time_slot__in=page.object_list)
+            .select_related('client', 'time_slot')
+            .order_by('starts_at')
+        )
         context['bookings'] = bookings
         
-        # Statistiky
-        context['total_bookings'] = bookings.count()
-        context['total_slots'] = time_slots.count()
-        
-        # Informace o kreditech klientů
-        from payments.models import TopUp
-        clients = set(booking.client for booking in bookings)
-        client_info = {}
-        total_pending_amount = 0
-        for client in clients:
-            # Kredit klienta
-            credit_balance = getattr(client, 'credits', 0)
-            
-            # Čekající dobití
-            pending_topups = TopUp.objects.filter(
-                user=client,
-                status='pending'
-            ).order_by('-created_at')
-            
-            pending_sum = sum(topup.amount for topup in pending_topups)
-            total_pending_amount += pending_sum
-            
-            client_info[client.id] = {
-                'client': client,
-                'credits': credit_balance,
-                'pending_topups': pending_topups,
-                'pending_total': pending_sum
-            }
+        # Statistiky celé lekce jedním agregačním dotazem
+        stats = confirmed.aggregate(total=Count('pk'), clients=Count('client', distinct=True))
+        context['total_bookings'] = stats['total']
+        context['total_clients'] = stats['clients']
+        context['total_pending_topups'] = TopUp.objects.filter(
+            status='pending', user__in=confirmed.values('client')
+        ).aggregate(total=Sum('amount'))['total'] or 0
         
-        context['client_info'] = client_info
-        context['total_pending_topups'] = total_pending_amount
+        # Kredity a čekající dobití klientů na stránce: jeden seskupený dotaz + jeden Prefetch
+        pending = Q(topups__status='pending')
+        clients = (
+            User.objects.filter(pk__in={booking.client_id for booking in bookings})
+            .annotate(
+                pending_total=Coalesce(Sum('topups__amount', filter=pending), Decimal('0')),
+                pending_count=Count('topups', filter=pending),
+            )
+            .prefetch_related(Prefetch(
+                'topups',
+                queryset=TopUp.objects.filter(status='pending').order_by('-created_at'),
+                to_attr='pending_topups',
+            ))
+        )
+        context['client_info'] = {client.id: client for client in clients}
         
         return context
 
@@ -400,6 +586,11 @@ class TimeSlotCreateView(InstructorRequiredMixin, CreateView):
         self.lesson = get_object_or_404(Lesson, pk=self.kwargs['lesson_id'], instructor=request.user)
         return super().dispatch(request, *args, **kwargs)
     
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['lesson'] = self.lesson
+        return kwargs
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['lesson'] = self.lesson
@@ -414,6 +605,82 @@ class TimeSlotCreateView(InstructorRequiredMixin, CreateView):
         return reverse_lazy('bookings:instructor_lesson_detail', kwargs={'pk': self.lesson.pk})
 
 
+class TimeSlotSeriesCreateView(InstructorRequiredMixin, FormView):
+    """Přidání opakované série termínů k lekci jedním odesláním formuláře."""
+    template_name = 'bookings/timeslot_series_form.html'
+    form_class = TimeSlotSeriesForm
+    
+    def dispatch(self, request, *args, **kwargs):
+        self.lesson = get_object_or_404(Lesson, pk=self.kwargs['lesson_id'], instructor=request.user)
+        return super().dispatch(request, *args, **kwargs)
+    
+    def get_initial(self):
+        return {'start_date': self.lesson.date, 'time': self.lesson.start_time}
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['lesson'] = self.lesson
+        return context
+    
+    def form_valid(self, form):
+        starts = form.occurrences()
+        if not starts:
+            form.add_error(None, "Zadanému opakování neodpovídá žádný budoucí termín.")
+            return self.form_invalid(form)
+        # Totožné termíny této lekce se jen přeskočí, nejde o kolizi
+        conflicts = [
+            (start, other) for start, other in find_conflicts(self.lesson, starts)
+            if not (other.lesson_id == self.lesson.pk and other.start == start)
+        ]
+        if conflicts:
+            form.add_error(None, describe_conflicts(conflicts))
+            return self.form_invalid(form)
+        created = create_time_slot_series(self.lesson, starts)
+        skipped = len(starts) - len(created)
+        messages.success(self.request, f"Bylo přidáno {len(created)} termínů k lekci '{self.lesson.title}'.")
+        if skipped:
+            messages.info(self.request, f"{skipped} termínů už existovalo a bylo přeskočeno.")
+        return redirect('bookings:instructor_lesson_detail', pk=self.lesson.pk)
+
+
+class TimeSlotShiftView(InstructorRequiredMixin, FormView):
+    """Hromadný přesun vybraných budoucích termínů lekce o zadaný posun."""
+    template_name = 'bookings/timeslot_shift_form.html'
+    form_class = TimeSlotShiftForm
+    # Kolik kolizí vypíšeme (zbytek jen spočítáme)
+    conflicts_shown = 20
+    
+    def dispatch(self, request, *args, **kwargs):
+        self.lesson = get_object_or_404(Lesson, pk=self.kwargs['lesson_id'], instructor=request.user)
+        return super().dispatch(request, *args, **kwargs)
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['lesson'] = self.lesson
+        context['future_count'] = TimeSlot.objects.filter(lesson=self.lesson, start_time__gte=timezone.now()).count()
+        return context
+    
+    def form_valid(self, form):
+        slots = form.filter_slots(TimeSlot.objects.filter(lesson=self.lesson))
+        try:
+            moved = shift_time_slots(self.lesson, slots, form.offset)
+        except ScheduleConflict as e:
+            form.add_error(None, str(e))
+            return self.render_to_response(self.get_context_data(
+                form=form,
+                conflicts=e.conflicts[:self.conflicts_shown],
+                conflicts_hidden=max(len(e.conflicts) - self.conflicts_shown, 0),
+            ))
+        except BookingError as e:
+            form.add_error(None, str(e))
+            return self.form_invalid(form)
+        if moved:
+            messages.success(self.request, f"Bylo přesunuto {moved} termínů lekce '{self.lesson.title}'.")
+        else:
+            messages.info(self.request, "Výběru neodpovídá žádný budoucí termín, nic nebylo přesunuto.")
+        return redirect('bookings:instructor_lesson_detail', pk=self.lesson.pk)
+
+
 class TimeSlotDeleteView(InstructorRequiredMixin, DeleteView):
     """Smazání časového slotu."""
     model = TimeSlot
@@ -426,9 +693,9 @@ class TimeSlotDeleteView(InstructorRequiredMixin, DeleteView):
     def delete(self, request, *args, **kwargs):
         slot = self.get_object()
         # Zkontrolujeme, zda nejsou na tento slot rezervace
-        bookings_count = Booking.objects.filter(time_slot=slot, status='confirmed').count()
+        bookings_count = slot.booked_count
         if bookings_count > 0:
-            messages.error(request, f"Nelze smazat termín, protože má {bookings_count} aktivních rezervací.")
+            messages.error(request, f"Nelze smazat termín, protože má {bookings_count} aktivních rezervací. Termín můžete zrušit – klientům se vrátí kredit.")
             return redirect('bookings:instructor_lesson_detail', pk=slot.lesson.pk)
         
         lesson_pk = slot.lesson.pk
@@ -439,3 +706,29 @@ class TimeSlotDeleteView(InstructorRequiredMixin, DeleteView):
     
     def get_success_url(self):
         return reverse_lazy('bookings:instructor_lesson_detail', kwargs={'pk': self.object.lesson.pk})
+
+
+class TimeSlotCancelView(InstructorRequiredMixin, DetailView):
+    """Zrušení termínu lektorem – rezervace se zruší a klientům se vrátí kredit."""
+    model = TimeSlot
+    template_name = 'bookings/timeslot_confirm_cancel.html'
+    
+    def get_queryset(self):
+        # Lektor může rušit pouze budoucí sloty svých vlastních lekcí
+        return TimeSlot.objects.filter(
+            lesson__instructor=self.request.user, start_time__gte=timezone.now()
+        ).select_related('lesson')
+    
+    def post(self, request, *args, **kwargs):
+        slot = self.get_object()
+        try:
+            cancelled = cancel_time_slot(slot, reason=request.POST.get('reason', '').strip()[:500])
+        except BookingError as e:
+            messages.error(request, str(e))
+        else:
+            messages.success(
+                request,
+                f"Termín {timezone.localtime(slot.start_time).strftime('%d.%m.%Y %H:%M')} byl zrušen, "
+                f"kredit byl vrácen {cancelled} klientům."
+            )
+        return redirect('bookings:instructor_lesson_detail', pk=slot.lesson_id)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment, TopUp
+from .models import Payment, TopUp, QRCodeTask, BankTransaction
 
 
 @admin.register(Payment)
@@ -14,3 +14,17 @@ class TopUpAdmin(admin.ModelAdmin):
 	list_display = ("id", "user", "amount", "variable_symbol", "status", "created_at")
 	list_filter = ("status", "created_at")
 	search_fields = ("user__username", "user__first_name", "user__last_name", "variable_symbol")
+
+
+@admin.register(QRCodeTask)
+class QRCodeTaskAdmin(admin.ModelAdmin):
+	list_display = ("id", "kind", "object_id", "status", "attempts", "created_at", "finished_at")
+	list_filter = ("status", "kind")
+	readonly_fields = ("claim_token", "claimed_at", "last_error", "finished_at")
+
+
+@admin.register(BankTransaction)
+class BankTransactionAdmin(admin.ModelAdmin):
+	list_display = ("reference", "variable_symbol", "amount", "topup", "created_at")
+	search_fields = ("reference", "variable_symbol")
+	raw_id_fields = ("topup",)
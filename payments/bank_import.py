@@ -0,0 +1,293 @@
+"""
+Import bankovního výpisu a automatické potvrzení dobití podle VS.
+
+Výpis se čte proudově – CSV po řádcích, camt.053 (ISO 20022 XML) přes
+`iterparse` se zahazováním zpracovaných položek – takže paměť nezávisí na
+velikosti souboru. Příchozí platby se párují po dávkách: pro každou dávku
+jeden dotaz na čekající TopUp podle indexu (status, variable_symbol) a
+nalezené shody se potvrdí hromadně přes `confirm_topups`.
+
+Použité platby se ukládají jako BankTransaction s jedinečnou referencí banky
+ve stejné transakci jako potvrzení, takže opakovaný nebo překrývající se
+výpis nic nepřipíše podruhé. Platba bez reference se proto automaticky
+nepáruje – zůstane k ručnímu schválení.
+"""
+import codecs
+import csv
+import re
+import unicodedata
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from xml.etree.ElementTree import iterparse
+
+from django.db import IntegrityError, transaction
+
+from .models import BankTransaction, TopUp
+from .services import confirm_topups
+
+# Názvy sloupců CSV exportů (bez diakritiky, malými písmeny)
+CSV_VS_COLUMNS = {'vs', 'variabilni symbol', 'variable symbol', 'variable_symbol'}
+CSV_AMOUNT_COLUMNS = {'castka', 'objem', 'amount', 'castka v mene uctu'}
+CSV_REFERENCE_COLUMNS = {'id pohybu', 'id transakce', 'reference', 'id'}
+
+VS_PATTERN = re.compile(r'VS[:/\s]*0*(\d{1,10})')
+
+# Kolik nespárovaných plateb si pamatujeme pro výpis (zbytek se jen počítá)
+UNMATCHED_SAMPLE = 50
+
+
+class StatementLine:
+    """Jedna příchozí platba z výpisu."""
+
+    def __init__(self, variable_symbol, amount, reference=''):
+        self.variable_symbol = variable_symbol
+        self.amount = amount
+        self.reference = reference
+
+    def __repr__(self):
+        return f'StatementLine(vs={self.variable_symbol!r}, amount={self.amount}, ref={self.reference!r})'
+
+
+class ImportResult:
+    """Souhrn importu: počty řádků, potvrzená dobití a ukázka nespárovaných plateb."""
+
+    def __init__(self):
+        self.lines = 0
+        self.matched = 0
+        self.already_imported = 0
+        self.unreferenced = 0
+        self.credited = Decimal('0')
+        self.unmatched = 0
+        self.unmatched_sample = []
+
+
+def _normalize_header(value):
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    return value.strip().strip('"').lower()
+
+
+def _normalize_vs(value):
+    # Banky VS často doplňují nulami zleva na 10 číslic
+    value = (value or '').strip()
+    return value.lstrip('0') if value.isdigit() else ''
+
+
+def _parse_amount(value):
+    value = (value or '').replace('\xa0', '').replace(' ', '').replace(',', '.')
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        return None
+
+
+def iter_csv(fileobj, encoding='utf-8-sig'):
+    """
+    Proudově čte CSV export (binární soubor). Oddělovač (středník, čárka,
+    tabulátor) se rozpozná z hlavičky. Vrací jen příchozí platby s VS.
+    """
+    lines = codecs.iterdecode(fileobj, encoding)
+    header_line = next(lines, '')
+    if not header_line.strip():
+        return
+    dialect = csv.Sniffer().sniff(header_line, delimiters=';,\t')
+    header = [_normalize_header(col) for col in next(csv.reader([header_line], dialect))]
+
+    def _column(names):
+        return next((i for i, col in enumerate(header) if col in names), None)
+
+    vs_col = _column(CSV_VS_COLUMNS)
+    amount_col = _column(CSV_AMOUNT_COLUMNS)
+    reference_col = _column(CSV_REFERENCE_COLUMNS)
+    if vs_col is None or amount_col is None:
+        raise ValueError('CSV neobsahuje sloupec s variabilním symbolem nebo částkou.')
+
+    for row in csv.reader(lines, dialect):
+        if len(row) <= max(vs_col, amount_col):
+            continue
+        amount = _parse_amount(row[amount_col])
+        vs = _normalize_vs(row[vs_col])
+        if amount is None or amount <= 0 or not vs:
+            continue
+        reference = row[reference_col].strip() if reference_col is not None and reference_col < len(row) else ''
+        yield StatementLine(vs, amount, reference)
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _find(elem, *path):
+    """Najde potomka podle cesty lokálních jmen (bez ohledu na namespace verze camt)."""
+    for name in path:
+        elem = next((child for child in elem if _local(child.tag) == name), None)
+        if elem is None:
+            return None
+    return elem
+
+
+def _text(elem, *path):
+    found = _find(elem, *path)
+    return (found.text or '').strip() if found is not None else ''
+
+
+def _camt_vs(elem):
+    # Strukturovaná reference (CdtrRefInf/Ref), jinak "VS..." v EndToEndId či zprávě
+    for node in elem.iter():
+        if _local(node.tag) == 'CdtrRefInf':
+            vs = _normalize_vs(_text(node, 'Ref'))
+            if vs:
+                return vs
+    for node in elem.iter():
+        if _local(node.tag) in ('EndToEndId', 'Ustrd', 'AddtlNtryInf', 'AddtlTxInf'):
+            match = VS_PATTERN.search(node.text or '')
+            if match:
+                return match.group(1)
+    return ''
+
+
+def iter_camt053(fileobj):
+    """
+    Proudově čte výpis camt.053 (binární soubor). Každá položka Ntry se po
+    zpracování odpojí ze stromu, takže v paměti je vždy jen jedna. Položka
+    s více TxDtls (hromadné zaúčtování) dává jednu platbu za transakci.
+    """
+    statement = None
+    for event, elem in iterparse(fileobj, events=('start', 'end')):
+        name = _local(elem.tag)
+        if event == 'start':
+            if name == 'Stmt':
+                statement = elem
+            continue
+        if name != 'Ntry':
+            continue
+
+        if _text(elem, 'CdtDbtInd') == 'CRDT':
+            reference = _text(elem, 'AcctSvcrRef') or _text(elem, 'NtryRef')
+            transactions = [node for node in elem.iter() if _local(node.tag) == 'TxDtls']
+            if len(transactions) > 1:
+                for position, tx in enumerate(transactions, 1):
+                    amount = _parse_amount(_text(tx, 'Amt') or _text(tx, 'AmtDtls', 'TxAmt', 'Amt'))
+                    vs = _camt_vs(tx)
+                    # Bez vlastní reference transakce ji odvodíme z reference položky
+                    tx_reference = _text(tx, 'Refs', 'AcctSvcrRef') or (reference and f'{reference}/{position}')
+                    if amount and amount > 0 and vs:
+                        yield StatementLine(vs, amount, tx_reference)
+            else:
+                amount = _parse_amount(_text(elem, 'Amt'))
+                vs = _camt_vs(elem)
+                if amount and amount > 0 and vs:
+                    yield StatementLine(vs, amount, reference)
+
+        elem.clear()
+        if statement is not None:
+            try:
+                statement.remove(elem)
+            except ValueError:
+                pass
+
+
+def detect_format(filename):
+    """'camt' pro XML výpisy, jinak 'csv'."""
+    return 'camt' if str(filename).lower().endswith('.xml') else 'csv'
+
+
+def iter_statement(fileobj, fmt, encoding='utf-8-sig'):
+    if fmt == 'camt':
+        return iter_camt053(fileobj)
+    if fmt == 'csv':
+        return iter_csv(fileobj, encoding=encoding)
+    raise ValueError(f'Neznámý formát výpisu: {fmt}')
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_statement(lines, batch_size=500, dry_run=False):
+    """
+    Spáruje příchozí platby s čekajícími dobitími (shodný VS i částka; při
+    více kandidátech nejstarší) a potvrdí je. Každá dávka = dva SELECTy
+    (už zpracované reference, kandidáti) a jedna transakce s `confirm_topups`
+    a zápisem použitých plateb.
+    """
+    result = ImportResult()
+    matched_ids = set()
+    seen_references = set()
+    for batch in _batches(lines, batch_size):
+        result.lines += len(batch)
+        with transaction.atomic():
+            imported = set(
+                BankTransaction.objects.filter(
+                    reference__in={line.reference for line in batch if line.reference}
+                ).values_list('reference', flat=True)
+            )
+            fresh = []
+            for line in batch:
+                if not line.reference:
+                    result.unreferenced += 1
+                elif line.reference in imported or line.reference in seen_references:
+                    result.already_imported += 1
+                else:
+                    seen_references.add(line.reference)
+                    fresh.append(line)
+
+            candidates = defaultdict(list)
+            pending = (
+                TopUp.objects.filter(
+                    status='pending',
+                    credited_at__isnull=True,
+                    variable_symbol__in={line.variable_symbol for line in fresh},
+                )
+                .order_by('created_at')
+                .values_list('pk', 'variable_symbol', 'amount')
+            )
+            if dry_run:
+                # Bez zápisu zůstávají spárovaná dobití čekající, nesmí se spárovat znovu
+                pending = pending.exclude(pk__in=matched_ids)
+            for pk, vs, amount in pending:
+                candidates[(vs, amount)].append(pk)
+
+            pairs = []
+            for line in fresh:
+                queue = candidates.get((line.variable_symbol, line.amount))
+                if queue:
+                    pairs.append((line, queue.pop(0)))
+                    if dry_run:
+                        result.credited += line.amount
+                else:
+                    result.unmatched += 1
+                    if len(result.unmatched_sample) < UNMATCHED_SAMPLE:
+                        result.unmatched_sample.append(line)
+
+            if dry_run:
+                matched_ids.update(topup_id for _, topup_id in pairs)
+                result.matched += len(pairs)
+                continue
+
+            confirmed = confirm_topups(
+                [topup_id for _, topup_id in pairs], description='Import bankovního výpisu'
+            )
+            confirmed_ids = {topup.pk for topup in confirmed}
+            try:
+                # Souběžný import téže platby skončí na jedinečné referenci a celá
+                # dávka (včetně potvrzení dobití) se vrátí
+                BankTransaction.objects.bulk_create([
+                    BankTransaction(
+                        reference=line.reference, variable_symbol=line.variable_symbol,
+                        amount=line.amount, topup_id=topup_id,
+                    )
+                    for line, topup_id in pairs if topup_id in confirmed_ids
+                ])
+            except IntegrityError:
+                raise ValueError('Stejný výpis se právě importuje souběžně, zkuste to prosím znovu.')
+            result.matched += len(confirmed)
+            result.credited += sum((topup.amount for topup in confirmed), Decimal('0'))
+    return result
@@ -0,0 +1,14 @@
+from django import forms
+
+
+class BankStatementForm(forms.Form):
+    statement = forms.FileField(
+        label='Bankovní výpis',
+        help_text='CSV export nebo výpis camt.053 (XML) z internetového bankovnictví.',
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv,.xml,.txt'}),
+    )
+    encoding = forms.ChoiceField(
+        label='Kódování CSV',
+        choices=(('utf-8-sig', 'UTF-8'), ('cp1250', 'Windows-1250')),
+        initial='utf-8-sig',
+    )
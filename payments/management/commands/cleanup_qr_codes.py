@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from payments.models import Payment, TopUp
+from payments.qr import QR_STORAGE_DIR
+
+
+class Command(BaseCommand):
+    help = 'Smaže soubory QR kódů, na které neodkazuje žádná platba ani dobití'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Pouze vypíše soubory ke smazání, nic nemaže',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=float,
+            default=24,
+            help='Mazat jen soubory starší než zadaný počet hodin (výchozí 24) – '
+                 'chrání právě vykreslené QR, které worker ještě nezapsal k záznamu',
+        )
+
+    def _walk(self, storage, path):
+        directories, files = storage.listdir(path)
+        for name in files:
+            yield f'{path}/{name}'
+        for directory in directories:
+            yield from self._walk(storage, f'{path}/{directory}')
+
+    def handle(self, *args, **options):
+        if options['min_age'] < 0:
+            raise CommandError('--min-age nesmí být záporné')
+        dry_run = options['dry_run']
+        cutoff = timezone.now() - timedelta(hours=options['min_age'])
+        storage = TopUp._meta.get_field('qr_code').storage
+
+        if not storage.exists(QR_STORAGE_DIR):
+            self.stdout.write('Adresář s QR kódy neexistuje, není co mazat.')
+            return
+
+        # Jména souborů, na které se odkazuje (jen krátké řetězce, ne celé řádky)
+        referenced = set()
+        for model in (Payment, TopUp):
+            referenced.update(
+                model.objects.exclude(qr_code='').values_list('qr_code', flat=True).iterator(chunk_size=2000)
+            )
+
+        checked = 0
+        removed = 0
+        for name in self._walk(storage, QR_STORAGE_DIR):
+            checked += 1
+            if name in referenced or storage.get_modified_time(name) > cutoff:
+                continue
+            # Worker mohl soubor mezitím znovu použít pro nový záznam (store_png
+            # mu obnoví čas změny) – těsně před smazáním ověříme obojí znovu
+            if storage.get_modified_time(name) > cutoff or any(
+                model.objects.filter(qr_code=name).exists() for model in (Payment, TopUp)
+            ):
+                continue
+            removed += 1
+            if dry_run:
+                self.stdout.write(f'  - {name}')
+            else:
+                storage.delete(name)
+
+        verb = 'ke smazání' if dry_run else 'smazáno'
+        self.stdout.write(self.style.SUCCESS(f'✓ Zkontrolováno {checked} souborů, {verb} {removed}'))
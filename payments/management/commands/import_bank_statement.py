@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from payments.bank_import import detect_format, import_statement, iter_statement
+
+
+class Command(BaseCommand):
+    help = 'Načte bankovní výpis (CSV nebo camt.053) a potvrdí dobití spárovaná podle VS a částky'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Cesta k souboru s výpisem')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'camt'],
+            help='Formát výpisu (výchozí podle přípony: .xml = camt, jinak csv)',
+        )
+        parser.add_argument(
+            '--encoding',
+            default='utf-8-sig',
+            help='Kódování CSV (výchozí utf-8-sig, české banky často cp1250)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Počet plateb párovaných v jedné dávce (výchozí 500)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Pouze spáruje platby a vypíše výsledek, nic nepotvrdí',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size musí být kladné číslo')
+        fmt = options['format'] or detect_format(options['path'])
+
+        try:
+            with open(options['path'], 'rb') as f:
+                result = import_statement(
+                    iter_statement(f, fmt, encoding=options['encoding']),
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run'],
+                )
+        except OSError as e:
+            raise CommandError(f'Soubor nelze otevřít: {e}')
+        except (ValueError, SyntaxError) as e:
+            raise CommandError(f'Výpis nelze načíst: {e}')
+
+        for line in result.unmatched_sample:
+            self.stdout.write(f'  ? Nespárováno: VS {line.variable_symbol}, {line.amount} Kč {line.reference}'.rstrip())
+        verb = 'Spárováno (bez zápisu)' if options['dry_run'] else 'Potvrzeno'
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {verb} {result.matched} dobití za {result.credited} Kč '
+            f'z {result.lines} plateb, nespárováno {result.unmatched}'
+        ))
+        if result.already_imported:
+            self.stdout.write(f'Přeskočeno {result.already_imported} plateb importovaných už dříve.')
+        if result.unreferenced:
+            self.stdout.write(self.style.WARNING(
+                f'{result.unreferenced} plateb bez reference banky nelze bezpečně párovat – schvalte je ručně.'
+            ))
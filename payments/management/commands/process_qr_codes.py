@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from payments.tasks import drain
+
+
+class Command(BaseCommand):
+    help = 'Vykreslí čekající QR kódy plateb a dobití (fronta QRCodeTask)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Počet úloh zabraných v jedné dávce (výchozí 50)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Počet vláken pro vykreslování a zápis PNG (výchozí 4)',
+        )
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Běží trvale a frontu kontroluje v intervalu --interval',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Pauza mezi kontrolami fronty v režimu --watch (sekundy)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        workers = options['workers']
+        if batch_size <= 0 or workers <= 0:
+            raise CommandError('--batch-size i --workers musí být kladná čísla')
+
+        while True:
+            processed = drain(batch_size=batch_size, workers=workers)
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f'✓ Zpracováno {processed} QR úloh'))
+            if not options['watch']:
+                break
+            time.sleep(options['interval'])
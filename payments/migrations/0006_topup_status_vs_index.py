@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_qrcodetask'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='topup',
+            index=models.Index(fields=['status', 'variable_symbol'], name='payments_to_status_5d454a_idx'),
+        ),
+    ]
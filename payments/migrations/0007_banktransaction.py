@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_topup_status_vs_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(help_text='Reference pohybu přidělená bankou.', max_length=100, unique=True)),
+                ('variable_symbol', models.CharField(max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('topup', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bank_transactions', to='payments.topup')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
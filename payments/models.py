@@ -1,12 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
-from django.core.files import File
-from io import BytesIO
 from decimal import Decimal, ROUND_HALF_UP
-import qrcode.main
 import qrcode.constants
-from PIL import Image
 from django.utils import timezone
+from .qr import store_png
 
 class Payment(models.Model):
     STATUS_CHOICES = (
@@ -32,36 +29,29 @@ class Payment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     qr_code = models.ImageField(upload_to='qr_codes/', blank=True)
     
-    def generate_qr_code(self):
-        qr = qrcode.main.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        
+    # Úroveň opravy chyb QR kódu (viz payments.qr)
+    QR_ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_L
+    
+    def qr_payload(self) -> str:
         # Zde můžete přidat vlastní formát dat pro QR kód (např. bankovní údaje)
-        qr_data = f"amount:{self.amount}|client:{self.client.username}|instructor:{self.instructor.username}"
-        qr.add_data(qr_data)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        
-        self.qr_code.save(
-            f'qr_payment_{self.id}.png',
-            File(buffer),
-            save=False
-        )
+        return f"amount:{self.amount}|client:{self.client.username}|instructor:{self.instructor.username}"
+    
+    def generate_qr_code(self):
+        """Synchronně zajistí PNG (používá worker fronty QRCodeTask), neukládá řádek."""
+        self.qr_code.name = store_png(self.qr_payload(), self.QR_ERROR_CORRECTION, self.qr_code.storage)
     
     def save(self, *args, **kwargs):
-        if not self.qr_code:
-            self.generate_qr_code()
-        if self.status == 'confirmed' and not hasattr(self, '_payment_processed'):
-            self.client.add_credits(self.amount)
-            self._payment_processed = True
-        super().save(*args, **kwargs)
+        creating = self._state.adding
+        with transaction.atomic():
+            process = self.status == 'confirmed' and not hasattr(self, '_payment_processed')
+            super().save(*args, **kwargs)
+            # PNG s QR kódem se vykreslí na pozadí (payments.tasks), ne v requestu
+            if creating and not self.qr_code:
+                QRCodeTask.enqueue(self)
+            if process:
+                # Připsání kreditu jde přes ledger ve stejné transakci jako uložení platby
+                self.client.add_credits(self.amount, kind='payment', reference=f'payment:{self.pk}')
+                self._payment_processed = True
     
     def __str__(self):
         return f"Platba {self.amount} Kč - {self.client.get_full_name()} -> {self.instructor.get_full_name()}"
@@ -105,6 +95,10 @@ class TopUp(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Párování plateb z bankovního výpisu (payments.bank_import)
+            models.Index(fields=['status', 'variable_symbol']),
+        ]
 
     @staticmethod
     def _format_amount(amount: Decimal) -> str:
@@ -133,25 +127,17 @@ class TopUp(models.Model):
             parts.append(f'MSG:{msg}')
         return '*'.join(parts)
 
+    QR_ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_M
+
+    def qr_payload(self) -> str:
+        return self._qrplatba_payload()
+
     def generate_qr_code(self):
-        data = self._qrplatba_payload()
-        qr = qrcode.main.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_M,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(data)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        filename = f'topup_{self.pk}.png' if self.pk else 'topup.png'
-        self.qr_code.save(filename, File(buffer), save=False)
+        """Synchronně zajistí PNG (používá worker fronty QRCodeTask), neukládá řádek."""
+        self.qr_code.name = store_png(self.qr_payload(), self.QR_ERROR_CORRECTION, self.qr_code.storage)
 
     def save(self, *args, **kwargs):
-        # Při prvním uložení nejdřív ulož, aby vzniklo PK, potom vygeneruj QR a ulož znovu
+        # Řádek se ukládá jednou; PNG s QR kódem vykreslí worker na pozadí
         creating = self.pk is None
         if creating:
             # Naplnit VS a zprávu při vytváření, pokud nejsou
@@ -160,14 +146,76 @@ class TopUp(models.Model):
             if not self.message:
                 full_name = self.user.get_full_name() or self.user.username
                 self.message = full_name
-        # Nejprve ulož běžná data
-        super().save(*args, **kwargs)
-        # QR vygeneruj, pokud chybí
-        if not self.qr_code:
-            self.generate_qr_code()
-            super().save(update_fields=['qr_code'])
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if creating and not self.qr_code:
+                QRCodeTask.enqueue(self)
         # Připsání kreditu pouze při přechodu do confirmed a pokud ještě nebylo připsáno
         if self.status == 'confirmed' and self.credited_at is None:
-            self.user.add_credits(self.amount)
-            self.credited_at = timezone.now()
-            super().save(update_fields=['credited_at'])
+            with transaction.atomic():
+                credited_at = timezone.now()
+                # Podmíněný UPDATE zaručí jediné připsání i při souběžném schválení
+                if TopUp.objects.filter(pk=self.pk, credited_at__isnull=True).update(credited_at=credited_at):
+                    self.user.add_credits(self.amount, kind='topup', reference=f'topup:{self.pk}')
+                    self.credited_at = credited_at
+
+
+class QRCodeTask(models.Model):
+    """
+    Databázová fronta pro vykreslení PNG QR kódů mimo request.
+    Úlohy po dávkách zpracovává příkaz process_qr_codes (payments.tasks).
+    """
+    KIND_CHOICES = (
+        ('topup', 'Dobití'),
+        ('payment', 'Platba'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'Čeká'),
+        ('running', 'Zpracovává se'),
+        ('done', 'Hotovo'),
+        ('failed', 'Chyba'),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claim_token = models.CharField(max_length=32, blank=True, db_index=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover - trivial
+        return f"QR {self.get_kind_display()} #{self.object_id} ({self.get_status_display()})"
+
+    @classmethod
+    def enqueue(cls, obj):
+        """Zařadí vykreslení QR kódu pro Payment nebo TopUp do fronty."""
+        kind = 'payment' if isinstance(obj, Payment) else 'topup'
+        return cls.objects.create(kind=kind, object_id=obj.pk)
+
+
+class BankTransaction(models.Model):
+    """
+    Platba z bankovního výpisu, kterou import použil k potvrzení dobití.
+    Jedinečná reference banky (AcctSvcrRef, "ID pohybu") zaručí, že opakovaný
+    nebo překrývající se výpis stejnou platbu nepřipíše podruhé.
+    """
+    reference = models.CharField(max_length=100, unique=True, help_text='Reference pohybu přidělená bankou.')
+    variable_symbol = models.CharField(max_length=20)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    topup = models.ForeignKey(TopUp, on_delete=models.SET_NULL, null=True, related_name='bank_transactions')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self) -> str:  # pragma: no cover - trivial
+        return f"Platba {self.reference}: VS {self.variable_symbol}, {self.amount} Kč"
@@ -0,0 +1,91 @@
+"""
+Vykreslování QR kódů pro platby a dobití.
+
+PNG se renderuje mimo request ve workeru (viz payments.tasks); do doby, než
+je obrázek hotový, šablony zobrazují QR jako inline SVG, které nepotřebuje
+PIL ani zápis na disk.
+
+Soubory se ukládají pod SHA-256 svého obsahu (payload + úroveň opravy chyb),
+takže stejné QR (např. opakované dobití stejné částky se stejným VS) se
+vykreslí i uloží jen jednou a jméno souboru nezávisí na PK záznamu.
+Nereferencované soubory maže příkaz cleanup_qr_codes; znovu použitému
+souboru se proto obnoví čas změny, aby jej úklid nepovažoval za starý.
+"""
+import hashlib
+import os
+from functools import lru_cache
+from io import BytesIO
+
+import qrcode.constants
+import qrcode.main
+from qrcode.image.svg import SvgPathImage
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+# Adresář v úložišti, pod kterým leží všechny QR obrázky
+QR_STORAGE_DIR = 'qr_codes'
+# Počet naposledy vykreslených PNG držených v paměti procesu
+RENDER_CACHE_SIZE = 128
+
+
+def _build(data, error_correction, image_factory=None):
+    qr = qrcode.main.QRCode(
+        version=1,
+        error_correction=error_correction,
+        box_size=10,
+        border=4,
+        image_factory=image_factory,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_png(data, error_correction=qrcode.constants.ERROR_CORRECT_M) -> bytes:
+    """Vrátí PNG obrázek QR kódu jako bajty (naposledy použité drží LRU cache)."""
+    img = _build(data, error_correction).make_image(fill_color="black", back_color="white")
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_svg(data, error_correction=qrcode.constants.ERROR_CORRECT_M) -> str:
+    """Vrátí QR kód jako samostatný element <svg> (pro vložení do HTML)."""
+    img = _build(data, error_correction, image_factory=SvgPathImage).make_image()
+    return img.to_string(encoding='unicode')
+
+
+def storage_name(data, error_correction=qrcode.constants.ERROR_CORRECT_M) -> str:
+    """Obsahově adresované jméno souboru, např. qr_codes/ab/ab12….png."""
+    digest = hashlib.sha256(f'{error_correction}:{data}'.encode('utf-8')).hexdigest()
+    return f'{QR_STORAGE_DIR}/{digest[:2]}/{digest}.png'
+
+
+def _touch(storage, name):
+    """Obnoví čas změny souboru; úložiště bez lokální cesty soubor přepíše."""
+    try:
+        os.utime(storage.path(name))
+        return True
+    except NotImplementedError:
+        storage.delete(name)
+    except FileNotFoundError:
+        # Mezitím smazán úklidem – vykreslí se znovu
+        pass
+    return False
+
+
+def store_png(data, error_correction=qrcode.constants.ERROR_CORRECT_M, storage=None) -> str:
+    """
+    Zajistí, že PNG pro daný payload leží v úložišti, a vrátí jeho jméno.
+    Existující soubor se znovu nevykresluje, jen se mu obnoví čas změny.
+    """
+    storage = storage or default_storage
+    name = storage_name(data, error_correction)
+    if storage.exists(name) and _touch(storage, name):
+        return name
+    saved = storage.save(name, ContentFile(render_png(data, error_correction)))
+    if saved != name:
+        # Souběžný zápis stejného obsahu – úložiště zvolilo jiné jméno, duplikát zahodíme
+        storage.delete(saved)
+    return name
@@ -0,0 +1,63 @@
+"""
+Hromadné operace nad platbami a dobitím.
+
+`confirm_topups` potvrzuje libovolný počet dobití v jedné transakci: dobití
+se "zaberou" jedním podmíněným UPDATE (`credited_at IS NULL`), takže se žádné
+nepřipíše dvakrát ani při souběhu s ručním schválením, a kredit se každému
+uživateli připíše jedním agregovaným UPDATE. Do ledgeru jde jeden pohyb na
+každé dobití, aby reconcile_credits i historie pohybů zůstaly přesné.
+"""
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.user_cache import forget_users
+from accounts.models import CreditTransaction
+from .models import TopUp
+
+User = get_user_model()
+
+
+def confirm_topups(topup_ids, description=''):
+    """
+    Potvrdí čekající dobití s danými ID a připíše kredit.
+    Vrací seznam skutečně potvrzených dobití (již potvrzená se přeskočí).
+    """
+    topup_ids = list(topup_ids)
+    if not topup_ids:
+        return []
+
+    with transaction.atomic():
+        credited_at = timezone.now()
+        claimed = TopUp.objects.filter(
+            pk__in=topup_ids, status='pending', credited_at__isnull=True
+        ).update(status='confirmed', credited_at=credited_at)
+        if not claimed:
+            return []
+
+        topups = list(
+            TopUp.objects.filter(pk__in=topup_ids, credited_at=credited_at)
+            .only('pk', 'user_id', 'amount', 'credited_at')
+        )
+
+        totals = defaultdict(lambda: 0)
+        for topup in topups:
+            totals[topup.user_id] += topup.amount
+        for user_id, total in totals.items():
+            User.objects.filter(pk=user_id).update(credits=F('credits') + total)
+        forget_users(totals)
+
+        CreditTransaction.objects.bulk_create([
+            CreditTransaction(
+                user_id=topup.user_id,
+                amount=topup.amount,
+                kind='topup',
+                reference=f'topup:{topup.pk}',
+                description=description,
+            )
+            for topup in topups
+        ])
+    return topups
@@ -0,0 +1,113 @@
+"""
+Worker fronty QRCodeTask – vykresluje PNG QR kódů mimo request.
+
+Jedna dávka: úlohy se atomicky "zaberou" podmíněným UPDATE s náhodným
+tokenem (více workerů si je tak nerozdělí dvakrát), data pro QR se načtou
+hromadně, každý unikátní payload se na poolu vláken vykreslí a uloží jen
+jednou (payments.qr.store_png) a výsledky se uloží hromadnými UPDATE
+z hlavního vlákna (vlákna na DB nesahají).
+"""
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Payment, TopUp, QRCodeTask
+from .qr import store_png
+
+# Po kolika neúspěšných pokusech úlohu vzdáme
+MAX_ATTEMPTS = 3
+# Úloha "running" déle než tato doba patří spadlému workeru a vrací se do fronty
+STALE_AFTER = timedelta(minutes=10)
+
+MODELS = {
+    'topup': TopUp.objects.all(),
+    'payment': Payment.objects.select_related('client', 'instructor'),
+}
+
+
+def claim_batch(batch_size):
+    """Zabere až `batch_size` nejstarších čekajících úloh a vrátí je."""
+    now = timezone.now()
+    QRCodeTask.objects.filter(status='running', claimed_at__lt=now - STALE_AFTER).update(status='pending')
+
+    ids = list(
+        QRCodeTask.objects.filter(status='pending')
+        .order_by('created_at')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    QRCodeTask.objects.filter(pk__in=ids, status='pending').update(
+        status='running', claim_token=token, claimed_at=now, attempts=F('attempts') + 1
+    )
+    return list(QRCodeTask.objects.filter(claim_token=token, status='running'))
+
+
+def process_batch(batch_size=50, workers=4):
+    """Zpracuje jednu dávku fronty. Vrací počet zabraných úloh (0 = fronta je prázdná)."""
+    tasks = claim_batch(batch_size)
+    if not tasks:
+        return 0
+
+    # Cílové záznamy načteme jedním dotazem na typ
+    targets = {}
+    for kind, queryset in MODELS.items():
+        ids = [task.object_id for task in tasks if task.kind == kind]
+        if ids:
+            targets[kind] = queryset.in_bulk(ids)
+
+    jobs = {}
+    finished = []
+    for task in tasks:
+        obj = targets.get(task.kind, {}).get(task.object_id)
+        if obj is None or obj.qr_code:
+            # Záznam byl smazán nebo už QR má – není co dělat
+            finished.append(task)
+        else:
+            jobs[task] = obj
+
+    failed = []
+    rendered = {'topup': [], 'payment': []}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Stejný payload v dávce se vykreslí jen jednou
+        keys = {task: (obj.qr_payload(), obj.QR_ERROR_CORRECTION) for task, obj in jobs.items()}
+        futures = {}
+        for task, key in keys.items():
+            if key not in futures:
+                futures[key] = executor.submit(store_png, *key, jobs[task].qr_code.storage)
+        for task, obj in jobs.items():
+            try:
+                obj.qr_code.name = futures[keys[task]].result()
+            except Exception as e:  # chyba jedné úlohy nesmí shodit celou dávku
+                task.last_error = str(e)
+                failed.append(task)
+            else:
+                rendered[task.kind].append(obj)
+                finished.append(task)
+
+    now = timezone.now()
+    with transaction.atomic():
+        TopUp.objects.bulk_update(rendered['topup'], ['qr_code'])
+        Payment.objects.bulk_update(rendered['payment'], ['qr_code'])
+        QRCodeTask.objects.filter(pk__in=[task.pk for task in finished]).update(
+            status='done', finished_at=now, last_error=''
+        )
+        for task in failed:
+            task.status = 'failed' if task.attempts >= MAX_ATTEMPTS else 'pending'
+        QRCodeTask.objects.bulk_update(failed, ['status', 'last_error'])
+    return len(tasks)
+
+
+def drain(batch_size=50, workers=4):
+    """Zpracovává dávky, dokud není fronta prázdná. Vrací celkový počet úloh."""
+    total = 0
+    while True:
+        processed = process_batch(batch_size=batch_size, workers=workers)
+        if not processed:
+            return total
+        total += processed
@@ -0,0 +1,15 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from payments.qr import render_svg
+
+register = template.Library()
+
+
+@register.simple_tag
+def qr_inline_svg(obj):
+    """
+    Vykreslí QR kód platby/dobití jako inline SVG: {% qr_inline_svg topup %}
+    Používá se, dokud worker nevytvořil PNG (obj.qr_code je prázdné).
+    """
+    return mark_safe(render_svg(obj.qr_payload(), obj.QR_ERROR_CORRECTION))
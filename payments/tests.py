@@ -1,14 +1,25 @@
 """
 Testy pro aplikaci payments - dobíjení kreditů, platby.
 """
-from django.test import TestCase, Client
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.utils import timezone
 from decimal import Decimal
 from datetime import timedelta
 
-from .models import TopUp, Payment
+from .management.commands.cleanup_qr_codes import Command as CleanupCommand
+from .models import TopUp, Payment, QRCodeTask, BankTransaction
+from .qr import store_png
+from .tasks import process_batch
+from .views import TopUpApproveListView
 
 User = get_user_model()
 
@@ -390,3 +401,350 @@ class IntegrationPaymentFlowTests(TestCase):
         self.assertEqual(self.client_user.credits, Decimal('1000.00'))  # Kredit připsán
         
         self.assertIsNotNone(topup.credited_at)  # Čas připsání nastaven
+
+
+class QRCodeTaskTests(TestCase):
+    """Testy pro vykreslování QR kódů ve frontě mimo request."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.client_user = User.objects.create_user(
+            username='klient@test.cz',
+            email='klient@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('100.00')
+        )
+
+    def test_topup_creation_enqueues_task_without_png(self):
+        """Uložení dobití PNG nevykresluje, jen založí úlohu ve frontě."""
+        topup = TopUp.objects.create(user=self.client_user, amount=Decimal('500.00'))
+
+        self.assertFalse(topup.qr_code)
+        task = QRCodeTask.objects.get(kind='topup', object_id=topup.pk)
+        self.assertEqual(task.status, 'pending')
+
+    def test_worker_renders_png_and_marks_task_done(self):
+        """Worker vykreslí PNG, uloží jej k záznamu a úlohu označí jako hotovou."""
+        topup = TopUp.objects.create(user=self.client_user, amount=Decimal('500.00'))
+
+        self.assertEqual(process_batch(), 1)
+
+        topup.refresh_from_db()
+        self.assertTrue(topup.qr_code.name.endswith('.png'))
+        task = QRCodeTask.objects.get(kind='topup', object_id=topup.pk)
+        self.assertEqual(task.status, 'done')
+        self.assertEqual(task.attempts, 1)
+        # Prázdná fronta nic nezabere
+        self.assertEqual(process_batch(), 0)
+
+    def test_detail_shows_inline_svg_until_png_is_ready(self):
+        """Detail dobití zobrazí QR jako inline SVG, dokud PNG neexistuje."""
+        topup = TopUp.objects.create(user=self.client_user, amount=Decimal('500.00'))
+        self.client.login(username='klient@test.cz', password='testpass123')
+
+        response = self.client.get(reverse('topup_detail', args=[topup.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<svg')
+
+
+class QRCodeStorageTests(TestCase):
+    """Testy pro obsahově adresované ukládání QR kódů."""
+
+    def setUp(self):
+        """Příprava testovacích dat a dočasného úložiště médií."""
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=self.media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.client_user = User.objects.create_user(
+            username='klient@test.cz',
+            email='klient@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('100.00')
+        )
+
+    def test_identical_payloads_share_one_file(self):
+        """Dvě dobití se stejným payloadem odkazují na jediný soubor."""
+        first = TopUp.objects.create(user=self.client_user, amount=Decimal('500.00'))
+        second = TopUp.objects.create(user=self.client_user, amount=Decimal('500.00'))
+        other = TopUp.objects.create(user=self.client_user, amount=Decimal('300.00'))
+
+        process_batch()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(first.qr_code.name, second.qr_code.name)
+        self.assertNotEqual(first.qr_code.name, other.qr_code.name)
+        self.assertNotIn('None', first.qr_code.name)
+        self.assertTrue(first.qr_code.storage.exists(first.qr_code.name))
+
+    def test_cleanup_removes_only_unreferenced_files(self):
+        """Úklid smaže jen soubory, na které nic neodkazuje."""
+        topup = TopUp.objects.create(user=self.client_user, amount=Decimal('500.00'))
+        process_batch()
+        topup.refresh_from_db()
+        orphan = os.path.join(self.media.name, 'qr_codes', 'qr_payment_None.png')
+        with open(orphan, 'wb') as f:
+            f.write(b'png')
+
+        call_command('cleanup_qr_codes', '--min-age', '0', stdout=StringIO())
+
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(topup.qr_code.storage.exists(topup.qr_code.name))
+
+    def test_reused_file_is_not_cleaned_up(self):
+        """Znovu použitý starý soubor dostane nový čas změny a úklid ho nesmaže."""
+        topup = TopUp.objects.create(user=self.client_user, amount=Decimal('500.00'))
+        process_batch()
+        topup.refresh_from_db()
+        path = topup.qr_code.path
+        old = (timezone.now() - timedelta(days=2)).timestamp()
+        os.utime(path, (old, old))
+        TopUp.objects.filter(pk=topup.pk).update(qr_code='')
+
+        # Nové dobití se stejným payloadem použije existující soubor
+        store_png(topup.qr_payload(), TopUp.QR_ERROR_CORRECTION, topup.qr_code.storage)
+        call_command('cleanup_qr_codes', stdout=StringIO())
+
+        self.assertTrue(os.path.exists(path))
+        self.assertGreater(os.path.getmtime(path), old)
+
+    def test_cleanup_rechecks_references_before_delete(self):
+        """Soubor, na který se mezitím začal odkazovat záznam, se nesmaže."""
+        topup = TopUp.objects.create(user=self.client_user, amount=Decimal('500.00'))
+        process_batch()
+        topup.refresh_from_db()
+        name = topup.qr_code.name
+        TopUp.objects.filter(pk=topup.pk).update(qr_code='')
+        real_walk = CleanupCommand._walk
+
+        def walk_and_relink(command, storage, path):
+            # Worker uloží odkaz až po sestavení množiny odkazovaných souborů
+            TopUp.objects.filter(pk=topup.pk).update(qr_code=name)
+            yield from real_walk(command, storage, path)
+
+        with patch.object(CleanupCommand, '_walk', walk_and_relink):
+            call_command('cleanup_qr_codes', '--min-age', '0', stdout=StringIO())
+
+        self.assertTrue(topup.qr_code.storage.exists(name))
+
+
+CAMT_053 = b"""<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02">
+  <BkToCstmrStmt>
+    <Stmt>
+      <Id>1</Id>
+      <Ntry>
+        <NtryRef>A1</NtryRef>
+        <Amt Ccy="CZK">500.00</Amt>
+        <CdtDbtInd>CRDT</CdtDbtInd>
+        <NtryDtls><TxDtls>
+          <Refs><EndToEndId>/VS{vs}/SS/KS0308</EndToEndId></Refs>
+        </TxDtls></NtryDtls>
+      </Ntry>
+      <Ntry>
+        <NtryRef>A2</NtryRef>
+        <Amt Ccy="CZK">500.00</Amt>
+        <CdtDbtInd>DBIT</CdtDbtInd>
+        <NtryDtls><TxDtls>
+          <RmtInf><Strd><CdtrRefInf><Ref>{vs}</Ref></CdtrRefInf></Strd></RmtInf>
+        </TxDtls></NtryDtls>
+      </Ntry>
+    </Stmt>
+  </BkToCstmrStmt>
+</Document>
+"""
+
+
+class BankStatementImportTests(TestCase):
+    """Testy pro import bankovního výpisu a automatické potvrzení dobití."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.client_user = User.objects.create_user(
+            username='klient@test.cz',
+            email='klient@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('100.00')
+        )
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.topup = TopUp.objects.create(user=self.client_user, amount=Decimal('500.00'))
+        self.vs = self.topup.variable_symbol
+
+    def _write(self, content, suffix):
+        f = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+        f.write(content)
+        f.close()
+        self.addCleanup(os.unlink, f.name)
+        return f.name
+
+    def test_csv_import_confirms_matching_topup_once(self):
+        """CSV s VS a částkou potvrdí dobití; opakovaný import kredit nepřipíše znovu."""
+        csv_content = (
+            'Datum;Objem;Variabilní symbol;ID pohybu\n'
+            f'01.03.2025;500,00;{self.vs.zfill(10)};111\n'
+            f'01.03.2025;250,00;{self.vs};112\n'
+            '02.03.2025;-80,00;;113\n'
+        ).encode('utf-8')
+        path = self._write(csv_content, '.csv')
+
+        call_command('import_bank_statement', path, stdout=StringIO())
+        call_command('import_bank_statement', path, stdout=StringIO())
+
+        self.topup.refresh_from_db()
+        self.client_user.refresh_from_db()
+        self.assertEqual(self.topup.status, 'confirmed')
+        self.assertIsNotNone(self.topup.credited_at)
+        self.assertEqual(self.client_user.credits, Decimal('600.00'))
+        self.assertEqual(self.client_user.credit_transactions.filter(kind='topup').count(), 1)
+
+    def test_reimport_does_not_confirm_another_topup(self):
+        """Opakovaný import téže platby nepotvrdí další čekající dobití se stejným VS a částkou."""
+        second = TopUp.objects.create(user=self.client_user, amount=Decimal('500.00'))
+        path = self._write(f'Objem;VS;ID pohybu\n500,00;{self.vs};111\n'.encode('utf-8'), '.csv')
+
+        call_command('import_bank_statement', path, stdout=StringIO())
+        out = StringIO()
+        call_command('import_bank_statement', path, stdout=out)
+
+        self.assertIn('Přeskočeno 1 plateb', out.getvalue())
+        self.assertEqual(TopUp.objects.get(pk=self.topup.pk).status, 'confirmed')
+        self.assertEqual(TopUp.objects.get(pk=second.pk).status, 'pending')
+        self.client_user.refresh_from_db()
+        self.assertEqual(self.client_user.credits, Decimal('600.00'))
+        self.assertEqual(BankTransaction.objects.get(reference='111').topup, self.topup)
+
+    def test_line_without_reference_is_left_for_manual_approval(self):
+        """Platbu bez reference banky nelze chránit proti opakování, proto se nepáruje."""
+        path = self._write(f'Objem;VS\n500,00;{self.vs}\n'.encode('utf-8'), '.csv')
+
+        out = StringIO()
+        call_command('import_bank_statement', path, stdout=out)
+
+        self.assertIn('bez reference banky', out.getvalue())
+        self.assertEqual(TopUp.objects.get(pk=self.topup.pk).status, 'pending')
+
+    def test_camt_import_ignores_debits(self):
+        """camt.053 páruje jen příchozí (CRDT) platby a VS najde v EndToEndId."""
+        second = TopUp.objects.create(user=self.client_user, amount=Decimal('500.00'))
+        path = self._write(CAMT_053.replace(b'{vs}', self.vs.encode()), '.xml')
+
+        out = StringIO()
+        call_command('import_bank_statement', path, stdout=out)
+
+        self.assertIn('Potvrzeno 1 dobití', out.getvalue())
+        # Při více kandidátech se páruje nejstarší dobití
+        self.assertEqual(TopUp.objects.get(pk=self.topup.pk).status, 'confirmed')
+        self.assertEqual(TopUp.objects.get(pk=second.pk).status, 'pending')
+
+    def test_instructor_can_upload_statement(self):
+        """Instruktor nahraje výpis přes formulář a dobití se potvrdí."""
+        self.client.login(username='lektor@test.cz', password='testpass123')
+        upload = SimpleUploadedFile('vypis.csv', f'VS,Amount,ID\n{self.vs},500.00,9001\n'.encode('utf-8'))
+
+        response = self.client.post(
+            reverse('bank_statement_import'), {'statement': upload, 'encoding': 'utf-8-sig'}
+        )
+
+        self.assertRedirects(response, reverse('topup_approve_list'))
+        self.topup.refresh_from_db()
+        self.assertEqual(self.topup.status, 'confirmed')
+
+
+class TopUpBulkApprovalTests(TestCase):
+    """Testy pro hromadné schválení a stránkovaný seznam čekajících dobití."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.client_user = User.objects.create_user(
+            username='klient@test.cz',
+            email='klient@test.cz',
+            password='testpass123',
+            user_type='client',
+            credits=Decimal('100.00')
+        )
+        self.instructor = User.objects.create_user(
+            username='lektor@test.cz',
+            email='lektor@test.cz',
+            password='testpass123',
+            user_type='instructor'
+        )
+        self.topups = [
+            TopUp.objects.create(user=self.client_user, amount=Decimal(amount))
+            for amount in ('200.00', '300.00', '400.00')
+        ]
+        self.client.login(username='lektor@test.cz', password='testpass123')
+
+    def test_bulk_approve_credits_selected_topups(self):
+        """Vybraná dobití se potvrdí najednou a kredit se připíše souhrnně."""
+        selected = [str(self.topups[0].pk), str(self.topups[1].pk)]
+
+        response = self.client.post(reverse('topup_bulk_approve'), {'topups': selected})
+        # Opakované odeslání nic nepřipíše
+        self.client.post(reverse('topup_bulk_approve'), {'topups': selected})
+
+        self.assertRedirects(response, reverse('topup_approve_list'))
+        self.client_user.refresh_from_db()
+        self.assertEqual(self.client_user.credits, Decimal('600.00'))
+        self.assertEqual(self.client_user.credit_transactions.filter(kind='topup').count(), 2)
+        self.assertEqual(TopUp.objects.filter(status='pending').get(), self.topups[2])
+
+    def test_list_is_keyset_paginated_with_db_totals(self):
+        """Seznam se stránkuje kurzorem a součty zahrnují celou frontu."""
+        with patch.object(TopUpApproveListView, 'page_size', 2):
+            first = self.client.get(reverse('topup_approve_list'))
+            self.assertEqual(first.context['topups'], self.topups[:2])
+            self.assertEqual(first.context['totals'], {'count': 3, 'amount': Decimal('900.00')})
+
+            second = self.client.get(reverse('topup_approve_list'), {'after': first.context['next_cursor']})
+            self.assertEqual(second.context['topups'], self.topups[2:])
+            self.assertIsNone(second.context['next_cursor'])
+
+
+class IdempotentTopUpTests(TestCase):
+    """Testy pro opakované odeslání formuláře dobití se stejným klíčem."""
+
+    def setUp(self):
+        """Příprava testovacích dat."""
+        self.client_user = User.objects.create_user(
+            username='klient@test.cz',
+            email='klient@test.cz',
+            password='testpass123',
+            user_type='client'
+        )
+        self.client.login(username='klient@test.cz', password='testpass123')
+
+    def test_replayed_post_returns_original_response(self):
+        """Dvojí odeslání se stejným klíčem založí jediné dobití."""
+        key = self.client.get(reverse('topup_create')).context['idempotency_key']
+
+        first = self.client.post(reverse('topup_create'), {'amount': '500', 'idempotency_key': key})
+        second = self.client.post(reverse('topup_create'), {'amount': '500', 'idempotency_key': key})
+
+        self.assertEqual(TopUp.objects.count(), 1)
+        self.assertEqual(second.status_code, first.status_code)
+        self.assertEqual(second['Location'], first['Location'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+
+    def test_header_key_and_invalid_form_releases_key(self):
+        """Neplatný formulář klíč uvolní, opravené odeslání se zpracuje."""
+        headers = {'HTTP_IDEMPOTENCY_KEY': 'retry-key-123456'}
+
+        invalid = self.client.post(reverse('topup_create'), {'amount': ''}, **headers)
+        valid = self.client.post(reverse('topup_create'), {'amount': '300'}, **headers)
+
+        self.assertEqual(invalid.status_code, 200)
+        self.assertEqual(valid.status_code, 302)
+        self.assertEqual(TopUp.objects.get().amount, Decimal('300'))
@@ -11,4 +11,6 @@ urlpatterns = [
     path('topup/history/', views.TopUpHistoryView.as_view(), name='topup_history'),
     path('topup/approve/', views.TopUpApproveListView.as_view(), name='topup_approve_list'),
     path('topup/approve/<int:pk>/', views.TopUpApproveView.as_view(), name='topup_approve'),
+    path('topup/approve/bulk/', views.TopUpBulkApproveView.as_view(), name='topup_bulk_approve'),
+    path('topup/import/', views.BankStatementImportView.as_view(), name='bank_statement_import'),
 ]
\ No newline at end of file
@@ -1,15 +1,23 @@
-from django.views.generic import CreateView, DetailView, ListView, UpdateView
+from datetime import datetime
+from decimal import Decimal
+
+from django.views import View
+from django.views.generic import CreateView, DetailView, FormView, ListView, UpdateView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.shortcuts import get_object_or_404
+from django.db.models import Count, Q, Sum
+from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from .models import Payment, TopUp
-from accounts.mixins import InstructorRequiredMixin
+from .forms import BankStatementForm
+from .bank_import import detect_format, import_statement, iter_statement
+from .services import confirm_topups
+from accounts.mixins import IdempotentPostMixin, InstructorRequiredMixin
 
 User = get_user_model()
 
-class PaymentCreateView(LoginRequiredMixin, CreateView):
+class PaymentCreateView(LoginRequiredMixin, IdempotentPostMixin, CreateView):
 	model = Payment
 	fields = ['amount']
 	template_name = 'payments/payment_create.html'
@@ -61,7 +69,7 @@ class PaymentHistoryView(LoginRequiredMixin, ListView):
 		return context
 
 
-class TopUpCreateView(LoginRequiredMixin, CreateView):
+class TopUpCreateView(LoginRequiredMixin, IdempotentPostMixin, CreateView):
 	model = TopUp
 	fields = ['amount']
 	template_name = 'payments/topup_create.html'
@@ -93,13 +101,49 @@ class TopUpHistoryView(LoginRequiredMixin, ListView):
 		return TopUp.objects.filter(user=self.request.user).order_by('-created_at')
 
 
+def _parse_topup_cursor(value):
+	"""Kurzor stránkování ve tvaru "<ISO created_at>|<pk>"; neplatný kurzor = první stránka."""
+	try:
+		created_at, pk = value.rsplit('|', 1)
+		return datetime.fromisoformat(created_at), int(pk)
+	except (AttributeError, ValueError):
+		return None
+
+
 class TopUpApproveListView(LoginRequiredMixin, InstructorRequiredMixin, ListView):
+	"""
+	Čekající dobití stránkovaná keysetem podle (created_at, pk) – hluboké
+	stránky jsou stejně levné jako první. Součty počítá databáze jedním
+	agregačním dotazem nad celou frontou.
+	"""
 	model = TopUp
 	template_name = 'payments/topup_approve_list.html'
 	context_object_name = 'topups'
+	page_size = 50
 
 	def get_queryset(self):
-		return TopUp.objects.filter(status='pending').order_by('created_at')
+		queryset = TopUp.objects.filter(status='pending').select_related('user').order_by('created_at', 'pk')
+		cursor = _parse_topup_cursor(self.request.GET.get('after'))
+		if cursor:
+			created_at, pk = cursor
+			queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+		# O řádek víc, abychom poznali, zda existuje další stránka
+		return queryset[:self.page_size + 1]
+
+	def get_context_data(self, **kwargs):
+		context = super().get_context_data(**kwargs)
+		topups = list(context['topups'])
+		context['next_cursor'] = None
+		if len(topups) > self.page_size:
+			topups = topups[:self.page_size]
+			last = topups[-1]
+			context['next_cursor'] = f'{last.created_at.isoformat()}|{last.pk}'
+		context['topups'] = context['object_list'] = topups
+		context['is_first_page'] = 'after' not in self.request.GET
+		context['totals'] = TopUp.objects.filter(status='pending').aggregate(
+			count=Count('pk'), amount=Sum('amount')
+		)
+		return context
 
 
 class TopUpApproveView(LoginRequiredMixin, InstructorRequiredMixin, UpdateView):
@@ -108,9 +152,62 @@ class TopUpApproveView(LoginRequiredMixin, InstructorRequiredMixin, UpdateView):
 	template_name = 'payments/topup_approve.html'
 
 	def form_valid(self, form):
-		form.instance.status = 'confirmed'
-		messages.success(self.request, 'Dobití bylo potvrzeno a kredit připsán.')
-		return super().form_valid(form)
+		# Stejná cesta jako hromadné schválení: jeden podmíněný UPDATE a zápis do ledgeru
+		if confirm_topups([self.object.pk]):
+			messages.success(self.request, 'Dobití bylo potvrzeno a kredit připsán.')
+		else:
+			messages.info(self.request, 'Dobití už bylo zpracováno dříve.')
+		return redirect(self.get_success_url())
 
 	def get_success_url(self):
 		return reverse_lazy('topup_approve_list')
+
+
+class TopUpBulkApproveView(LoginRequiredMixin, InstructorRequiredMixin, View):
+	"""Potvrdí vybraná dobití najednou v jedné transakci."""
+	http_method_names = ['post']
+
+	def post(self, request, *args, **kwargs):
+		ids = [value for value in request.POST.getlist('topups') if value.isdigit()]
+		if not ids:
+			messages.warning(request, 'Nevybrali jste žádné dobití.')
+		else:
+			confirmed = confirm_topups(ids)
+			total = sum((topup.amount for topup in confirmed), Decimal('0'))
+			messages.success(request, f'Potvrzeno {len(confirmed)} dobití, připsáno celkem {total:.0f} Kč.')
+			if len(confirmed) < len(ids):
+				messages.info(request, f'{len(ids) - len(confirmed)} dobití už bylo zpracováno dříve.')
+		return redirect('topup_approve_list')
+
+
+class BankStatementImportView(LoginRequiredMixin, InstructorRequiredMixin, FormView):
+	"""Nahrání bankovního výpisu a hromadné potvrzení spárovaných dobití."""
+	form_class = BankStatementForm
+	template_name = 'payments/bank_import.html'
+	success_url = reverse_lazy('topup_approve_list')
+
+	def form_valid(self, form):
+		statement = form.cleaned_data['statement']
+		fmt = detect_format(statement.name)
+		try:
+			# Soubor se čte proudově po řádcích / položkách, ne celý do paměti
+			result = import_statement(iter_statement(statement, fmt, encoding=form.cleaned_data['encoding']))
+		except (ValueError, SyntaxError):
+			form.add_error('statement', 'Výpis se nepodařilo načíst. Zkontrolujte formát a kódování souboru.')
+			return self.form_invalid(form)
+
+		messages.success(
+			self.request,
+			f'Potvrzeno {result.matched} dobití za {result.credited} Kč z {result.lines} příchozích plateb.'
+		)
+		if result.unmatched:
+			sample = ', '.join(f'VS {line.variable_symbol} ({line.amount} Kč)' for line in result.unmatched_sample[:10])
+			messages.warning(self.request, f'Nespárováno {result.unmatched} plateb: {sample}')
+		if result.already_imported:
+			messages.info(self.request, f'Přeskočeno {result.already_imported} plateb importovaných už dříve.')
+		if result.unreferenced:
+			messages.warning(
+				self.request,
+				f'{result.unreferenced} plateb bez reference banky (ID pohybu) nelze bezpečně párovat – schvalte je ručně.'
+			)
+		return super().form_valid(form)
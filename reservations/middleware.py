@@ -0,0 +1,103 @@
+"""
+Omezení četnosti požadavků (token bucket) pro zatěžující endpointy.
+
+Limity se nastavují v `settings.RATELIMITS` podle názvu URL, zvlášť pro IP
+adresu a pro uživatele. Stav zásobníku (zbývající tokeny a čas poslední
+aktualizace) je v cache, takže odmítnutý požadavek skončí levnou odpovědí
+429 dřív, než se dotkne ORM. Uživatel se proto neurčuje načtením
+`request.user` (dotaz na session a uživatele), ale podle session cookie,
+nebo – u přihlášení, kde cookie útočník jednoduše vynechá – podle
+odeslaného e-mailu/jména (`'user_field'`) spolu s IP adresou. Díky IP
+v klíči nemůže kdokoli zablokovat přihlášení cizího účtu odjinud.
+
+Stav leží v cache `settings.RATELIMIT_CACHE`. S výchozí LocMemCache má
+každý worker proces vlastní zásobníky, takže skutečný limit je násobkem
+počtu procesů; pro přesné limity je potřeba sdílená cache (Redis,
+Memcached). Čtení a zápis stavu nejsou atomické – při souběhu může projít
+o pár požadavků víc, což je pro ochranu před skripty dostačující.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+RATE_UNITS = {'s': 1, 'm': 60, 'h': 3600}
+
+
+def parse_rate(rate):
+    """'10/m' -> (10 tokenů, 10/60 tokenu za sekundu). Kapacita zásobníku = N."""
+    count, unit = rate.split('/')
+    capacity = int(count)
+    return capacity, capacity / RATE_UNITS[unit[0]]
+
+
+def take_token(key, rate):
+    """
+    Odebere jeden token ze zásobníku `key`. Vrací 0, pokud požadavek
+    projde, jinak počet sekund, za které bude token k dispozici.
+    """
+    capacity, refill = parse_rate(rate)
+    cache = caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+    now = time.time()
+    tokens, updated = cache.get(key) or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * refill)
+    # Stav po úplném doplnění zásobníku nepotřebujeme, klíč pak může vypršet
+    timeout = math.ceil(capacity / refill) + 1
+    if tokens < 1:
+        cache.set(key, (tokens, now), timeout)
+        return (1 - tokens) / refill
+    cache.set(key, (tokens - 1, now), timeout)
+    return 0
+
+
+def client_ip(request):
+    header = getattr(settings, 'RATELIMIT_IP_HEADER', None)
+    if header and request.META.get(header):
+        # X-Forwarded-For: první adresa je klient (nastavuje důvěryhodná proxy)
+        return request.META[header].split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+class RateLimitMiddleware:
+    """Odmítá požadavky nad limit s 429 Too Many Requests a hlavičkou Retry-After."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        limits = getattr(settings, 'RATELIMITS', {}).get(match.view_name if match else None)
+        if not limits or request.method not in limits.get('methods', ('POST',)):
+            return None
+
+        buckets = []
+        ip = client_ip(request)
+        if limits.get('ip'):
+            buckets.append(('ip', ip, limits['ip']))
+        if limits.get('user'):
+            if limits.get('user_field'):
+                # Limit na účet z dané adresy podle odeslaného identifikátoru, ne podle cookie
+                identifier = request.POST.get(limits['user_field'], '').strip().lower()
+                user_key = f'{ip}|{identifier}' if identifier else ''
+            else:
+                user_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')
+            if user_key:
+                buckets.append(('user', hashlib.sha256(user_key.encode()).hexdigest()[:32], limits['user']))
+
+        for scope, ident, rate in buckets:
+            retry_after = take_token(f'ratelimit:{match.view_name}:{scope}:{ident}', rate)
+            if retry_after:
+                response = HttpResponse(
+                    "Příliš mnoho požadavků, zkuste to prosím za chvíli.",
+                    status=429,
+                    content_type='text/plain; charset=utf-8',
+                )
+                response['Retry-After'] = str(math.ceil(retry_after))
+                return response
+        return None
@@ -34,9 +34,10 @@ AUTH_USER_MODEL = 'accounts.User'
 
 # Authentication backends - umožňuje přihlášení emailem
 AUTHENTICATION_BACKENDS = [
-    'accounts.backends.EmailBackend',  # Náš vlastní backend pro email
-    'django.contrib.auth.backends.ModelBackend',  # Fallback na původní backend
+    'accounts.backends.EmailBackend',  # Email i uživatelské jméno jedním dotazem a jedním hashem
 ]
+# Jak dlouho (s) drží proces načteného přihlášeného uživatele (accounts.backends)
+AUTH_USER_CACHE_TIMEOUT = 5
 
 INSTALLED_APPS = [
     "django.contrib.admin",
@@ -56,6 +57,8 @@ CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # Co nejdříve, aby odmítnutý požadavek nenačítal session ani uživatele
+    "reservations.middleware.RateLimitMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -99,6 +102,39 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Veřejný rozvrh se cachuje verzovaně (bookings.cache); lokální paměť stačí
+# pro jeden proces, pro více workerů lze přepnout na FileBasedCache/Redis.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "fitness-default",
+    }
+}
+
+# Jak dlouho (s) držet položky rozvrhu v cache; změny je zneplatní okamžitě
+SCHEDULE_CACHE_TIMEOUT = 300
+
+# Token bucket limity podle názvu URL (reservations.middleware.RateLimitMiddleware).
+# Sazba "N/s|m|h" – N je zároveň velikost zásobníku, tedy povolená dávka naráz.
+# "ip" platí pro adresu klienta, "user" pro přihlášenou session, s "user_field"
+# pro dvojici (hodnota odeslaného pole, IP) – přihlášení: limit na účet bez
+# ohledu na cookie, který ale nezablokuje vlastníka účtu z jiné adresy.
+# Zásobníky jsou v RATELIMIT_CACHE; s LocMemCache má každý worker proces
+# vlastní, takže efektivní limit = limit × počet procesů (sdílená cache to řeší).
+RATELIMITS = {
+    'bookings:booking_create': {'methods': ('POST',), 'ip': '60/m', 'user': '10/m'},
+    'bookings:basket_book': {'methods': ('POST',), 'ip': '30/m', 'user': '5/m'},
+    'bookings:waitlist_join': {'methods': ('POST',), 'ip': '60/m', 'user': '10/m'},
+    'accounts:login': {'methods': ('POST',), 'ip': '20/m', 'user': '5/m', 'user_field': 'username'},
+}
+RATELIMIT_CACHE = 'default'
+# Za reverzní proxy: hlavička s IP klienta, např. 'HTTP_X_FORWARDED_FOR'
+RATELIMIT_IP_HEADER = None
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
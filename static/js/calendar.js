@@ -14,9 +14,32 @@ document.addEventListener('DOMContentLoaded', function() {
 
     let activeCategory = 'all';
 
+    const pendingMonths = {};
+
+    function monthCacheKey(date) {
+        return `${date.getFullYear()}-${date.getMonth() + 1}`;
+    }
+
+    // Dotáhne data měsíce z API, pokud ještě nejsou v cache; po načtení překreslí kalendář
+    function ensureMonthLoaded(date) {
+        const key = monthCacheKey(date);
+        if (key in lessonsData.allMonths || pendingMonths[key]) return;
+
+        const url = `${lessonsMonthUrl}?year=${date.getFullYear()}&month=${date.getMonth() + 1}`;
+        pendingMonths[key] = fetch(url, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.ok ? response.json() : {})
+            .catch(() => ({}))
+            .then(data => {
+                lessonsData.allMonths[key] = data;
+                delete pendingMonths[key];
+                if (monthCacheKey(currentDate) === key) updateCalendar();
+            });
+    }
+
     function updateCalendar() {
         const year = currentDate.getFullYear();
         const month = currentDate.getMonth();
+        ensureMonthLoaded(currentDate);
 
         currentMonthElement.textContent = `${months[month]} ${year}`;
         calendarDays.innerHTML = '';